@@ -0,0 +1,128 @@
+"""Measures a backfill split between replicas against a single replica.
+
+A fake Steem node serves synthetic blocks (see ``fakes.py``). One replica
+fetches the whole range, then several replicas fetch it at once, sharing the
+ranges they own on the hash ring through a SQLite lease backend. Every
+replica must find the same reviewer comments as the single one.
+
+Usage: python benchmarks/bench_backfill.py [--blocks N] [--replicas N]
+    [--workers N] [--latency SECONDS]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "utbot"))
+
+from coordination import Coordinator, SQLiteLeaseBackend  # noqa: E402
+from fakes import FakeSteemNode, synthetic_chain  # noqa: E402
+from ingest import BlockFetcher, SharedRanges, comment_ops_in_block  # noqa: E402
+from nodepool import NodePool  # noqa: E402
+from settings import get_config  # noqa: E402
+
+LEASE_TTL = 1.0
+
+
+def backfill(fetcher: BlockFetcher, first: int, last: int, reviewers) -> list:
+    """Collects the reviewer comments of a block range."""
+    ops = []
+    for block_num, block in fetcher.blocks(first):
+        ops.extend(
+            (op["block_num"], op["permlink"])
+            for op in comment_ops_in_block(block, block_num, reviewers)
+        )
+        if block_num == last:
+            break
+    return ops
+
+
+def run_replicas(args, node: FakeSteemNode, chain, reviewers) -> list:
+    """Backfills the chain with replicas sharing their ranges."""
+    path = os.path.join(tempfile.mkdtemp(prefix="utbot-bench-"), "coordination.db")
+    shutdown = threading.Event()
+    coordinators = [
+        Coordinator(SQLiteLeaseBackend(path), f"replica-{i}", lease_ttl=LEASE_TTL)
+        for i in range(args.replicas)
+    ]
+    for coordinator in coordinators:
+        coordinator.heartbeat()
+        threading.Thread(
+            target=coordinator.run, args=(shutdown, LEASE_TTL / 5), daemon=True
+        ).start()
+    # new members own keys a lease period after they joined
+    time.sleep(LEASE_TTL * 1.5)
+
+    results = [None] * args.replicas
+
+    def replica(i: int):
+        share = SharedRanges(coordinators[i], reviewers, lag=0, wait=10)
+        fetcher = BlockFetcher(
+            NodePool([node.url]),
+            workers=args.workers,
+            range_size=args.range_size,
+            share=share,
+        )
+        start = time.perf_counter()
+        ops = backfill(fetcher, chain.first, chain.last, reviewers)
+        results[i] = (ops, time.perf_counter() - start, share.stats())
+
+    requests = node.requests
+    threads = [threading.Thread(target=replica, args=(i,)) for i in range(len(results))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    shutdown.set()
+    return results, node.requests - requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--blocks", type=int, default=2000)
+    parser.add_argument("--replicas", type=int, default=2)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--range-size", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.1)
+    args = parser.parse_args()
+
+    reviewers = frozenset(get_config()["steem"]["reviewers"])
+    chain = synthetic_chain(args.blocks, 20, 200, sorted(reviewers))
+    node = FakeSteemNode(chain, "", latency=args.latency).start()
+
+    fetcher = BlockFetcher(
+        NodePool([node.url]), workers=args.workers, range_size=args.range_size
+    )
+    requests = node.requests
+    start = time.perf_counter()
+    expected = backfill(fetcher, chain.first, chain.last, reviewers)
+    single = time.perf_counter() - start
+    single_requests = node.requests - requests
+
+    results, shared_requests = run_replicas(args, node, chain, reviewers)
+    node.stop()
+    for ops, _, _ in results:
+        assert ops == expected, "a replica found other comments"
+
+    print(f"{'run':<12}{'blocks':>8}{'ops':>6}{'requests':>10}{'s':>8}{'blocks/s':>10}")
+    print(
+        f"{'single':<12}{args.blocks:>8}{len(expected):>6}{single_requests:>10}"
+        f"{single:>8.2f}{args.blocks / single:>10.0f}"
+    )
+    for i, (ops, elapsed, stats) in enumerate(results):
+        print(
+            f"{f'replica {i}':<12}{args.blocks:>8}{len(ops):>6}{'':>10}"
+            f"{elapsed:>8.2f}{args.blocks / elapsed:>10.0f}  {stats}"
+        )
+    slowest = max(elapsed for _, elapsed, _ in results)
+    print(
+        f"{args.replicas} replicas: {shared_requests} node requests in total, "
+        f"speedup {single / slowest:.1f}x per replica"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Measures the catch-up of missed blocks after a restart.
+
+A fake Steem node serves synthetic blocks (see ``fakes.py``), the bot resumes
+from a checkpoint behind them and replays the range once block by block, as
+the live stream does, and once with the batched requests of the catch-up
+mode. Both runs must yield the same operations and leave the checkpoint at
+the last block.
+
+Usage: python benchmarks/bench_catchup.py [--blocks N] [--batch-size N]
+    [--latency SECONDS]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from beem import Steem
+from beem.blockchain import Blockchain
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "utbot"))
+
+from checkpoint import Checkpoint, StateStore  # noqa: E402
+from fakes import FakeSteemNode, synthetic_chain  # noqa: E402
+from settings import get_config  # noqa: E402
+
+
+def replay(stream_block_range, bc, store, first, last, **kwargs) -> tuple:
+    """Replays blocks from a checkpoint before the first one."""
+    store.set("blocks", first - 1)
+    checkpoint = Checkpoint(store, "blocks")
+    start = time.perf_counter()
+    ops = [
+        (op["block_num"], op["permlink"])
+        for op in stream_block_range(
+            bc, ["comment"], checkpoint, checkpoint.position + 1, last, **kwargs
+        )
+    ]
+    elapsed = time.perf_counter() - start
+    assert store.get("blocks") == last, store.get("blocks")
+    return ops, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--blocks", type=int, default=500)
+    parser.add_argument("--batch-size", type=int)
+    parser.add_argument("--latency", type=float, default=0.002)
+    args = parser.parse_args()
+
+    config = get_config()
+    batch_size = args.batch_size or config["stream"]["catchup_batch_size"]
+    chain = synthetic_chain(args.blocks, 5, 20, config["steem"]["reviewers"])
+    node = FakeSteemNode(chain, "", latency=args.latency).start()
+    data_dir = tempfile.mkdtemp(prefix="utbot-bench-")
+    config["steem"]["nodes"] = [node.url]
+    config["stream"]["state_db"] = os.path.join(data_dir, "utbot.db")
+    config["queue"]["db"] = os.path.join(data_dir, "utbot.db")
+
+    # the bot reads its configuration when it is imported
+    from utbot import stream_block_range
+
+    bc = Blockchain(steem_instance=Steem(node=node.url, num_retries=0), mode="head")
+    store = StateStore(os.path.join(data_dir, "state.db"))
+    first, last = chain.first, chain.last
+    runs = []
+    for name, kwargs in (
+        ("block by block", {}),
+        (f"catch-up x{batch_size}", {"max_batch_size": batch_size}),
+    ):
+        requests = node.requests
+        ops, elapsed = replay(stream_block_range, bc, store, first, last, **kwargs)
+        runs.append((name, ops, elapsed, node.requests - requests))
+    node.stop()
+    assert runs[0][1] == runs[1][1], "catch-up yields other operations"
+
+    print(
+        f"{'mode':<18}{'blocks':>8}{'ops':>8}{'requests':>10}{'s':>8}{'blocks/s':>10}"
+    )
+    for name, ops, elapsed, requests in runs:
+        print(
+            f"{name:<18}{args.blocks:>8}{len(ops):>8}{requests:>10}"
+            f"{elapsed:>8.2f}{args.blocks / elapsed:>10.0f}"
+        )
+    print(f"speedup {runs[0][2] / runs[1][2]:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
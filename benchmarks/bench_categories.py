@@ -0,0 +1,89 @@
+"""Compares the category registry with the per-call set building it replaced.
+
+Classifies synthetic posts as contributions and task requests and resolves
+the task type and embed color, one post at a time and in bulk.
+
+Usage: python benchmarks/bench_categories.py [--posts N] [--repeat N]
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "utbot"))
+
+from categories import CATEGORIES  # noqa: E402
+from constants import CATEGORIES_PROPERTIES, TASKS_PROPERTIES  # noqa: E402
+
+OTHER_TAGS = ["steem", "python", "open-source", "busy", "steemit", "blog", "life"]
+
+
+def legacy_classify(post: dict) -> tuple:
+    """The checks of utils and embeds before the registry."""
+    tags = post["tags"]
+    contribution = "utopian-io" in tags and not set(
+        CATEGORIES_PROPERTIES.keys()
+    ).isdisjoint(set(tags))
+    task_request = "utopian-io" in tags and not set(TASKS_PROPERTIES.keys()).isdisjoint(
+        set(tags)
+    )
+    color = None
+    for tag in tags:
+        if tag in TASKS_PROPERTIES:
+            color = int(TASKS_PROPERTIES[tag]["color"][1:], 16)
+            break
+    return contribution, task_request, color
+
+
+def registry_classify(post: dict) -> tuple:
+    found = CATEGORIES.classify(post["tags"])
+    color = found.task.color if found.task is not None else None
+    return found.is_contribution, found.is_task_request, color
+
+
+def fake_posts(count: int, seed: int = 1) -> list:
+    rng = random.Random(seed)
+    categories = list(CATEGORIES_PROPERTIES)
+    posts = []
+    for _ in range(count):
+        tags = rng.sample(OTHER_TAGS, rng.randrange(1, 5))
+        kind = rng.random()
+        if kind < 0.4:
+            tags = ["utopian-io", rng.choice(categories)] + tags
+        elif kind < 0.6:
+            tags = ["utopian-io", "task-" + rng.choice(categories)] + tags
+        posts.append({"tags": tags})
+    return posts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--posts", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    posts = fake_posts(args.posts)
+    legacy = [legacy_classify(p) for p in posts]
+    assert legacy == [registry_classify(p) for p in posts], "results differ"
+
+    def best(stmt) -> float:
+        return min(timeit.repeat(stmt, number=1, repeat=args.repeat))
+
+    timings = (
+        ("legacy", best(lambda: [legacy_classify(p) for p in posts])),
+        ("registry", best(lambda: [registry_classify(p) for p in posts])),
+        ("registry bulk", best(lambda: CATEGORIES.classify_many(posts))),
+    )
+    print(f"{'classifier':<16}{'posts':>8}{'ms':>10}{'us/post':>10}")
+    for name, elapsed in timings:
+        print(
+            f"{name:<16}{len(posts):>8}{elapsed * 1000:>10.1f}"
+            f"{elapsed / len(posts) * 1e6:>10.2f}"
+        )
+    print(f"speedup {timings[0][1] / timings[1][1]:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
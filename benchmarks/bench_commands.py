@@ -0,0 +1,158 @@
+"""Compares the command parser with the regular expression it replaced.
+
+Runs both on a corpus of reviewer comments, checks that they find the same
+arguments and measures pathological bodies of growing size.
+
+Usage: python benchmarks/bench_commands.py [--repeat N] [--size BYTES]
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "utbot"))
+
+from commands import iter_raw_commands  # noqa: E402
+from constants import get_bot, get_task_examples  # noqa: E402
+
+BOT_PREFIX, BOT_NAME = get_bot()[:2]
+MSG_TASK_EXAMPLE_ONE_LINE, MSG_TASK_EXAMPLE_MULT_LINES = get_task_examples()
+
+# The regular expression used by parse_command before the command parser
+LEGACY_CMD_RE = re.compile(
+    rf"""
+(?P<bot_cmd>{BOT_PREFIX}{BOT_NAME})     # bot called
+"""
+    r"""
+(?:
+    (?:
+        [ \t]+(?P<help>help)                # help command with preceding space
+    )
+    | (?:\s+(?:--)?(?:
+          (?:status:?\s+?(?P<status>open|in[ ]progress|closed))                     # status [open, in progress, closed]
+        | (?:bounty:?\s+?(?P<bounty>(?:\s*?\d+(?:\.\d+?)?[ ]\w+(?:\s*?,\s*?)?)+))   # bounty 00 name[, 01 name2]
+        | (?:description:?\s+?"(?P<description>.+?)")     # description "text"
+        | (?:note:?\s+?"(?P<note>.+?)")     # note "text"
+        | (?:skills:?\s+?"(?P<skills>(?:[-_\w ]+(?:\s*?,?\s*?))*)")   # skills skillone[, skilltwo, ...]
+        | (?:discord:?\s+?(?P<discord><@!?\d+>|.+?[#]\d{4}))                 # <@00000000000> | username#0000
+        | (?:deadline:?\s+?(?P<deadline>\d{4}-\d{2}-\d{2})(?:T\d{2}:\d{2}:\d{2}(?:Z|[+-]\d{4})?)?) # deadline YYYY-MM-DD (considers only date)
+        | (?:assignees:?\s+?"(?P<assignees>(?:@[\w\d.-]+(?:\s*?,\s*?)?)*)")  # naive regex
+    );?)*
+)?
+""",
+    flags=re.VERBOSE | re.IGNORECASE | re.MULTILINE,
+)
+
+REVIEW = (
+    "Thank you for your contribution.\n\n"
+    "- The tutorial is well structured and the code is [on GitHub]"
+    "(https://github.com/user/repo).\n"
+    "- Try to explain the steps in more detail, e.g. why `asyncio` is used.\n\n"
+    "Your contribution has been evaluated according to "
+    "[Utopian policies and guidelines](https://join.utopian.io/guidelines), "
+    "as well as a predefined set of questions pertaining to the category.\n\n"
+    "To view those questions and the relevant answers related to your post, "
+    "[click here](https://review.utopian.io/result/8/1a2b3c).\n\n"
+    "---- \n"
+    "Need help? Write a ticket on https://support.utopian.io/.\n"
+    "Chat with us on [Discord](https://discord.gg/uTyJkNm).\n"
+    "[[utopian-moderator]]"
+)
+
+CORPUS = [
+    REVIEW,
+    REVIEW.replace("Thank you", "Hi, thank you") * 3,
+    "Congratulations! This post has been upvoted from the communal account.",
+    "Great task request, I'll ping the team on Discord!",
+    f"{BOT_PREFIX}{BOT_NAME} help",
+    f"Let me call the bot.\n\n{BOT_PREFIX}{BOT_NAME}  HELP please",
+    MSG_TASK_EXAMPLE_ONE_LINE,
+    MSG_TASK_EXAMPLE_MULT_LINES,
+    f"{REVIEW}\n\n{MSG_TASK_EXAMPLE_MULT_LINES}",
+    f"{BOT_PREFIX}{BOT_NAME} status: in progress\n"
+    'assignees: "@alice, @bob"\n'
+    "deadline: 2018-08-31T12:00:00Z\n"
+    'note: "Send a PR to the develop branch"',
+    f'{BOT_PREFIX}{BOT_NAME} --status closed; --note "Done by @alice"',
+    f'{BOT_PREFIX}{BOT_NAME} bounty 20 SBD, 10 STEEM skills "python, steem"\n\n'
+    f"Edit: {BOT_PREFIX}{BOT_NAME} status open",
+]
+
+# (name, start, repeated part, end, repeats timed with the regex); the regex
+# backtracks exponentially on unclosed skills, every word doubles the time
+PATHOLOGICAL = [
+    ("skills without a closing quote", 'skills "', "a ", "!", (4, 6, 8)),
+    ("bounty items", "bounty ", "1 a ", "", (1000, 10000, 50000)),
+    ("bot calls", "", f"{BOT_PREFIX}{BOT_NAME} ", "", (1000, 10000, 30000)),
+    ("discord without a tag", "discord ", "x", "", (1000, 10000, 200000)),
+    ("long reviews", "", REVIEW, "", (10, 100, 300)),
+]
+
+
+def legacy_parse(text: str) -> list:
+    return [found.groupdict() for found in LEGACY_CMD_RE.finditer(text)]
+
+
+def parse(text: str) -> list:
+    return list(iter_raw_commands(text))
+
+
+def check_corpus() -> int:
+    mismatches = 0
+    for text in CORPUS:
+        if legacy_parse(text) != parse(text):
+            mismatches += 1
+            print(f"mismatch: {text!r}")
+    return mismatches
+
+
+def build(case: tuple, repeat: int) -> str:
+    _, start, part, end, _ = case
+    if start:
+        start = f"{BOT_PREFIX}{BOT_NAME} {start}"
+    return start + part * repeat + end
+
+
+def time_once(func, text: str) -> float:
+    start = time.perf_counter()
+    func(text)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=2000)
+    parser.add_argument("--size", type=int, default=200000)
+    args = parser.parse_args()
+    print(f"corpus mismatches: {check_corpus()} of {len(CORPUS)} comments\n")
+    print(f"{'corpus':<32}{'comments':>10}{'regex us':>12}{'parser us':>12}")
+    groups = (
+        ("without a call", [text for text in CORPUS if not parse(text)]),
+        ("with a call", [text for text in CORPUS if parse(text)]),
+    )
+    for name, texts in groups:
+        row = f"{name:<32}{len(texts):>10}"
+        for func in (legacy_parse, parse):
+            elapsed = timeit.timeit(
+                lambda: [func(text) for text in texts], number=args.repeat
+            )
+            row += f"{elapsed / args.repeat / len(texts) * 1e6:>12.2f}"
+        print(row)
+    print(f"\n{'pathological body':<32}{'bytes':>10}{'regex s':>12}{'parser s':>12}")
+    for case in PATHOLOGICAL:
+        for repeat in case[4]:
+            text = build(case, repeat)
+            print(
+                f"{case[0]:<32}{len(text):>10}{time_once(legacy_parse, text):>12.4f}"
+                f"{time_once(parse, text):>12.4f}"
+            )
+        text = build(case, args.size // len(case[2]))
+        print(f"{case[0]:<32}{len(text):>10}{'-':>12}{time_once(parse, text):>12.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Measures filtering a batch of reviewed contributions against the seen store.
+
+Compares the SeenStore with the former in-memory ``defaultdict`` parsing dates
+with ``datetime.strptime``.
+
+Usage: python benchmarks/bench_dedup.py [--items N]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "utbot"))
+
+from dedup import SeenStore, parse_utc_timestamp  # noqa: E402
+from utils import get_author_perm_from_url  # noqa: E402
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def fake_contributions(items: int, reviewed_at: datetime) -> list:
+    return [
+        {
+            "url": f"https://steemit.com/utopian-io/@author{i % 500}/post-{i}",
+            "category": "development",
+            "review_date": (reviewed_at + timedelta(seconds=i)).strftime(DATE_FORMAT),
+        }
+        for i in range(items)
+    ]
+
+
+class LegacyFilter:
+    def __init__(self):
+        self.seen = defaultdict(dict)
+        self.now = datetime.utcnow()
+
+    def filter(self, contributions: list) -> list:
+        filtered = []
+        for c in contributions:
+            author, permlink = get_author_perm_from_url(c["url"])
+            review_date = datetime.strptime(c["review_date"], DATE_FORMAT)
+            if (
+                self.seen[author].get(permlink, self.now) + timedelta(minutes=6)
+                < review_date
+            ):
+                filtered.append(c)
+                self.seen[author][permlink] = review_date
+        return filtered
+
+
+class StoreFilter:
+    def __init__(self, path: str):
+        self.store = SeenStore(path, "bench", ttl=14 * 86400, min_interval=360)
+
+    def filter(self, contributions: list) -> list:
+        is_new = self.store.mark_many(
+            (
+                "/".join(get_author_perm_from_url(c["url"])),
+                parse_utc_timestamp(c["review_date"]),
+            )
+            for c in contributions
+        )
+        filtered = [c for c, new in zip(contributions, is_new) if new]
+        self.store.flush()
+        return filtered
+
+
+def run(name: str, factory, batch: list):
+    dedup = factory()
+    start = time.perf_counter()
+    first = len(dedup.filter(batch))
+    first_time = time.perf_counter() - start
+    start = time.perf_counter()
+    second = len(dedup.filter(batch))
+    second_time = time.perf_counter() - start
+    del dedup
+    tracemalloc.start()
+    dedup = factory()
+    dedup.filter(batch)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"{name:<16}{first_time * 1000:>12.1f}{second_time * 1000:>12.1f}"
+        f"{current / 1024:>12.0f}{first:>8}{second:>8}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=10000)
+    args = parser.parse_args()
+    batch = fake_contributions(args.items, datetime.utcnow() + timedelta(minutes=10))
+    print(
+        f"{'filter':<16}{'new ms':>12}{'seen ms':>12}{'KiB':>12}{'new':>8}{'again':>8}"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        run("defaultdict", LegacyFilter, batch)
+        run("SeenStore", lambda: StoreFilter(os.path.join(tmp, "seen.db")), batch)
+        run(
+            "SeenStore reload", lambda: StoreFilter(os.path.join(tmp, "seen.db")), batch
+        )
+
+
+if __name__ == "__main__":
+    main()
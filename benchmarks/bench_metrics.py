@@ -0,0 +1,121 @@
+"""Measures the overhead of the metrics on the ingestion hot path.
+
+Times single metric updates and scanning of synthetic blocks with
+``ingest.iter_comment_ops``, which counts blocks and matched operations,
+against the same loop without metrics.
+
+Usage: python benchmarks/bench_metrics.py [--blocks N] [--calls N]
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "utbot"))
+
+from ingest import BLOCKS_SCANNED, comment_ops_in_block, iter_comment_ops  # noqa: E402
+from metrics import REGISTRY, Counter, Histogram  # noqa: E402
+
+AUTHORS = frozenset(["espoem", "elear", "suesa"])
+
+
+def fake_block(num: int) -> dict:
+    operations = [
+        {
+            "type": "comment_operation",
+            "value": {
+                "author": "espoem" if (num + i) % 50 == 0 else f"user{i}",
+                "parent_author": "author",
+                "permlink": f"re-{num}-{i}",
+                "body": "!utbot status open",
+            },
+        }
+        for i in range(20)
+    ]
+    operations.append({"type": "vote_operation", "value": {"voter": "x"}})
+    return {
+        "timestamp": "2018-08-01T00:00:00",
+        "transaction_ids": [f"trx{i}" for i in range(len(operations))],
+        "transactions": [{"operations": [op]} for op in operations],
+    }
+
+
+class FakeFetcher:
+    """Yields the same blocks as BlockFetcher.blocks, counting them in ranges."""
+
+    def __init__(self, blocks: list, range_size: int = 10):
+        self.block_list = blocks
+        self.range_size = range_size
+
+    def blocks(self, start: int):
+        for i in range(0, len(self.block_list), self.range_size):
+            for num, block in enumerate(
+                self.block_list[i : i + self.range_size], start + i
+            ):
+                yield num, block
+            # what BlockFetcher._record adds per range
+            self._record(min(self.range_size, len(self.block_list) - i))
+
+    def _record(self, count: int):
+        BLOCKS_SCANNED.inc(count)
+
+
+def bare_comment_ops(blocks: list, start: int):
+    for num, block in enumerate(blocks, start):
+        yield from comment_ops_in_block(block, num, AUTHORS)
+
+
+def per_call(func, calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return (time.perf_counter() - start) / calls * 1e9
+
+
+def best_of(func, repeat: int = 5) -> tuple:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--blocks", type=int, default=20000)
+    parser.add_argument("--calls", type=int, default=200000)
+    args = parser.parse_args()
+
+    counter = Counter("bench_counter", "")
+    histogram = Histogram("bench_histogram", "", ["method"])
+    child = histogram.labels("block_api.get_block")
+    print(f"{'update':<28}{'ns/call':>10}")
+    print(f"{'empty call':<28}{per_call(lambda: None, args.calls):>10.0f}")
+    print(f"{'counter inc':<28}{per_call(counter.inc, args.calls):>10.0f}")
+    print(
+        f"{'histogram labels().observe':<28}"
+        f"{per_call(lambda: histogram.labels('x').observe(0.1), args.calls):>10.0f}"
+    )
+    print(
+        f"{'histogram child observe':<28}"
+        f"{per_call(lambda: child.observe(0.1), args.calls):>10.0f}"
+    )
+
+    blocks = [fake_block(n) for n in range(args.blocks)]
+    bare_time, bare = best_of(lambda: sum(1 for _ in bare_comment_ops(blocks, 1)))
+    counted_time, counted = best_of(
+        lambda: sum(1 for _ in iter_comment_ops(FakeFetcher(blocks), 1, AUTHORS))
+    )
+    print()
+    print(f"{'scan':<28}{'ms':>10}{'ops':>8}")
+    print(f"{'without metrics':<28}{bare_time * 1000:>10.1f}{bare:>8}")
+    print(f"{'with metrics':<28}{counted_time * 1000:>10.1f}{counted:>8}")
+    print(f"overhead {(counted_time / bare_time - 1) * 100:+.1f} %")
+    print(f"rendered {len(REGISTRY.render())} bytes of metrics")
+
+
+if __name__ == "__main__":
+    main()
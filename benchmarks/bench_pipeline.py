@@ -0,0 +1,482 @@
+"""Runs the whole bot against local fake services and reports its performance.
+
+A fake Steem node serves synthetic or recorded blocks, reviewer comments and
+task requests and accepts the bot's broadcasts, a fake Discord webhook and a
+fake utopian.rocks complete the setup (see ``fakes.py``). The bot runs
+unchanged from ``listen_blockchain_comments`` through ``process_cmd_comments``
+to ``send_summary_to_steem`` and ``send_message_to_discord``; its stage
+functions are only wrapped to time them.
+
+Reports the throughput, latency percentiles per stage and the peak RSS seen
+while each stage was running, all stages share one process. The task board
+must hold the state of the last task command at every task request, however
+the commands were coalesced. The results are saved as JSON, ``--compare``
+prints the change against an earlier run.
+
+Usage: python benchmarks/bench_pipeline.py [--blocks N] [--commands N]
+    [--chain FILE] [--engine threads|asyncio] [--output FILE] [--compare FILE]
+"""
+import argparse
+import asyncio
+import functools
+import json
+import logging
+import os
+import platform
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+
+from beemgraphenebase.account import PrivateKey
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "utbot"))
+
+import ingest  # noqa: E402
+from checkpoint import StateStore  # noqa: E402
+from commands import command_action, merge_commands, parse_commands  # noqa: E402
+from fakes import (  # noqa: E402
+    Chain,
+    FakeContributions,
+    FakeSteemNode,
+    FakeWebhook,
+    synthetic_chain,
+    synthetic_contributions,
+)
+from feed import JsonFeed  # noqa: E402
+from settings import get_config  # noqa: E402
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+ACCOUNT = "utbot-bench"
+STAGES = ("fetch", "enqueue", "parse", "update", "steem", "discord", "end_to_end")
+_AUTHORPERM_RE = re.compile(r"@([\w.-]+/[\w.-]+)")
+
+
+def percentile(values: list, p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * p / 100), len(ordered) - 1)]
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        # ru_maxrss is in KiB on Linux and in bytes on macOS
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+class StageTimer:
+    """Collects latencies per stage and the peak RSS while a stage is active."""
+
+    def __init__(self, sample_interval: float = 0.02):
+        self.latencies = {stage: [] for stage in STAGES}
+        self.active = {stage: 0 for stage in STAGES}
+        self.peak_rss = {stage: 0 for stage in STAGES}
+        self.last_event = time.time()
+        self.sample_interval = sample_interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def begin(self, stage: str) -> float:
+        with self._lock:
+            self.active[stage] += 1
+        return time.perf_counter()
+
+    def end(self, stage: str, started: float):
+        self.done(stage, time.perf_counter() - started)
+
+    def done(self, stage: str, elapsed: float):
+        with self._lock:
+            self.active[stage] -= 1
+        self.record(stage, elapsed)
+
+    def record(self, stage: str, elapsed: float):
+        with self._lock:
+            self.latencies[stage].append(elapsed)
+            self.last_event = time.time()
+
+    def idle(self) -> bool:
+        with self._lock:
+            return not any(self.active.values())
+
+    def timed(self, stage: str, func):
+        """Wraps a function or coroutine function to time its calls."""
+        if asyncio.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                started = self.begin(stage)
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    self.end(stage, started)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = self.begin(stage)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.end(stage, started)
+
+        return wrapper
+
+    def timed_future(self, stage: str, func):
+        """Wraps a function returning a future to time it until the future is done."""
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = self.begin(stage)
+            try:
+                future = func(*args, **kwargs)
+            except Exception:
+                self.end(stage, started)
+                raise
+            if isinstance(future, Future):
+                future.add_done_callback(lambda _: self.end(stage, started))
+            else:
+                self.end(stage, started)
+            return future
+
+        return wrapper
+
+    def sample(self):
+        while not self._stop.wait(self.sample_interval):
+            rss = rss_bytes()
+            with self._lock:
+                for stage, count in self.active.items():
+                    if count:
+                        self.peak_rss[stage] = max(self.peak_rss[stage], rss)
+
+    def start_sampling(self):
+        thread = threading.Thread(target=self.sample, name="rss-sampler")
+        thread.daemon = True
+        thread.start()
+
+    def stop_sampling(self):
+        self._stop.set()
+
+
+class DiscordTracker:
+    """Matches the messages received by the fake webhook with the sent ones.
+
+    Task messages are also traced back to the first block serving a command
+    at their task request that no earlier message covered.
+    """
+
+    def __init__(self, timer: StageTimer, node: FakeSteemNode, reviewers: frozenset):
+        self.timer = timer
+        self.node = node
+        self.sent = {}
+        self.seen = 0
+        self.commands = {}
+        for block_num, authorperm in node.chain.comment_ops(reviewers):
+            post = node.chain.posts.get(authorperm)
+            if post is None:
+                continue
+            root = f'{post["root_author"]}/{post["root_permlink"]}'
+            self.commands.setdefault(root, []).append(block_num)
+        self._lock = threading.Lock()
+
+    def send(self, content: str):
+        with self._lock:
+            for line in content.splitlines():
+                self.timer.begin("discord")
+                self.sent.setdefault(line, []).append(time.time())
+
+    def poll(self, webhook: FakeWebhook):
+        messages = webhook.messages()
+        with self._lock:
+            new, self.seen = messages[self.seen :], len(messages)
+            for received_at, line in new:
+                sent = self.sent.get(line)
+                if sent:
+                    self.timer.done("discord", received_at - sent.pop(0))
+                match = _AUTHORPERM_RE.search(line)
+                blocks = self.commands.get(match.group(1)) if match else None
+                if not blocks:
+                    continue
+                served = [self.node.served_at.get(num) for num in blocks]
+                covered = [t for t in served if t is not None and t <= received_at]
+                if covered:
+                    self.timer.record("end_to_end", received_at - min(covered))
+                    self.commands[match.group(1)] = [
+                        num
+                        for num, t in zip(blocks, served)
+                        if t is None or t > received_at
+                    ]
+
+    def pending(self) -> int:
+        with self._lock:
+            return sum(len(started) for started in self.sent.values())
+
+
+def configure(args, node, webhook, key: str, data_dir: str):
+    config = get_config()
+    config["steem"].update(nodes=[node.url], posting_key=key, account=ACCOUNT)
+    config["ingest"].update(mode="blocks", nodes=[])
+    config["stream"]["state_db"] = os.path.join(data_dir, "utbot.db")
+    config["queue"]["db"] = os.path.join(data_dir, "utbot.db")
+    config["outbox"]["steem_interval"] = args.steem_interval
+    config["tasks"]["coalesce_window"] = args.coalesce_window
+    config["feed"].update(min_interval=1, max_interval=5)
+    config["discord"]["webhooks"].update(
+        tasks=webhook.webhook("tasks"), contributions=webhook.webhook("contributions")
+    )
+    config["engine"]["mode"] = args.engine
+    config["metrics"]["port"] = 0
+    config["profiling"]["signals"] = False
+    StateStore(config["stream"]["state_db"]).set("blocks", node.chain.first - 1)
+
+
+def instrument(utbot, timer: StageTimer, tracker: DiscordTracker):
+    """Replaces the bot's stage functions with timed ones."""
+    for cls in (ingest.BlockFetcher, utbot.AsyncBlockFetcher):
+        cls.fetch_range = timer.timed("fetch", cls.__dict__["fetch_range"])
+    utbot.enqueue_comment_op = timer.timed("enqueue", utbot.enqueue_comment_op)
+    utbot.process_cmd_comments = timer.timed("parse", utbot.process_cmd_comments)
+    utbot.update_task = timer.timed("update", utbot.update_task)
+    utbot.send_summary_to_steem = timer.timed_future(
+        "steem", utbot.send_summary_to_steem
+    )
+    utbot.reply_to_comment = timer.timed_future("steem", utbot.reply_to_comment)
+    send_message_to_discord = utbot.send_message_to_discord
+
+    def send(url, content, embeds, origin=None):
+        tracker.send(content)
+        return send_message_to_discord(url, content, embeds, origin)
+
+    utbot.send_message_to_discord = send
+
+
+def wait_until_done(utbot, timer, tracker, webhook, blocks, contributions, timeout):
+    """Waits until every stage is idle and all messages arrived.
+
+    :return: seconds until the last block was scanned or None on a timeout
+    """
+    started = time.time()
+    scanned_at = None
+    while time.time() - started < timeout:
+        time.sleep(0.1)
+        tracker.poll(webhook)
+        if scanned_at is None and ingest.BLOCKS_SCANNED._value.value >= blocks:
+            scanned_at = time.time()
+        if (
+            scanned_at is not None
+            and len(webhook.messages("contributions")) >= contributions
+            and utbot.QUEUE_COMMENTS.qsize() == 0
+            and utbot.TASK_UPDATES.stats()["pending"] == 0
+            and utbot.OUTBOX.stats()["pending"] == 0
+            and tracker.pending() == 0
+            and timer.idle()
+        ):
+            return scanned_at - started
+    return None
+
+
+def check_task_board(utbot, chain: Chain) -> list:
+    """Compares the task board with the last task command at every task request.
+
+    :return: list of task requests whose state differs
+    """
+    expected = {}
+    for num in sorted(chain.blocks):
+        for tx in chain.blocks[num]["transactions"]:
+            for op in tx["operations"]:
+                value = op["value"]
+                if op["type"] != "comment_operation" or "body" not in value:
+                    continue
+                parsed_cmd = merge_commands(parse_commands(value["body"]))
+                if command_action(parsed_cmd, value["author"], ACCOUNT) == "task":
+                    root = f'@{value["parent_author"]}/{value["parent_permlink"]}'
+                    expected[root] = parsed_cmd
+    wrong = []
+    for root, parsed_cmd in sorted(expected.items()):
+        task = utbot.TASK_BOARD.get(root)
+        if task is None or (
+            task["status"],
+            task["deadline"],
+            task["note"],
+            task["assignees"],
+            task["bounty"],
+        ) != (
+            parsed_cmd["status"].upper(),
+            parsed_cmd["deadline"],
+            parsed_cmd["note"],
+            parsed_cmd["assignees"] or [],
+            parsed_cmd["bounty"] or [],
+        ):
+            wrong.append(root)
+    return wrong
+
+
+def summarize(args, timer: StageTimer, elapsed: float, scan_time: float, node, webhook):
+    stages = {}
+    for stage in STAGES:
+        values = timer.latencies[stage]
+        if not values:
+            continue
+        stages[stage] = {
+            "count": len(values),
+            "p50": percentile(values, 50),
+            "p90": percentile(values, 90),
+            "p99": percentile(values, 99),
+            "max": max(values),
+            "peak_rss": timer.peak_rss[stage],
+        }
+    try:
+        commit = subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            stderr=subprocess.DEVNULL,
+            universal_newlines=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    blocks = node.chain.last - node.chain.first + 1
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "args": vars(args),
+        "elapsed": elapsed,
+        "throughput": {
+            "blocks_per_sec": blocks / scan_time,
+            "comments_per_sec": len(timer.latencies["parse"]) / elapsed,
+            "broadcasts_per_sec": len(node.broadcasts) / elapsed,
+            "messages_per_sec": len(webhook.messages()) / elapsed,
+        },
+        "stages": stages,
+        "max_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+    }
+
+
+def print_results(results: dict, previous: dict = None):
+    def change(new, old):
+        if not old:
+            return ""
+        return f"{(new / old - 1) * 100:>+9.1f}%"
+
+    print(f"{'throughput':<22}{'per sec':>12}")
+    for name, value in results["throughput"].items():
+        old = previous["throughput"].get(name) if previous else None
+        print(f"{name:<22}{value:>12.1f}{change(value, old)}")
+    print()
+    header = f"{'stage':<12}{'count':>7}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}"
+    print(f"{header}{'max ms':>10}{'peak RSS MiB':>14}")
+    for stage, s in results["stages"].items():
+        old = previous["stages"].get(stage, {}).get("p90") if previous else None
+        rss = f"{s['peak_rss'] / 2 ** 20:.1f}" if s["peak_rss"] else "-"
+        print(
+            f"{stage:<12}{s['count']:>7}{s['p50'] * 1000:>10.1f}"
+            f"{s['p90'] * 1000:>10.1f}{s['p99'] * 1000:>10.1f}{s['max'] * 1000:>10.1f}"
+            f"{rss:>14}{change(s['p90'], old)}"
+        )
+    print()
+    print(
+        f"elapsed {results['elapsed']:.1f} s, max RSS {results['max_rss'] / 2 ** 20:.1f} MiB"
+    )
+    if previous:
+        print(f"changes of throughput and p90 against {previous['commit']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--blocks", type=int, default=2000)
+    parser.add_argument("--tasks", type=int, default=50)
+    parser.add_argument("--commands", type=int, default=200)
+    parser.add_argument("--contributions", type=int, default=100)
+    parser.add_argument("--chain", help="chain recorded with fakes.py")
+    parser.add_argument("--engine", choices=("threads", "asyncio"), default="threads")
+    parser.add_argument("--block-interval", type=float, default=0)
+    parser.add_argument("--latency", type=float, default=0.002)
+    # beem's transaction buffer is shared, broadcasts must not overlap
+    parser.add_argument("--steem-interval", type=float, default=0.5)
+    parser.add_argument("--coalesce-window", type=float, default=1.0)
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--output", help="result file, benchmarks/results by default")
+    parser.add_argument("--compare", help="result file of an earlier run")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    reviewers = get_config()["steem"]["reviewers"]
+    if args.chain:
+        chain = Chain.load(args.chain)
+    else:
+        chain = synthetic_chain(args.blocks, args.tasks, args.commands, reviewers)
+    key = PrivateKey()
+    node = FakeSteemNode(
+        chain, format(key.pubkey, "STM"), args.block_interval, args.latency
+    ).start()
+    webhook = FakeWebhook(latency=args.latency).start()
+    # the bot announces only reviews made 6 minutes after it started
+    contributions = synthetic_contributions(args.contributions, time.time() + 600)
+    feed = FakeContributions(contributions, latency=args.latency).start()
+    data_dir = tempfile.mkdtemp(prefix="utbot-bench-")
+    configure(args, node, webhook, str(key), data_dir)
+
+    # the bot reads its configuration when it is imported
+    import utbot
+
+    utbot.UR_BATCH_CONTRIBUTIONS_URL = feed.feed_url
+    utbot.UR_CONTRIBUTIONS_FEED = JsonFeed(
+        feed.feed_url, min_interval=1, max_interval=5
+    )
+    timer = StageTimer()
+    tracker = DiscordTracker(timer, node, frozenset(reviewers))
+    instrument(utbot, timer, tracker)
+
+    timer.start_sampling()
+    scheduler = utbot.create_scheduler()
+    started = time.time()
+    utbot.background(scheduler)
+    scan_time = wait_until_done(
+        utbot,
+        timer,
+        tracker,
+        webhook,
+        len(chain.blocks),
+        len(contributions),
+        args.timeout,
+    )
+    elapsed = timer.last_event - started
+    timer.stop_sampling()
+    scheduler.stop()
+    if scan_time is None:
+        print(f"Timed out after {args.timeout:.0f} s")
+        sys.exit(1)
+    wrong = check_task_board(utbot, node.chain)
+    if wrong:
+        print(f"Task board differs from the last command at {', '.join(wrong)}")
+        sys.exit(1)
+
+    results = summarize(args, timer, elapsed, scan_time, node, webhook)
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+    print_results(results, previous)
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(
+            RESULTS_DIR, f"pipeline-{time.strftime('%Y%m%d-%H%M%S')}.json"
+        )
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"saved to {output}")
+    for server in (node, webhook, feed):
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
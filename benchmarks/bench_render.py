@@ -0,0 +1,156 @@
+"""Compares the renderer with the DiscordEmbed and summary builders it replaced.
+
+Renders the Discord embed and the Steem summary of synthetic task commands
+and the embeds of synthetic contributions with the former builders and with
+``render.py``, and checks that both produce the same payloads.
+
+Usage: python benchmarks/bench_render.py [--tasks N] [--repeat N]
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "utbot"))
+
+from constants import CATEGORIES_PROPERTIES  # noqa: E402
+from delivery import embed_to_dict  # noqa: E402
+from legacy_render import (  # noqa: E402
+    build_bot_tr_message,
+    build_contribution_embed,
+    build_discord_tr_embed,
+)
+from render import (  # noqa: E402
+    render_contribution_embed,
+    render_task_embed,
+    render_task_summary,
+)
+
+STATUSES = ["open", "in progress", "closed"]
+ACCOUNTS = ["espoem", "elear", "amosbastian", "didic", "mcfarhat", "favcau"]
+
+
+def fake_tasks(count: int, seed: int = 1) -> list:
+    """Creates root posts of task requests with commands issued at them."""
+    rng = random.Random(seed)
+    categories = list(CATEGORIES_PROPERTIES)
+    tasks = []
+    for i in range(count):
+        post = {
+            "author": rng.choice(ACCOUNTS),
+            "title": f"Task request number {i}",
+            "tags": ["utopian-io", "task-" + rng.choice(categories), "python"],
+        }
+        cmd = {
+            "help": None,
+            "status": rng.choice(STATUSES),
+            "bounty": rng.choice([None, ["10 SBD"], ["5 STEEM", "1 SBD"]]),
+            "description": rng.choice([None, "Add a command line interface"]),
+            "note": rng.choice([None, "Ask in the comments"]),
+            "skills": rng.choice([None, ["python"], ["python", "sqlite"]]),
+            "discord": rng.choice([None, "espoem#1234"]),
+            "deadline": rng.choice([None, "2018-08-01"]),
+            "assignees": rng.choice([None, rng.sample(ACCOUNTS, 2)]),
+        }
+        tasks.append((post, cmd))
+    return tasks
+
+
+def fake_contributions(count: int, seed: int = 1) -> list:
+    rng = random.Random(seed)
+    categories = list(CATEGORIES_PROPERTIES)
+    return [
+        {
+            "author": rng.choice(ACCOUNTS),
+            "title": f"Contribution number {i}",
+            "category": rng.choice(categories),
+            "moderator": rng.choice(ACCOUNTS),
+            "score": rng.randrange(0, 100),
+            "staff_picked": rng.random() < 0.1,
+            "created": "2018-07-01 12:00:00",
+            "review_date": "2018-07-02 12:00:00",
+        }
+        for i in range(count)
+    ]
+
+
+def normalize(embed: dict) -> dict:
+    """Drops the timestamp and empty values, which Discord ignores."""
+    result = {}
+    for key, value in embed.items():
+        if isinstance(value, dict):
+            value = {k: v for k, v in value.items() if v is not None}
+            if not any(value.values()):
+                continue
+        if key != "timestamp" and value is not None and value != []:
+            result[key] = value
+    return result
+
+
+def strip_update(body: str) -> str:
+    return body.rsplit("\n\n", 1)[0]
+
+
+def legacy_task(post: dict, cmd: dict) -> tuple:
+    embed = embed_to_dict(build_discord_tr_embed(post, cmd))
+    return embed, build_bot_tr_message(cmd)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tasks", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    tasks = fake_tasks(args.tasks)
+    contributions = fake_contributions(args.tasks)
+    for post, cmd in tasks:
+        embed, body = legacy_task(post, cmd)
+        assert normalize(embed) == normalize(render_task_embed(post, cmd))
+        assert strip_update(body) == strip_update(render_task_summary(cmd))
+    for contr in contributions:
+        embed = embed_to_dict(build_contribution_embed(contr))
+        assert normalize(embed) == normalize(render_contribution_embed(contr))
+
+    def best(stmt) -> float:
+        return min(timeit.repeat(stmt, number=1, repeat=args.repeat))
+
+    timings = (
+        ("legacy tasks", best(lambda: [legacy_task(p, c) for p, c in tasks])),
+        (
+            "render tasks",
+            best(
+                lambda: [
+                    (render_task_embed(p, c), render_task_summary(c)) for p, c in tasks
+                ]
+            ),
+        ),
+        (
+            "legacy contr.",
+            best(
+                lambda: [
+                    embed_to_dict(build_contribution_embed(c)) for c in contributions
+                ]
+            ),
+        ),
+        (
+            "render contr.",
+            best(lambda: [render_contribution_embed(c) for c in contributions]),
+        ),
+    )
+    print(f"{'renderer':<16}{'messages':>10}{'ms':>10}{'us/msg':>10}")
+    for name, elapsed in timings:
+        print(
+            f"{name:<16}{args.tasks:>10}{elapsed * 1000:>10.1f}"
+            f"{elapsed / args.tasks * 1e6:>10.2f}"
+        )
+    print(
+        f"speedup tasks {timings[0][1] / timings[1][1]:.1f}x, "
+        f"contributions {timings[2][1] / timings[3][1]:.1f}x"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Measures how long it takes to import the bot's modules in a fresh interpreter.
+
+Usage: python benchmarks/bench_startup.py [--repeat N]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BOT_DIR = os.path.join(ROOT, "utbot")
+
+SNIPPET = """
+import time
+start = time.perf_counter()
+{statement}
+print(time.perf_counter() - start)
+"""
+
+CASES = [
+    ("import constants", "import constants"),
+    ("import utils", "import utils"),
+    ("import settings", "import settings"),
+    ("settings.get_config()", "import settings; settings.get_config()"),
+]
+
+
+def measure(statement: str, repeat: int) -> list:
+    timings = []
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, "-c", SNIPPET.format(statement=statement)],
+            cwd=BOT_DIR,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=True,
+        )
+        timings.append(float(out.stdout.decode().strip().splitlines()[-1]))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+    print(f"{'case':<28}{'median ms':>12}{'min ms':>10}{'max ms':>10}")
+    for name, statement in CASES:
+        try:
+            timings = measure(statement, args.repeat)
+        except subprocess.CalledProcessError as e:
+            print(f"{name:<28}  failed: {e.stderr.decode().strip().splitlines()[-1]}")
+            continue
+        print(
+            f"{name:<28}{statistics.median(timings) * 1000:>12.2f}"
+            f"{min(timings) * 1000:>10.2f}{max(timings) * 1000:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Compares memory held by queued beem Comments and by compact CommentTask records.
+
+Usage: python benchmarks/bench_task_memory.py [--items N] [--votes N]
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "utbot"))
+
+from beem import Steem  # noqa: E402
+from beem.comment import Comment  # noqa: E402
+
+from records import CommentTask  # noqa: E402
+
+
+def fake_content(author: str, permlink: str, depth: int, body: str, votes: int):
+    """Builds a post in the format returned by ``condenser_api.get_content``."""
+    return {
+        "id": 1,
+        "author": author,
+        "permlink": permlink,
+        "category": "utopian-io",
+        "parent_author": "" if depth == 0 else "task-author",
+        "parent_permlink": "utopian-io" if depth == 0 else "task-request",
+        "title": "" if depth else "Task request title",
+        "body": body,
+        "json_metadata": json.dumps(
+            {"tags": ["utopian-io", "task-development", "steem"], "app": "steemit"}
+        ),
+        "created": "2018-08-01T12:00:00",
+        "last_update": "2018-08-01T12:00:00",
+        "active": "2018-08-01T12:00:00",
+        "last_payout": "1970-01-01T00:00:00",
+        "cashout_time": "2018-08-08T12:00:00",
+        "depth": depth,
+        "children": 3,
+        "net_rshares": 0,
+        "total_payout_value": "0.000 SBD",
+        "curator_payout_value": "0.000 SBD",
+        "pending_payout_value": "1.234 SBD",
+        "max_accepted_payout": "1000000.000 SBD",
+        "percent_steem_dollars": 10000,
+        "url": f"/utopian-io/@{author}/{permlink}",
+        "root_author": "task-author",
+        "root_permlink": "task-request",
+        "root_title": "Task request title",
+        "active_votes": [
+            {
+                "voter": f"voter{i}",
+                "weight": 100 + i,
+                "rshares": 1000000 + i,
+                "percent": 10000,
+                "reputation": 0,
+                "time": "2018-08-01T12:00:00",
+            }
+            for i in range(votes)
+        ],
+        "beneficiaries": [],
+    }
+
+
+def measure(build) -> int:
+    gc.collect()
+    tracemalloc.start()
+    items = build()
+    # drop beem's cache of recently created objects, only the items are measured
+    Comment.clear_cache()
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del items
+    return current
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--votes", type=int, default=30)
+    args = parser.parse_args()
+    steem = Steem(offline=True, node=[])
+    body = "!utbot status: open bounty: 20 SBD skills: python, steem\n" + "x" * 600
+    root_data = fake_content("task-author", "task-request", 0, "y" * 3000, args.votes)
+    datas = [
+        fake_content("reviewer", f"re-{i}", 1, f"{body} {i}", args.votes)
+        for i in range(args.items)
+    ]
+
+    def comments():
+        return [
+            (
+                Comment(data, steem_instance=steem),
+                Comment(root_data, steem_instance=steem),
+            )
+            for data in datas
+        ]
+
+    def tasks():
+        return [
+            CommentTask.from_comment(
+                Comment(data, steem_instance=steem), "@task-author/task-request"
+            )
+            for data in datas
+        ]
+
+    def payloads():
+        return [
+            json.dumps(
+                CommentTask.from_comment(
+                    Comment(data, steem_instance=steem), "@task-author/task-request"
+                ).to_payload()
+            )
+            for data in datas
+        ]
+
+    cases = [
+        ("(Comment, root Comment)", comments),
+        ("CommentTask", tasks),
+        ("CommentTask JSON payload", payloads),
+    ]
+    print(f"{'queued item':<28}{'total KiB':>12}{'bytes/item':>12}")
+    for name, build in cases:
+        total = measure(build)
+        print(f"{name:<28}{total / 1024:>12.1f}{total / args.items:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
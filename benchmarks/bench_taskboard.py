@@ -0,0 +1,95 @@
+"""Measures queries of the task board and its rebuild from SQLite.
+
+Fills a board with synthetic task requests, saves it, loads it again in a new
+board and times filtered and paginated queries against the in-memory indexes.
+
+Usage: python benchmarks/bench_taskboard.py [--tasks N] [--queries N]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "utbot"))
+
+from constants import CATEGORIES_PROPERTIES  # noqa: E402
+from taskboard import TaskBoard  # noqa: E402
+
+STATUSES = ["open", "in progress", "closed"]
+SKILLS = ["python", "javascript", "sqlite", "design", "video", "writing", "react"]
+
+QUERIES = (
+    ("all", {}),
+    ("status", {"status": "open"}),
+    ("status+category", {"status": "open", "category": "development"}),
+    ("skill", {"skill": "python"}),
+    ("deadline", {"due_after": "2018-08-01", "due_before": "2018-08-31"}),
+    ("page 5", {"status": "in progress", "offset": 200, "limit": 50}),
+)
+
+
+def fill(board: TaskBoard, count: int, seed: int = 1):
+    rng = random.Random(seed)
+    categories = list(CATEGORIES_PROPERTIES)
+    for i in range(count):
+        post = {
+            "author": f"author{i % 500}",
+            "permlink": f"task-request-{i}",
+            "url": f"/utopian-io/@author{i % 500}/task-request-{i}",
+            "title": f"Task request number {i}",
+            "tags": ["utopian-io", "task-" + rng.choice(categories)],
+        }
+        cmd = {
+            "status": rng.choice(STATUSES),
+            "skills": rng.sample(SKILLS, rng.randrange(0, 3)),
+            "bounty": None,
+            "deadline": f"2018-{rng.randrange(6, 12):02d}-{rng.randrange(1, 29):02d}",
+            "assignees": None,
+            "discord": None,
+            "description": None,
+            "note": None,
+        }
+        board.update(post, cmd, 1530000000 + i)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tasks", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        path = os.path.join(data_dir, "utbot.db")
+        start = time.perf_counter()
+        board = TaskBoard(path)
+        fill(board, args.tasks)
+        board.flush()
+        print(
+            f"filled and saved {args.tasks} tasks in {time.perf_counter() - start:.2f} s"
+        )
+
+        start = time.perf_counter()
+        loaded = TaskBoard(path)
+        loaded.load()
+        print(f"loaded {len(loaded)} tasks in {time.perf_counter() - start:.3f} s")
+
+        print(f"{'query':<18}{'total':>8}{'returned':>10}{'us/query':>10}")
+        for name, params in QUERIES:
+            result = loaded.query(**params)
+            elapsed = min(
+                timeit.repeat(
+                    lambda: loaded.query(**params), number=args.queries, repeat=3
+                )
+            )
+            print(
+                f"{name:<18}{result['total']:>8}{len(result['tasks']):>10}"
+                f"{elapsed / args.queries * 1e6:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Measures enqueue and dequeue throughput of the durable work queue.
+
+Usage: python benchmarks/bench_workqueue.py [--items N] [--dir PATH]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "utbot"))
+
+from workqueue import WorkQueue  # noqa: E402
+
+PAYLOAD = {"comment": "@reviewer/re-task-request-20180801t120000z", "root": "@a/b"}
+
+
+def bench_put(work_queue: WorkQueue, items: int) -> float:
+    start = time.perf_counter()
+    for i in range(items):
+        work_queue.put(PAYLOAD, key=f"put-{i}")
+    return time.perf_counter() - start
+
+
+def bench_put_many(work_queue: WorkQueue, items: int, batch: int = 100) -> float:
+    start = time.perf_counter()
+    for i in range(0, items, batch):
+        work_queue.put_many(
+            (PAYLOAD, f"many-{j}") for j in range(i, min(i + batch, items))
+        )
+    return time.perf_counter() - start
+
+
+def bench_get_ack(work_queue: WorkQueue, items: int) -> float:
+    start = time.perf_counter()
+    for _ in range(items):
+        work_queue.ack(work_queue.get(timeout=1))
+    return time.perf_counter() - start
+
+
+def bench_concurrent(work_queue: WorkQueue, items: int) -> float:
+    """One producer blocked by a bounded queue and one acking consumer."""
+
+    def consume():
+        for _ in range(items):
+            work_queue.ack(work_queue.get(timeout=5))
+
+    consumer = threading.Thread(target=consume)
+    start = time.perf_counter()
+    consumer.start()
+    for i in range(items):
+        work_queue.put(PAYLOAD, key=f"concurrent-{i}")
+    consumer.join()
+    return time.perf_counter() - start
+
+
+def report(name: str, items: int, elapsed: float):
+    print(f"{name:<28}{items:>8}{elapsed:>10.3f}{items / elapsed:>10.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=5000)
+    parser.add_argument("--dir", help="directory of the database, default is tmp")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        path = os.path.join(tmp, "bench.db")
+        cases = [
+            ("put", WorkQueue(path, "put"), bench_put),
+            ("put_many (100)", WorkQueue(path, "many"), bench_put_many),
+        ]
+        print(f"{'case':<28}{'items':>8}{'seconds':>10}{'ops/s':>10}")
+        for name, work_queue, func in cases:
+            report(name, args.items, func(work_queue, args.items))
+        report("get + ack", args.items, bench_get_ack(cases[0][1], args.items))
+        bounded = WorkQueue(path, "bounded", maxsize=100)
+        report(
+            "put | get + ack (max 100)",
+            args.items,
+            bench_concurrent(bounded, args.items),
+        )
+
+
+if __name__ == "__main__":
+    main()
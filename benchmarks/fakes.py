@@ -0,0 +1,591 @@
+"""Local stand-ins for the services the bot talks to.
+
+``FakeSteemNode`` answers the JSON-RPC calls of the bot and of beem from a
+chain of blocks and posts, ``FakeWebhook`` records Discord webhook posts and
+``FakeContributions`` serves the utopian.rocks batch endpoint. Chains are
+generated by ``synthetic_chain`` or loaded from a recording of a real node:
+
+    python benchmarks/fakes.py --node URL --from-block N --to-block M --output F
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "utbot"))
+
+from constants import CATEGORIES_PROPERTIES, get_bot  # noqa: E402
+
+CHAIN_CONFIG = {
+    "STEEM_CHAIN_ID": "0" * 64,
+    "STEEM_BLOCKCHAIN_VERSION": "0.20.5",
+    "STEEM_ADDRESS_PREFIX": "STM",
+    "STEEM_SYMBOL": {"nai": "@@000000021", "decimals": 3},
+    "SBD_SYMBOL": {"nai": "@@000000013", "decimals": 3},
+    "VESTS_SYMBOL": {"nai": "@@000000037", "decimals": 6},
+}
+COMMANDS = (
+    'status open bounty 10 SBD description "Add a REST endpoint" skills "python"',
+    "status in progress assignees @dev1, @dev2",
+    'status open deadline 2018-09-01 note "Looking for a reviewer"',
+    "status closed",
+    "help",
+)
+
+
+def _utc(timestamp: float) -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(timestamp))
+
+
+def make_post(
+    author: str,
+    permlink: str,
+    body: str,
+    parent: dict = None,
+    tags: tuple = ("utopian-io",),
+    created: float = 0,
+) -> dict:
+    """Creates a post or reply in the format of ``condenser_api.get_content``.
+
+    :param author: Author
+    :param permlink: Permlink
+    :param body: Body
+    :param parent: Replied post, None for a root post
+    :param tags: Tags of a root post
+    :param created: Epoch seconds of the post
+    :return: post
+    """
+    metadata = {"tags": list(tags)}
+    return {
+        "author": author,
+        "permlink": permlink,
+        "category": tags[0] if parent is None else parent["category"],
+        "parent_author": parent["author"] if parent else "",
+        "parent_permlink": parent["permlink"] if parent else tags[0],
+        "title": f"Task {permlink}" if parent is None else "",
+        "body": body,
+        "json_metadata": json.dumps(metadata),
+        "created": _utc(created),
+        "last_update": _utc(created),
+        "depth": parent["depth"] + 1 if parent else 0,
+        "root_author": parent["root_author"] if parent else author,
+        "root_permlink": parent["root_permlink"] if parent else permlink,
+        "url": f"/utopian-io/@{author}/{permlink}",
+        "active_votes": [],
+        "net_rshares": 0,
+        "author_reputation": 0,
+        "total_payout_value": "0.000 SBD",
+        "curator_payout_value": "0.000 SBD",
+        "pending_payout_value": "0.000 SBD",
+        "promoted": "0.000 SBD",
+        "max_accepted_payout": "1000000.000 SBD",
+        "cashout_time": "1969-12-31T23:59:59",
+        "children": 0,
+        "beneficiaries": [],
+    }
+
+
+class Chain:
+    """Blocks and posts served by the fake node."""
+
+    def __init__(self, blocks: dict, posts: dict):
+        """
+        :param blocks: Blocks by their number
+        :param posts: Posts by ``author/permlink``
+        """
+        self.blocks = blocks
+        self.posts = posts
+        self.first = min(blocks)
+        self.last = max(blocks)
+
+    def replies(self, author: str, permlink: str) -> list:
+        return [
+            p
+            for p in list(self.posts.values())
+            if p["parent_author"] == author and p["parent_permlink"] == permlink
+        ]
+
+    def comment_ops(self, authors: frozenset) -> list:
+        """Finds the comments of some authors.
+
+        :param authors: Authors of the comments
+        :return: list of ``(block_num, author/permlink)`` tuples
+        """
+        found = []
+        for num in sorted(self.blocks):
+            for trx in self.blocks[num]["transactions"]:
+                for op in trx["operations"]:
+                    if op["type"] != "comment_operation":
+                        continue
+                    value = op["value"]
+                    if value["author"] in authors and value["parent_author"]:
+                        found.append((num, f'{value["author"]}/{value["permlink"]}'))
+        return found
+
+    def save(self, path: str):
+        """Writes the chain as JSON lines."""
+        with open(path, "w") as f:
+            for num in sorted(self.blocks):
+                f.write(json.dumps({"block_num": num, "block": self.blocks[num]}))
+                f.write("\n")
+            for post in self.posts.values():
+                f.write(json.dumps({"post": post}) + "\n")
+
+    @classmethod
+    def load(cls, path: str) -> "Chain":
+        """Reads a chain written by save."""
+        blocks, posts = {}, {}
+        with open(path, "r") as f:
+            for line in f:
+                item = json.loads(line)
+                if "block" in item:
+                    blocks[item["block_num"]] = item["block"]
+                else:
+                    post = item["post"]
+                    posts[f'{post["author"]}/{post["permlink"]}'] = post
+        return cls(blocks, posts)
+
+
+def synthetic_chain(
+    blocks: int,
+    tasks: int,
+    commands: int,
+    reviewers: list,
+    start: int = 1000000,
+    ops_per_block: int = 20,
+    seed: int = 1,
+) -> Chain:
+    """Generates blocks with reviewer commands at task requests among other ops.
+
+    :param blocks: Number of blocks
+    :param tasks: Number of task requests
+    :param commands: Number of reviewer comments with bot commands
+    :param reviewers: Accounts of the reviewers
+    :param start: Number of the first block
+    :param ops_per_block: Operations in a block besides the commands
+    :param seed: Seed of the random generator
+    :return: chain
+    """
+    rng = random.Random(seed)
+    now = time.time()
+    bot = get_bot()
+    categories = [f"task-{c}" for c in CATEGORIES_PROPERTIES]
+    posts = {}
+    roots = []
+    for i in range(tasks):
+        root = make_post(
+            f"author{i}",
+            f"task-request-{i}",
+            "Task description",
+            tags=("utopian-io", rng.choice(categories)),
+            created=now,
+        )
+        posts[f'{root["author"]}/{root["permlink"]}'] = root
+        roots.append(root)
+    command_blocks = sorted(
+        rng.randrange(start, start + blocks) for _ in range(commands)
+    )
+    block_list = {}
+    for num in range(start, start + blocks):
+        ops = [
+            (
+                {
+                    "type": "comment_operation",
+                    "value": {
+                        "author": f"user{rng.randrange(10000)}",
+                        "parent_author": f"user{rng.randrange(10000)}",
+                        "permlink": f"re-{num}-{i}",
+                        "body": "Nice post!",
+                    },
+                }
+                if i % 2
+                else {"type": "vote_operation", "value": {"voter": f"user{i}"}}
+            )
+            for i in range(ops_per_block)
+        ]
+        while command_blocks and command_blocks[0] == num:
+            command_blocks.pop(0)
+            root = rng.choice(roots)
+            body = f"Reviewed.\n\n{bot.prefix}{bot.name} {rng.choice(COMMANDS)}"
+            reply = make_post(
+                rng.choice(reviewers),
+                f"re-task-{num}-{len(ops)}",
+                body,
+                root,
+                created=now,
+            )
+            posts[f'{reply["author"]}/{reply["permlink"]}'] = reply
+            fields = ("author", "permlink", "parent_author", "parent_permlink", "body")
+            ops.append(
+                {"type": "comment_operation", "value": {k: reply[k] for k in fields}}
+            )
+        block_list[num] = {
+            "block_id": f"{num:08x}" + "0" * 32,
+            "timestamp": _utc(now),
+            "transaction_ids": [f"{num:x}{i:04x}" for i in range(len(ops))],
+            "transactions": [{"operations": [op]} for op in ops],
+        }
+    return Chain(block_list, posts)
+
+
+def synthetic_contributions(count: int, reviewed_at: float, seed: int = 1) -> list:
+    """Generates reviewed contributions in the format of utopian.rocks.
+
+    :param count: Number of contributions
+    :param reviewed_at: Epoch seconds of the reviews
+    :param seed: Seed of the random generator
+    :return: list of contributions
+    """
+    rng = random.Random(seed)
+    categories = list(CATEGORIES_PROPERTIES)
+    now = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(reviewed_at))
+    return [
+        {
+            "url": f"https://steemit.com/utopian-io/@author{i}/contribution-{i}",
+            "title": f"Contribution {i}",
+            "author": f"author{i}",
+            "category": rng.choice(categories),
+            "moderator": "espoem",
+            "score": rng.randrange(100),
+            "staff_picked": False,
+            "created": now,
+            "review_date": now,
+        }
+        for i in range(count)
+    ]
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, handler, latency: float):
+        super().__init__(("127.0.0.1", 0), handler)
+        self.latency = latency
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return "http://%s:%d" % self.server_address[:2]
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, name=type(self).__name__)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # replies are written in several parts, don't let them wait for ACKs
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status: int, body: bytes = b"", headers: dict = None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        return json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+
+    def _wait(self):
+        with self.server.lock:
+            self.server.requests += 1
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+
+class _NodeHandler(_Handler):
+    def do_POST(self):
+        self._wait()
+        request = self._read_json()
+        single = isinstance(request, dict)
+        results = [self.server.answer(r) for r in ([request] if single else request)]
+        body = json.dumps(results[0] if single else results).encode("utf-8")
+        self._reply(200, body, {"Content-Type": "application/json"})
+
+
+class FakeSteemNode(_Server):
+    """JSON-RPC node serving a chain, the head follows a block interval.
+
+    Broadcast comments are added to the chain's posts, so the bot finds its
+    own replies like on a real node.
+    """
+
+    def __init__(
+        self,
+        chain: Chain,
+        public_key: str,
+        block_interval: float = 0,
+        latency: float = 0,
+    ):
+        """
+        :param chain: Served chain
+        :param public_key: Posting key of every account
+        :param block_interval: Seconds between blocks, all blocks exist at once if 0
+        :param latency: Seconds every request is delayed
+        """
+        super().__init__(_NodeHandler, latency)
+        self.chain = chain
+        self.public_key = public_key
+        self.block_interval = block_interval
+        self.started_at = time.monotonic()
+        self.served_at = {}
+        self.broadcasts = []
+
+    @property
+    def head(self) -> int:
+        if not self.block_interval:
+            return self.chain.last
+        elapsed = time.monotonic() - self.started_at
+        return min(
+            self.chain.first + int(elapsed / self.block_interval), self.chain.last
+        )
+
+    def _account(self, name: str) -> dict:
+        auth = {
+            "weight_threshold": 1,
+            "account_auths": [],
+            "key_auths": [[self.public_key, 1]],
+        }
+        return {
+            "id": 1,
+            "name": name,
+            "owner": auth,
+            "active": auth,
+            "posting": auth,
+            "memo_key": self.public_key,
+            "json_metadata": "",
+            "posting_json_metadata": "",
+            "created": "2018-01-01T00:00:00",
+        }
+
+    def _block(self, num: int) -> dict:
+        if num > self.head or num not in self.chain.blocks:
+            return {}
+        self.served_at.setdefault(num, time.time())
+        return {"block": self.chain.blocks[num]}
+
+    def _broadcast(self, trx: dict) -> dict:
+        for name, op in trx["operations"]:
+            if name == "comment":
+                parent = self.chain.posts.get(
+                    f'{op["parent_author"]}/{op["parent_permlink"]}'
+                )
+                post = make_post(op["author"], op["permlink"], op["body"], parent)
+                post["json_metadata"] = op["json_metadata"]
+                self.chain.posts[f'{op["author"]}/{op["permlink"]}'] = post
+        self.broadcasts.append((time.time(), trx))
+        return {"id": hashlib.sha1(json.dumps(trx).encode()).hexdigest()}
+
+    def answer(self, request: dict) -> dict:
+        """Answers a JSON-RPC request."""
+        method, params = request["method"], request.get("params")
+        if method == "call":
+            method = f"{params[0]}.{params[1]}"
+            params = params[2]
+        api, name = method.split(".", 1)
+        result = None
+        if name == "get_config":
+            result = CHAIN_CONFIG
+        elif name == "get_dynamic_global_properties":
+            head = self.head
+            result = {
+                "head_block_number": head,
+                "head_block_id": f"{head:08x}" + "0" * 32,
+                "time": _utc(time.time()),
+                "last_irreversible_block_num": head - 20,
+            }
+        elif name == "get_block":
+            result = self._block(params["block_num"])
+        elif name == "get_block_header":
+            result = {
+                "header": {
+                    "previous": f'{params["block_num"] - 1:08x}' + "0" * 32,
+                    "timestamp": _utc(time.time()),
+                }
+            }
+        elif name in ("find_accounts", "get_accounts"):
+            names = params[0] if api == "condenser_api" else params["accounts"]
+            accounts = [self._account(n) for n in names]
+            result = accounts if api == "condenser_api" else {"accounts": accounts}
+        elif name == "get_content":
+            result = self.chain.posts.get("/".join(params), {})
+        elif name == "get_content_replies":
+            result = self.chain.replies(*params)
+        elif name.startswith("broadcast_transaction"):
+            result = self._broadcast(params[0])
+        else:
+            return {
+                "jsonrpc": "2.0",
+                "id": request["id"],
+                "error": {"code": -32601, "message": f"{method} not found"},
+            }
+        return {"jsonrpc": "2.0", "id": request["id"], "result": result}
+
+
+class _WebhookHandler(_Handler):
+    def do_POST(self):
+        self._wait()
+        payload = self._read_json()
+        self.server.received.append((time.time(), self.path, payload))
+        self._reply(204, headers=self.server.rate_limit_headers())
+
+
+class FakeWebhook(_Server):
+    """Discord webhook recording the posted payloads.
+
+    Sends Discord's rate limit headers for a fixed number of requests per
+    window, the bot pauses when none remain.
+    """
+
+    def __init__(self, limit: int = 5, window: float = 2.0, latency: float = 0):
+        """
+        :param limit: Requests per window, 0 disables the rate limit headers
+        :param window: Seconds of a rate limit window
+        :param latency: Seconds every request is delayed
+        """
+        super().__init__(_WebhookHandler, latency)
+        self.limit = limit
+        self.window = window
+        self.received = []
+        self._window_start = 0.0
+        self._window_requests = 0
+
+    def webhook(self, name: str) -> str:
+        return f"{self.url}/api/webhooks/{name}"
+
+    def rate_limit_headers(self) -> dict:
+        if not self.limit:
+            return {}
+        with self.lock:
+            now = time.monotonic()
+            if now - self._window_start >= self.window:
+                self._window_start = now
+                self._window_requests = 0
+            self._window_requests += 1
+            remaining = max(self.limit - self._window_requests, 0)
+            reset_after = self.window - (now - self._window_start)
+        return {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(remaining),
+            "X-RateLimit-Reset-After": f"{reset_after:.3f}",
+        }
+
+    def messages(self, name: str = None) -> list:
+        """Splits the received payloads into the bot's messages.
+
+        :param name: Webhook name, all webhooks if None
+        :return: list of ``(received_at, content line)`` tuples
+        """
+        found = []
+        for received_at, path, payload in list(self.received):
+            if name is not None and not path.endswith(f"/{name}"):
+                continue
+            for line in payload.get("content", "").splitlines():
+                found.append((received_at, line))
+        return found
+
+
+class _ContributionsHandler(_Handler):
+    def do_GET(self):
+        self._wait()
+        if self.path.split("?", 1)[0] != "/api/batch/contributions":
+            self._reply(404)
+            return
+        body, etag = self.server.body, self.server.etag
+        if self.headers.get("If-None-Match") == etag:
+            self._reply(304, headers={"ETag": etag})
+            return
+        self._reply(200, body, {"Content-Type": "application/json", "ETag": etag})
+
+
+class FakeContributions(_Server):
+    """utopian.rocks serving a list of reviewed contributions with an ETag."""
+
+    def __init__(self, contributions: list, latency: float = 0):
+        """
+        :param contributions: Served contributions
+        :param latency: Seconds every request is delayed
+        """
+        super().__init__(_ContributionsHandler, latency)
+        self.set_contributions(contributions)
+
+    def set_contributions(self, contributions: list):
+        body = json.dumps(contributions).encode("utf-8")
+        self.body, self.etag = body, '"%s"' % hashlib.sha1(body).hexdigest()
+
+    @property
+    def feed_url(self) -> str:
+        return f"{self.url}/api/batch/contributions"
+
+
+def record_chain(node: str, start: int, stop: int, reviewers: frozenset) -> Chain:
+    """Downloads a block range and the posts of reviewer comments in it.
+
+    :param node: URL of an API node
+    :param start: First block
+    :param stop: Last block
+    :param reviewers: Accounts of the reviewers
+    :return: chain
+    """
+    from ingest import range_blocks, range_calls
+    from rpc import JsonRpcClient
+
+    client = JsonRpcClient(node)
+    blocks = {}
+    for first in range(start, stop + 1, 50):
+        count = min(50, stop - first + 1)
+        blocks.update(
+            range_blocks(first, count, client.batch(range_calls(first, count)))
+        )
+    chain = Chain(blocks, {})
+    for _, authorperm in chain.comment_ops(reviewers):
+        post = client.call("condenser_api.get_content", authorperm.split("/"))
+        root = f'{post["root_author"]}/{post["root_permlink"]}'
+        chain.posts[authorperm] = post
+        if root not in chain.posts:
+            chain.posts[root] = client.call(
+                "condenser_api.get_content", root.split("/")
+            )
+            for reply in client.call(
+                "condenser_api.get_content_replies", root.split("/")
+            ):
+                chain.posts.setdefault(f'{reply["author"]}/{reply["permlink"]}', reply)
+    return chain
+
+
+def main():
+    from settings import get_config
+
+    parser = argparse.ArgumentParser(description="Records a chain for the fake node")
+    parser.add_argument("--node", required=True)
+    parser.add_argument("--from-block", type=int, required=True)
+    parser.add_argument("--to-block", type=int, required=True)
+    parser.add_argument("--output", required=True)
+    args = parser.parse_args()
+    reviewers = frozenset(get_config()["steem"]["reviewers"])
+    chain = record_chain(args.node, args.from_block, args.to_block, reviewers)
+    chain.save(args.output)
+    print(f"Recorded {len(chain.blocks)} blocks and {len(chain.posts)} posts")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""Task embeds and summaries as the bot built them before the renderer.
+
+``bench_render.py`` checks that the renderer's output matches these builders
+and compares their speed. They need ``discord-webhook``.
+"""
+import os
+import sys
+from datetime import datetime
+
+from discord_webhook import DiscordEmbed
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "utbot"))
+
+from categories import CATEGORIES  # noqa: E402
+from constants import get_bot  # noqa: E402
+
+
+def build_steem_account_link(username: str) -> str:
+    return f"{get_bot().ui_url}/@{username}"
+
+
+def accounts_str_to_md_links(str_line: str) -> str:
+    items = str_line.split(",")
+    items = [
+        f"[{name.strip(' @')}]({build_steem_account_link(name.strip(' @'))})"
+        for name in items
+        if name
+    ]
+    return ", ".join(items)
+
+
+def build_contribution_embed(contribution: dict):
+    color = 0
+    thumbnail_url = None
+    category = contribution.get("category")
+    properties = CATEGORIES.get(category) if category else None
+    if properties is not None:
+        color = properties.color
+        thumbnail_url = properties.image_url
+    embed = DiscordEmbed(title=contribution.get("title"))
+    embed.set_color(color=color)
+    embed.set_thumbnail(url=thumbnail_url)
+    author = contribution.get("author")
+    if author:
+        embed.set_author(
+            name=author,
+            url=build_steem_account_link(author),
+            icon_url=f"https://steemitimages.com/u/{author}/avatar",
+        )
+    if category:
+        category_text = category
+    else:
+        category_text = "Unknown"
+    embed.add_embed_field(name="Category", value=category_text.upper(), inline=True)
+    embed.add_embed_field(
+        name="Reviewer", value=contribution.get("moderator", "Unknown"), inline=True
+    )
+    embed.add_embed_field(
+        name="Score", value=str(contribution.get("score", "Unknown")), inline=True
+    )
+    staff_picked = "Yes" if contribution.get("staff_picked") is True else "No"
+    embed.add_embed_field(name="Picked by staff", value=staff_picked, inline=True)
+    embed.add_embed_field(
+        name="Created at", value=contribution.get("created", "Unknown"), inline=True
+    )
+    embed.add_embed_field(
+        name="Reviewed at",
+        value=contribution.get("review_date", "Unknown"),
+        inline=True,
+    )
+    return embed
+
+
+def build_discord_tr_embed(comment: dict, cmds_args: dict) -> DiscordEmbed:
+    """Creates a Discord embed for a Utopian task request.
+
+    :param comment: Steem root post with task request
+    :type comment: dict
+    :param cmds_args: Parsed bot commands and arguments
+    :type cmds_args: dict
+    """
+    task = CATEGORIES.classify(comment["tags"]).task
+    color = 0
+    type_ = None
+    thumbnail = None
+    if task is not None:
+        color = task.color
+        type_ = task.type
+        thumbnail = task.image_url
+
+    title = f'{comment["title"]}'
+    description = None
+    if cmds_args.get("description"):
+        description = cmds_args["description"]
+    embed = DiscordEmbed(title=title, description=description)
+    author = comment["author"]
+    embed.set_author(
+        name=author,
+        url=f"{get_bot().ui_url}/@{author}",
+        icon_url=f"https://steemitimages.com/u/{author}/avatar",
+    )
+    embed.set_color(color)
+    embed.set_footer(text="Verified by Utopian.io team")
+    embed.set_thumbnail(url=thumbnail)
+    embed.set_timestamp()
+
+    if type_ is not None:
+        embed.add_embed_field(name="Task Type", value=type_.upper(), inline=True)
+
+    status = None
+    if cmds_args.get("status") is not None:
+        status = cmds_args["status"]
+        embed.add_embed_field(name="Status", value=status.upper(), inline=True)
+
+    if status and status.upper() == "CLOSED":
+        return embed
+
+    if cmds_args.get("skills"):
+        skills = ", ".join(cmds_args["skills"])
+        embed.add_embed_field(name="Required skills", value=skills, inline=True)
+
+    if cmds_args.get("discord"):
+        embed.add_embed_field(
+            name="Discord", value=f'{cmds_args["discord"]}', inline=True
+        )
+
+    if cmds_args.get("bounty"):
+        bounty = ", ".join(cmds_args["bounty"])
+    else:
+        bounty = "See the task details"
+    embed.add_embed_field(name="Bounty", value=bounty, inline=True)
+
+    deadline = cmds_args.get("deadline")
+    if not deadline:
+        deadline = "Not specified"
+    embed.add_embed_field(name="Due date", value=deadline, inline=True)
+
+    is_in_progress = status and status.upper() == "IN PROGRESS"
+    if is_in_progress and cmds_args.get("assignees"):
+        assignees = ", ".join([f"@{a}" for a in cmds_args["assignees"]])
+        assignees_links = accounts_str_to_md_links(assignees)
+        embed.add_embed_field(name="Assignees", value=assignees_links, inline=False)
+
+    if cmds_args.get("note") is not None:
+        embed.add_embed_field(name="Misc", value=f'{cmds_args["note"]}', inline=False)
+
+    return embed
+
+
+def build_bot_tr_message(parsed_cmd: dict):
+    parts = []
+    intro_msg = "Hello, I was called to collect basic information about this task."
+    parts.append(intro_msg)
+
+    status = parsed_cmd["status"].upper()
+    deadline = ""
+    if parsed_cmd["deadline"] and status != "CLOSED":
+        deadline = f" with an expected deadline **{parsed_cmd['deadline']}** to complete the task"
+    status_msg = f"This task is currently **{status}**{deadline}."
+    parts.append(status_msg)
+
+    if status in ["IN PROGRESS", "CLOSED"] and parsed_cmd["assignees"]:
+        assignees = ", ".join([f"@{a}" for a in parsed_cmd["assignees"]])
+        assignees_msg = f"The task has been assigned to **{assignees}**."
+        parts.append(assignees_msg)
+
+    if status != "CLOSED":
+        bounty_msg = (
+            "The solvers may reach a potential vote from @utopian-io as a part "
+            "of the reward by submitting the solution via Utopian.io."
+        )
+        if parsed_cmd["bounty"]:
+            bounty_msg = (
+                f"The requester put a bounty of **{', '.join(parsed_cmd['bounty'])}** on "
+                "top of a potential vote from Utopian.io for completing the task."
+            )
+        parts.append(bounty_msg)
+    else:
+        parts.append("Thanks to everyone who participated in this task.")
+
+    if parsed_cmd["discord"]:
+        discord_msg = (
+            "All contributors are encouraged to join the [Utopian Discord](https://discord.gg/azdmM3v)."
+            f" The requester's identifier is **{parsed_cmd['discord']}**."
+        )
+    else:
+        discord_msg = (
+            "Don't hesitate to join the [Utopian Discord](https://discord.gg/azdmM3v) "
+            "to learn more about the task."
+        )
+    parts.append(discord_msg)
+
+    outro_msg = f"<sub>Last update: {datetime.strftime(datetime.utcnow(), '%Y-%m-%dT%H:%M:%SZ')}.</sub>"
+    parts.append(outro_msg)
+
+    return "\n\n".join(parts)
@@ -10,7 +10,7 @@ def load_description():
         return f.read()
 
 
-requirements = ["beem", "discord-webhook", "python-dotenv"]
+requirements = ["beem", "python-dotenv"]
 
 setup(
     name="utbot",
@@ -22,4 +22,5 @@ setup(
     long_description_type="text/markdown",
     url="https://github.com/espoem/utbot",
     install_requires=requirements,
+    extras_require={"asyncio": ["aiohttp"], "benchmarks": ["discord-webhook"]},
 )
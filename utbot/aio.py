@@ -0,0 +1,774 @@
+import asyncio
+import collections
+import functools
+import hashlib
+import itertools
+import logging
+import queue
+import threading
+import time
+import typing
+from concurrent.futures import Future, ThreadPoolExecutor
+
+try:
+    import aiohttp
+except ImportError:  # the asyncio engine is optional
+    aiohttp = None
+
+from delivery import DiscordDelivery, WebhookSender
+from feed import FeedError, JsonFeed
+from ingest import (
+    OPS_MATCHED,
+    BlockFetcher,
+    comment_ops_in_block,
+    range_blocks,
+    range_calls,
+)
+from nodepool import NodePool, NodeStats
+from ratelimit import WRITE_LATENCY, RateLimiter
+from rpc import RPC_ERRORS, RPC_LATENCY, RPCError, batch_payload, batch_results
+from scheduler import RESTART_MAX, restart_delay, settle_job
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncScheduler:
+    """Runs the bot's workers as coroutines on a single event loop.
+
+    It has the interface of :class:`scheduler.Scheduler`, so the same stages run
+    on either. Coroutine functions run on the loop, plain functions, which are
+    mostly blocking beem and SQLite calls, run in a bounded thread pool. HTTP
+    requests of the async stages share one aiohttp session with a connection
+    pool, so many node requests and webhook posts are in flight at once
+    without a thread for each of them.
+    """
+
+    def __init__(
+        self,
+        executor_workers: int = 16,
+        http_connections: int = 32,
+        poll_timeout: float = 1.0,
+    ):
+        """
+        :param executor_workers: Number of threads running blocking functions
+        :type executor_workers: int
+        :param http_connections: Maximum number of open HTTP connections
+        :type http_connections: int
+        :param poll_timeout: Seconds a consumer waits for an item before it
+            checks for a shutdown request
+        :type poll_timeout: float
+        """
+        if aiohttp is None:
+            raise RuntimeError("The asyncio engine requires aiohttp")
+        self.shutdown = threading.Event()
+        self.loop = asyncio.new_event_loop()
+        self.http_connections = http_connections
+        self._poll_timeout = poll_timeout
+        self._executor = ThreadPoolExecutor(
+            max_workers=executor_workers, thread_name_prefix="aio-blocking"
+        )
+        self._session = None
+        self._tasks = set()
+        self._thread = None
+        self._stop_hooks = []
+
+    @property
+    def session(self):
+        """HTTP session shared by the async stages, usable only on the loop."""
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.http_connections)
+            )
+        return self._session
+
+    def run_blocking(self, func: typing.Callable, *args, **kwargs) -> asyncio.Future:
+        """Runs a blocking function in the thread pool.
+
+        :param func: Function to run
+        :return: awaitable result of the function
+        """
+        return self.loop.run_in_executor(
+            self._executor, functools.partial(func, *args, **kwargs)
+        )
+
+    def spawn(self, func: typing.Callable, *args, name: str = None, **kwargs):
+        """Runs a long running function.
+
+        Coroutine functions become tasks of the loop, other functions get their
+        own daemon thread so they don't hold a thread of the pool forever. A
+        function that raises is called again after a jittered backoff until a
+        shutdown is requested, like :meth:`scheduler.Scheduler.spawn`.
+
+        :param func: Function to run
+        :param name: Name of the worker
+        :type name: str
+        """
+        name = name or getattr(func, "__name__", "worker")
+        if asyncio.iscoroutinefunction(func):
+            self._start_task(self._supervise(name, func, *args, **kwargs), name)
+            return None
+        thread = threading.Thread(
+            target=self._supervise_thread,
+            args=(name, func) + args,
+            kwargs=kwargs,
+            name=name,
+        )
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def consume_jobs(
+        self, source, func: typing.Callable, workers: int = 1, name: str = None
+    ):
+        """Processes items of a work queue, acking items processed without error.
+
+        Items whose processing raised an exception are nacked to be retried.
+        If the function returns a future, the item is acked or nacked in the
+        thread pool when the future is done, see :func:`scheduler.settle_job`.
+
+        :param source: Work queue to consume
+        :type source: workqueue.WorkQueue
+        :param func: Function called with the payload of every item
+        :param workers: Number of items processed at once
+        :type workers: int
+        :param name: Name of the consumer
+        :type name: str
+        """
+        name = name or getattr(func, "__name__", "consumer")
+        self._start_task(self._consume_jobs(source, func, workers), name)
+
+    def every(self, seconds: float, func: typing.Callable, *args, **kwargs):
+        """Runs a function periodically, the first run is immediate.
+
+        As with :meth:`scheduler.Scheduler.every`, a number returned by the
+        function is used as the delay before the next run.
+
+        :param seconds: Seconds between the end of a run and the next run
+        :type seconds: float
+        :param func: Function to run
+        """
+        name = getattr(func, "__name__", "job")
+
+        async def job():
+            while not self.shutdown.is_set():
+                delay = seconds
+                try:
+                    result = await self._call(func, *args, **kwargs)
+                except Exception:
+                    logger.exception("Periodic job %s failed", name)
+                else:
+                    if isinstance(result, (int, float)) and not isinstance(
+                        result, bool
+                    ):
+                        delay = result
+                await asyncio.sleep(delay)
+
+        self._start_task(job(), name)
+
+    def call_later(self, delay: float, func: typing.Callable, *args, **kwargs):
+        """Runs a function once after a delay. Safe to call from any thread.
+
+        :param delay: Seconds to wait
+        :type delay: float
+        :param func: Function to run
+        """
+        name = getattr(func, "__name__", "job")
+
+        async def job():
+            await asyncio.sleep(delay)
+            await self._call(func, *args, **kwargs)
+
+        self._start_task(job(), name)
+
+    def start(self):
+        """Starts the event loop in its own thread."""
+        self._thread = threading.Thread(target=self._run_loop, name="aio-loop")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def on_stop(self, func: typing.Callable, *args, **kwargs):
+        """Registers a function called when the scheduler stops.
+
+        :param func: Function to call
+        """
+        self._stop_hooks.append((func, args, kwargs))
+
+    def stop(self):
+        """Cancels all tasks, stops the loop and runs the stop hooks.
+
+        The hooks run in the caller, in the order they were registered, before
+        the thread pool shuts down, so the acks of writes they finish still run.
+        """
+        if self.shutdown.is_set():
+            return
+        self.shutdown.set()
+        if self._thread is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._cancel_tasks)
+            self._thread.join(self._poll_timeout * 5)
+        for func, args, kwargs in self._stop_hooks:
+            self._guard_thread(func, *args, **kwargs)
+        self._executor.shutdown(wait=False)
+
+    def wait(self, timeout: float = None) -> bool:
+        """Blocks until a shutdown is requested.
+
+        :param timeout: Maximum seconds to wait
+        :type timeout: float
+        :return: True if the shutdown was requested
+        :rtype: bool
+        """
+        return self.shutdown.wait(timeout)
+
+    def _start_task(self, coro: typing.Awaitable, name: str):
+        def create():
+            if self.shutdown.is_set():
+                coro.close()
+                return
+            task = self.loop.create_task(self._guard(coro, name))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        try:
+            self.loop.call_soon_threadsafe(create)
+        except RuntimeError:
+            # loop already closed
+            coro.close()
+
+    def _submit_blocking(self, func: typing.Callable, *args):
+        # callable from any thread, runs in the caller once the pool is shut down
+        try:
+            self._executor.submit(self._guard_thread, func, *args)
+        except RuntimeError:
+            self._guard_thread(func, *args)
+
+    async def _call(self, func: typing.Callable, *args, **kwargs):
+        if asyncio.iscoroutinefunction(func):
+            return await func(*args, **kwargs)
+        return await self.run_blocking(func, *args, **kwargs)
+
+    async def _consume_jobs(self, source, func: typing.Callable, workers: int):
+        limit = asyncio.Semaphore(workers)
+        while not self.shutdown.is_set():
+            await limit.acquire()
+            try:
+                job = await self.run_blocking(source.get, timeout=self._poll_timeout)
+            except queue.Empty:
+                limit.release()
+                continue
+            except BaseException:
+                limit.release()
+                raise
+            self._start_task(self._process_job(source, func, job, limit), "job")
+
+    async def _process_job(
+        self, source, func: typing.Callable, job, limit: asyncio.Semaphore
+    ):
+        try:
+            try:
+                result = await self._call(func, job.payload)
+            except Exception:
+                logger.exception("Failed to process %r, will retry", job)
+                await self.run_blocking(source.nack, job)
+            else:
+                if isinstance(result, Future):
+                    settle_job(source, job, result, self._submit_blocking)
+                else:
+                    await self.run_blocking(source.ack, job)
+        finally:
+            limit.release()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_forever()
+            tasks = list(self._tasks)
+            if tasks:
+                self.loop.run_until_complete(
+                    asyncio.gather(*tasks, return_exceptions=True)
+                )
+            if self._session is not None:
+                self.loop.run_until_complete(self._session.close())
+        finally:
+            self.loop.close()
+
+    def _cancel_tasks(self):
+        for task in self._tasks:
+            task.cancel()
+        self.loop.stop()
+
+    async def _supervise(self, name: str, func: typing.Callable, *args, **kwargs):
+        attempt = 0
+        while not self.shutdown.is_set():
+            start = time.monotonic()
+            try:
+                await func(*args, **kwargs)
+                return
+            except Exception:
+                if time.monotonic() - start > RESTART_MAX:
+                    attempt = 0
+                attempt += 1
+                delay = restart_delay(name, attempt)
+            await asyncio.sleep(delay)
+
+    def _supervise_thread(self, name: str, func: typing.Callable, *args, **kwargs):
+        attempt = 0
+        while not self.shutdown.is_set():
+            start = time.monotonic()
+            try:
+                func(*args, **kwargs)
+                return
+            except Exception:
+                if time.monotonic() - start > RESTART_MAX:
+                    attempt = 0
+                attempt += 1
+                delay = restart_delay(name, attempt)
+            if self.shutdown.wait(delay):
+                return
+
+    @staticmethod
+    async def _guard(coro: typing.Awaitable, name: str):
+        try:
+            await coro
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            logger.exception("Worker %s crashed", name)
+
+    @staticmethod
+    def _guard_thread(func: typing.Callable, *args, **kwargs):
+        try:
+            func(*args, **kwargs)
+        except Exception:
+            logger.exception("Worker %s crashed", getattr(func, "__name__", func))
+
+
+class AsyncBlockFetcher(BlockFetcher):
+    """Fetches blocks with concurrent requests on the event loop.
+
+    Works like :class:`ingest.BlockFetcher`, including the hedging of slow
+    nodes, but the ranges are requested by coroutines sharing the scheduler's
+    HTTP session instead of a thread each. Node statistics are kept in the
+    same :class:`nodepool.NodePool`.
+    """
+
+    def __init__(self, pool: NodePool, scheduler: AsyncScheduler, **options):
+        """
+        :param pool: Pool of API nodes
+        :type pool: NodePool
+        :param scheduler: Scheduler providing the HTTP session
+        :type scheduler: AsyncScheduler
+        :param options: Options of the BlockFetcher
+        """
+        super().__init__(pool, **options)
+        self.scheduler = scheduler
+        self._ids = itertools.count(1)
+        self._limit = None
+
+    async def _attempt(self, node: NodeStats, calls: list) -> list:
+        payload = batch_payload(calls, self._ids)
+        method = payload[0]["method"]
+        self.pool.begin_request(node)
+        start = time.monotonic()
+        latency = None
+        try:
+            async with self.scheduler.session.post(
+                node.url,
+                json=payload if len(payload) > 1 else payload[0],
+                timeout=aiohttp.ClientTimeout(total=self.pool.timeout),
+            ) as resp:
+                resp.raise_for_status()
+                data = await resp.json(content_type=None)
+            results = batch_results(node.url, payload, data)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            RPC_ERRORS.labels(method, node.url).inc()
+            raise RPCError(f"{node.url}: {e}") from e
+        except RPCError:
+            RPC_ERRORS.labels(method, node.url).inc()
+            raise
+        else:
+            latency = time.monotonic() - start
+            RPC_LATENCY.labels(method, node.url).observe(latency)
+            return results
+        finally:
+            self.pool.end_request(node, latency)
+
+    async def batch(self, calls: typing.Sequence[tuple]) -> list:
+        """Sends several calls in one request to the healthiest node.
+
+        :param calls: Sequence of ``(method, params)`` tuples
+        :type calls: list
+        :return: Results in the order of the calls
+        :rtype: list
+        :raises RPCError: if all nodes fail
+        """
+        calls = list(calls)
+        ranked = self.pool.ranked()
+        loop = asyncio.get_event_loop()
+        tasks = {loop.create_task(self._attempt(ranked[0], calls)): ranked[0]}
+        done, _ = await asyncio.wait(
+            list(tasks), timeout=self.pool.hedge_delay(ranked[0])
+        )
+        if not done and len(ranked) > 1:
+            self.pool.hedge(ranked[0])
+            tasks[loop.create_task(self._attempt(ranked[1], calls))] = ranked[1]
+        last_error = None
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                try:
+                    results = task.result()
+                except RPCError as e:
+                    logger.warning("Request to %s failed. %s", tasks[task].url, e)
+                    last_error = e
+                    continue
+                # the slower request finishes on its own to keep node statistics
+                for other in pending:
+                    other.add_done_callback(_retrieve)
+                return results
+        for node in ranked[len(tasks) :]:
+            try:
+                return await self._attempt(node, calls)
+            except RPCError as e:
+                logger.warning("Request to %s failed. %s", node.url, e)
+                last_error = e
+        raise last_error
+
+    async def get_head_block_num(self) -> int:
+        """Gets the current head block number.
+
+        :return: head block number
+        :rtype: int
+        """
+        calls = [("condenser_api.get_dynamic_global_properties", None)]
+        props = (await self.batch(calls))[0]
+        self.head = props["head_block_number"]
+        return self.head
+
+    async def fetch_range(self, start: int, count: int) -> list:
+        """Fetches consecutive blocks.
+
+        :param start: First block number
+        :type start: int
+        :param count: Number of blocks
+        :type count: int
+        :return: list of ``(block_num, block)`` tuples
+        :rtype: list
+        :raises RPCError: if the blocks are not available
+        """
+        if self._limit is None:
+            self._limit = asyncio.Semaphore(self.workers)
+        async with self._limit:
+            results = await self.batch(range_calls(start, count))
+        return range_blocks(start, count, results)
+
+    async def fetch(self, start: int, count: int, head: int) -> list:
+        """Fetches consecutive blocks or gets them from the replica owning them.
+
+        The async counterpart of :meth:`ingest.BlockFetcher.fetch`, the shared
+        ranges are read and published in the scheduler's thread pool.
+
+        :param start: First block number
+        :type start: int
+        :param count: Number of blocks
+        :type count: int
+        :param head: Head block number
+        :type head: int
+        :return: list of ``(block_num, block)`` tuples
+        :rtype: list
+        :raises RPCError: if the blocks are not available
+        """
+        if not self._shared(start, count, head):
+            return await self.fetch_range(start, count)
+        share = self.share
+        if not share.owns(start):
+            deadline = time.monotonic() + share.wait
+            while True:
+                blocks = await self.scheduler.run_blocking(share.lookup, start)
+                if blocks is not None:
+                    return blocks
+                if time.monotonic() >= deadline:
+                    break
+                await asyncio.sleep(share.poll_interval)
+            share.missed += 1
+        blocks = await self.fetch_range(start, count)
+        share.fetched += 1
+        await self.scheduler.run_blocking(share.publish, start, blocks)
+        return blocks
+
+    async def blocks(self, start: int) -> typing.AsyncIterator[tuple]:
+        """Yields blocks in order starting at a block number, following the head.
+
+        :param start: First block number
+        :type start: int
+        :return: async iterator of ``(block_num, block)`` tuples
+        """
+        loop = asyncio.get_event_loop()
+        pending = collections.deque()
+        next_num = start
+        head = await self.get_head_block_num()
+        try:
+            while True:
+                while len(pending) < self.window and next_num <= head:
+                    count = self.range_count(next_num, head)
+                    task = loop.create_task(self.fetch(next_num, count, head))
+                    pending.append((next_num, count, task))
+                    next_num += count
+                if not pending:
+                    await asyncio.sleep(self.poll_interval)
+                    head = await self._refresh_head(head)
+                    continue
+                range_start, count, task = pending[0]
+                try:
+                    blocks = await task
+                except RPCError:
+                    logger.exception(
+                        "Blocks %d-%d unavailable", range_start, range_start + count - 1
+                    )
+                    await asyncio.sleep(self.poll_interval)
+                    task = loop.create_task(self.fetch(range_start, count, head))
+                    pending[0] = (range_start, count, task)
+                    continue
+                pending.popleft()
+                for block_num, block in blocks:
+                    self.last_block = block_num
+                    yield block_num, block
+                self._record(len(blocks))
+                if next_num > head and len(pending) < self.workers:
+                    head = await self._refresh_head(head)
+        finally:
+            for _, _, task in pending:
+                task.cancel()
+
+    async def _refresh_head(self, head: int) -> int:
+        try:
+            return await self.get_head_block_num()
+        except RPCError:
+            return head
+
+
+async def aiter_comment_ops(
+    fetcher: AsyncBlockFetcher,
+    start: int,
+    authors: typing.AbstractSet[str],
+    checkpoint=None,
+) -> typing.AsyncIterator[dict]:
+    """Yields reply comments of selected authors from consecutive blocks.
+
+    The async counterpart of :func:`ingest.iter_comment_ops`.
+
+    :param fetcher: Block fetcher
+    :type fetcher: AsyncBlockFetcher
+    :param start: First block number
+    :type start: int
+    :param authors: Authors whose comments are kept
+    :type authors: set
+    :param checkpoint: Checkpoint advanced after every fully processed block
+    :type checkpoint: checkpoint.Checkpoint
+    """
+    authors = frozenset(authors)
+    async for block_num, block in fetcher.blocks(start):
+        comment_ops = comment_ops_in_block(block, block_num, authors)
+        if comment_ops:
+            OPS_MATCHED.inc(len(comment_ops))
+        for comment_op in comment_ops:
+            yield comment_op
+        if checkpoint is not None:
+            checkpoint.advance(block_num)
+
+
+class AsyncWebhookSender(WebhookSender):
+    """Delivers queued messages to a Discord webhook from the event loop.
+
+    Messages may be queued from any thread, the sender sleeps on the loop until
+    one arrives.
+    """
+
+    def __init__(self, url: str, scheduler: AsyncScheduler, **options):
+        """
+        :param url: Webhook URL
+        :type url: str
+        :param scheduler: Scheduler providing the loop and the HTTP session
+        :type scheduler: AsyncScheduler
+        :param options: Options of the WebhookSender
+        """
+        super().__init__(url, None, **options)
+        self.scheduler = scheduler
+        self._ready = None
+
+    def enqueue(self, content: str, embeds: list, origin: float = None) -> Future:
+        """Queues a message for delivery.
+
+        :param content: Message text
+        :type content: str
+        :param embeds: List of DiscordEmbed objects or embed dictionaries
+        :type embeds: list
+        :param origin: Epoch seconds of the event the message reports
+        :type origin: float
+        :return: future resolved when the message is delivered or dropped
+        :rtype: concurrent.futures.Future
+        """
+        future = super().enqueue(content, embeds, origin)
+        try:
+            self.scheduler.loop.call_soon_threadsafe(self._wake_up)
+        except RuntimeError:
+            # loop already closed
+            pass
+        return future
+
+    def _wake_up(self):
+        if self._ready is not None:
+            self._ready.set()
+
+    async def _post(self, payload: dict) -> typing.Optional[bool]:
+        self.requests += 1
+        start = time.monotonic()
+        try:
+            async with self.scheduler.session.post(
+                self.url,
+                json=payload,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            ) as resp:
+                text = await resp.text()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning("Discord webhook request failed. %s", e)
+            return None
+        finally:
+            WRITE_LATENCY.labels("discord").observe(time.monotonic() - start)
+        return self._handle_response(resp.status, resp.headers, text)
+
+    async def deliver(self, batch: list, shutdown: threading.Event):
+        """Sends a batch of messages as one webhook message.
+
+        :param batch: Messages to send
+        :type batch: list
+        :param shutdown: Event interrupting the waits
+        :type shutdown: threading.Event
+        """
+        payload = self._payload(batch)
+        for attempt in range(1, self.max_attempts + 1):
+            delay = self.bucket.reserve()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                if shutdown.is_set():
+                    return
+            result = await self._post(payload)
+            if result is not None:
+                self._record(batch, result)
+                return
+            self._retry_later(attempt, batch)
+
+    async def run(self, shutdown: threading.Event):
+        """Delivers messages until a shutdown is requested.
+
+        :param shutdown: Event stopping the sender
+        :type shutdown: threading.Event
+        """
+        self._ready = asyncio.Event()
+        while not shutdown.is_set():
+            try:
+                batch = self._next_batch(timeout=0)
+            except queue.Empty:
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+            await self.deliver(batch, shutdown)
+
+
+class AsyncDiscordDelivery(DiscordDelivery):
+    """Keeps one async sender per webhook URL, started as tasks of the loop."""
+
+    def __init__(
+        self, scheduler: AsyncScheduler, limiter: RateLimiter = None, **options
+    ):
+        """
+        :param scheduler: Scheduler providing the loop and the HTTP session
+        :type scheduler: AsyncScheduler
+        :param limiter: Rate limiter keeping the token buckets of the webhooks
+        :type limiter: RateLimiter
+        :param options: Options of the WebhookSender
+        """
+        super().__init__(limiter, **options)
+        self.scheduler = scheduler
+        self.session = None
+
+    def _create_sender(self, url: str) -> AsyncWebhookSender:
+        return AsyncWebhookSender(
+            url,
+            self.scheduler,
+            bucket=self.limiter.bucket(("discord", url)),
+            **self._options,
+        )
+
+
+class AsyncJsonFeed(JsonFeed):
+    """Polls a JSON endpoint from the event loop.
+
+    The handler is a blocking function, it runs in the scheduler's thread pool.
+    """
+
+    def __init__(self, url: str, scheduler: AsyncScheduler, **options):
+        """
+        :param url: URL of the endpoint
+        :type url: str
+        :param scheduler: Scheduler providing the HTTP session and thread pool
+        :type scheduler: AsyncScheduler
+        :param options: Options of the JsonFeed
+        """
+        super().__init__(url, **options)
+        self.scheduler = scheduler
+        self.session = None
+
+    async def fetch(self) -> typing.Optional[typing.Any]:
+        """Downloads the payload if it changed since the last accepted one.
+
+        :return: parsed payload or None if it didn't change
+        :raises FeedError: if the request fails
+        """
+        self.requests += 1
+        try:
+            async with self.scheduler.session.get(
+                self.url,
+                headers=self._request_headers(),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            ) as resp:
+                if resp.status == 304:
+                    self.not_modified += 1
+                    return None
+                if resp.status != 200:
+                    raise FeedError(f"{self.url} responded with {resp.status}")
+                digest = hashlib.sha1()
+                body = bytearray()
+                async for chunk in resp.content.iter_chunked(self.chunk_size):
+                    digest.update(chunk)
+                    body += chunk
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise FeedError(f"Request to {self.url} failed. {e}") from e
+        return self._parse(resp.headers, digest.digest(), body)
+
+    async def poll(self, handler: typing.Callable[[typing.Any], int]) -> float:
+        """Fetches the payload and passes it to a handler if it changed.
+
+        :param handler: Function called with the payload, returns the number of
+            new items in it
+        :return: seconds to wait before the next poll
+        :rtype: float
+        """
+        try:
+            payload = await self.fetch()
+        except FeedError as e:
+            return self._retry_delay(e)
+        self.failures = 0
+        new = 0
+        if payload is not None:
+            new = await self.scheduler.run_blocking(handler, payload)
+            self.accept()
+        return self._next_interval(new)
+
+
+def _retrieve(task: asyncio.Future):
+    # marks the exception of an abandoned task as retrieved
+    if not task.cancelled():
+        task.exception()
@@ -0,0 +1,213 @@
+import collections
+import logging
+import threading
+import time
+import typing
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe mapping with a bounded size, LRU eviction and expiring entries."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 600, clock=time.monotonic):
+        """
+        :param maxsize: Maximum number of entries
+        :type maxsize: int
+        :param ttl: Seconds an entry stays valid
+        :type ttl: float
+        :param clock: Function returning the current time in seconds
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._clock = clock
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING, count=False) is not _MISSING
+
+    def get(self, key, default=None, count: bool = True):
+        """Gets a valid entry and marks it as recently used.
+
+        :param key: Key of the entry
+        :param default: Value returned if there is no valid entry
+        :param count: Whether to count the lookup as a hit or a miss
+        :type count: bool
+        """
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is not _MISSING and item[0] < self._clock():
+                del self._data[key]
+                item = _MISSING
+            if item is _MISSING:
+                if count:
+                    self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            if count:
+                self.hits += 1
+            return item[1]
+
+    def set(self, key, value):
+        """Stores an entry and evicts the least recently used ones over the limit.
+
+        :param key: Key of the entry
+        :param value: Value of the entry
+        """
+        with self._lock:
+            self._data[key] = (self._clock() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        """Removes an entry.
+
+        :param key: Key of the entry
+        :param default: Value returned if there is no entry
+        """
+        with self._lock:
+            item = self._data.pop(key, _MISSING)
+        return default if item is _MISSING else item[1]
+
+    def get_or_load(self, key, loader: typing.Callable):
+        """Gets an entry or loads and stores it on a miss.
+
+        :param key: Key of the entry
+        :param loader: Function called with the key on a miss
+        """
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = loader(key)
+            self.set(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        """Returns the size of the cache and its hit and miss counters.
+
+        :return: dictionary with statistics
+        :rtype: dict
+        """
+        return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+class ContentCache:
+    """Caches Steem posts keyed by ``authorperm`` and the bot's replies on them.
+
+    Besides the posts it keeps an index of "the reply of an account on a post"
+    so that repeated lookups don't fetch all replies of the post again. Entries
+    touched by the bot's own writes have to be invalidated by the writer.
+    """
+
+    def __init__(
+        self,
+        loader: typing.Callable,
+        reply_finder: typing.Callable,
+        maxsize: int = 1024,
+        ttl: float = 600,
+    ):
+        """
+        :param loader: Function loading a post by its authorperm
+        :param reply_finder: Function returning the reply of an account on a post
+        :param maxsize: Maximum number of cached posts and of cached replies
+        :type maxsize: int
+        :param ttl: Seconds an entry stays valid
+        :type ttl: float
+        """
+        self._loader = loader
+        self._reply_finder = reply_finder
+        self.posts = TTLCache(maxsize, ttl)
+        self.replies = TTLCache(maxsize, ttl)
+
+    def get(self, authorperm: str):
+        """Gets a post, fetching it on a miss.
+
+        :param authorperm: ``@author/permlink`` of the post
+        :type authorperm: str
+        """
+        return self.posts.get_or_load(authorperm, self._loader)
+
+    def put(self, post):
+        """Stores a freshly fetched post.
+
+        :param post: Post with ``authorperm`` attribute
+        """
+        self.posts.set(post.authorperm, post)
+
+    def get_root(self, comment):
+        """Gets the root post of a comment.
+
+        :param comment: Comment
+        :return: root post
+        """
+        if comment.get("depth", 0) == 0:
+            return comment
+        root_author = comment.get("root_author")
+        root_permlink = comment.get("root_permlink")
+        if not root_author or not root_permlink:
+            root = comment.get_parent()
+            self.put(root)
+            return root
+        return self.get(f"@{root_author}/{root_permlink}")
+
+    def replied_to_comment(self, comment, account: str):
+        """Gets a reply of an account on a post using the reply index.
+
+        :param comment: Post to check
+        :param account: Author of the reply
+        :type account: str
+        :return: reply or None if the account didn't reply
+        """
+        key = (comment.authorperm, account)
+        reply_authorperm = self.replies.get(key, _MISSING)
+        if reply_authorperm is None:
+            return None
+        if reply_authorperm is not _MISSING:
+            return self.get(reply_authorperm)
+        reply = self._reply_finder(comment, account)
+        if reply is None:
+            self.replies.set(key, None)
+        else:
+            self.replies.set(key, reply.authorperm)
+            self.put(reply)
+        return reply
+
+    def invalidate(self, authorperm: str):
+        """Drops a post.
+
+        :param authorperm: ``@author/permlink`` of the post
+        :type authorperm: str
+        """
+        self.posts.pop(authorperm)
+
+    def invalidate_reply(self, authorperm: str, account: str):
+        """Drops the index entry and the post of an account's reply on a post.
+
+        :param authorperm: ``@author/permlink`` of the replied post
+        :type authorperm: str
+        :param account: Account whose reply on the post changed
+        :type account: str
+        """
+        reply_authorperm = self.replies.pop((authorperm, account))
+        if reply_authorperm:
+            self.posts.pop(reply_authorperm)
+
+    def stats(self) -> dict:
+        """Returns hit and miss counters of the posts and replies caches.
+
+        :return: dictionary with statistics
+        :rtype: dict
+        """
+        return {"posts": self.posts.stats(), "replies": self.replies.stats()}
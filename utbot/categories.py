@@ -0,0 +1,131 @@
+import types
+import typing
+
+from constants import CATEGORIES_PROPERTIES
+
+UTOPIAN_TAG = "utopian-io"
+TASK_PREFIX = "task-"
+
+
+class Category(typing.NamedTuple):
+    """Utopian category or task request type with its resolved properties."""
+
+    # canonical tag, e.g. ``video-tutorials`` or ``task-video-tutorials``
+    name: str
+    # category shown on Discord, e.g. ``video-tutorials`` for both of the above
+    type: str
+    color: int
+    image_url: str
+    task: bool
+
+
+class Classification(typing.NamedTuple):
+    """Categories found in the tags of a post."""
+
+    utopian: bool
+    # first contribution category tag and first task request tag
+    category: typing.Optional[Category]
+    task: typing.Optional[Category]
+
+    @property
+    def is_contribution(self) -> bool:
+        return self.utopian and self.category is not None
+
+    @property
+    def is_task_request(self) -> bool:
+        return self.utopian and self.task is not None
+
+
+class CategoryRegistry:
+    """Read-only lookup of Utopian categories and task request types by tag.
+
+    Every category gets a ``task-`` prefixed twin, aliases share the record of
+    their category. Colors are parsed once, so classifying a post is a single
+    pass over its tags with one dictionary lookup per tag.
+    """
+
+    def __init__(self, properties: typing.Mapping[str, dict]):
+        """
+        :param properties: Properties of the categories by tag, aliases refer to
+            the same properties as their category
+        :type properties: dict
+        """
+        by_tag = {}
+        for tag, props in properties.items():
+            color = int(props["color"][1:], 16)
+            name = props["name"]
+            category = Category(name, name, color, props["image_url"], False)
+            task = Category(TASK_PREFIX + name, name, color, props["image_url"], True)
+            # aliases get the record of the canonical tag if it was seen first
+            by_tag[tag] = by_tag.get(name, category)
+            by_tag[TASK_PREFIX + tag] = by_tag.get(TASK_PREFIX + name, task)
+        self._by_tag = types.MappingProxyType(by_tag)
+        self.task_tags = frozenset(t for t, c in by_tag.items() if c.task)
+        self.category_tags = frozenset(t for t, c in by_tag.items() if not c.task)
+
+    def __contains__(self, tag: str) -> bool:
+        return tag in self._by_tag
+
+    def __len__(self) -> int:
+        return len(self._by_tag)
+
+    def get(self, tag: str) -> typing.Optional[Category]:
+        """Gets the category of a tag.
+
+        :param tag: Tag or category name, e.g. ``task-development`` or ``antiabuse``
+        :type tag: str
+        :return: category or None if the tag isn't a Utopian category
+        :rtype: Category
+        """
+        return self._by_tag.get(tag)
+
+    def is_task(self, tag: str) -> bool:
+        """Checks whether a tag is a task request type.
+
+        :param tag: Tag
+        :type tag: str
+        :rtype: bool
+        """
+        return tag in self.task_tags
+
+    def classify(self, tags: typing.Iterable[str]) -> Classification:
+        """Finds the Utopian categories in the tags of a post.
+
+        :param tags: Tags of the post
+        :type tags: list
+        :return: classification
+        :rtype: Classification
+        """
+        lookup = self._by_tag.get
+        utopian = False
+        category = task = None
+        for tag in tags:
+            if tag == UTOPIAN_TAG:
+                utopian = True
+                continue
+            found = lookup(tag)
+            if found is None:
+                continue
+            if found.task:
+                if task is None:
+                    task = found
+            elif category is None:
+                category = found
+        return Classification(utopian, category, task)
+
+    def classify_many(
+        self, posts: typing.Iterable[typing.Mapping]
+    ) -> typing.List[Classification]:
+        """Classifies many posts, e.g. in a replay or backfill.
+
+        :param posts: Posts with their ``tags``
+        :type posts: list
+        :return: classification of each post
+        :rtype: list
+        """
+        classify = self.classify
+        return [classify(post["tags"]) for post in posts]
+
+
+# categories of the bot, built on import
+CATEGORIES = CategoryRegistry(CATEGORIES_PROPERTIES)
@@ -0,0 +1,145 @@
+import logging
+import sqlite3
+import threading
+import time
+import typing
+
+logger = logging.getLogger(__name__)
+
+
+class StateStore:
+    """Small durable key-value store for the bot's progress markers.
+
+    The values are kept in a SQLite database in WAL mode so that a crash never
+    leaves a half written marker behind.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path: Path to the SQLite database file
+        :type path: str
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS state "
+            "(key TEXT PRIMARY KEY, value INTEGER NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> typing.Optional[int]:
+        """Gets a stored value.
+
+        :param key: Name of the value
+        :type key: str
+        :return: Stored value or None if it was never set
+        :rtype: int
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM state WHERE key = ?", (key,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: int):
+        """Stores a value and commits it.
+
+        :param key: Name of the value
+        :type key: str
+        :param value: Value to store
+        :type value: int
+        """
+        self.set_many({key: value})
+
+    def set_many(self, values: typing.Dict[str, int]):
+        """Stores several values in one transaction.
+
+        :param values: Mapping of names to values
+        :type values: dict
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO state (key, value, updated_at) VALUES (?, ?, ?)",
+                [(k, v, now) for k, v in values.items()],
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class Checkpoint:
+    """Tracks the last fully processed position of a stream.
+
+    Advancing the checkpoint is cheap, the position is written to the store
+    only every ``commit_every`` advances or ``commit_interval`` seconds. The
+    ingest thread advances it while the scheduler flushes it on stop, so both
+    are guarded by a lock.
+    """
+
+    def __init__(
+        self,
+        store: StateStore,
+        key: str,
+        commit_every: int = 20,
+        commit_interval: float = 10.0,
+    ):
+        """
+        :param store: Store keeping the position
+        :type store: StateStore
+        :param key: Name of the position in the store
+        :type key: str
+        :param commit_every: Number of advances between commits
+        :type commit_every: int
+        :param commit_interval: Maximum seconds between commits
+        :type commit_interval: float
+        """
+        self.store = store
+        self.key = key
+        self.commit_every = commit_every
+        self.commit_interval = commit_interval
+        self._position = store.get(key)
+        self._committed = self._position
+        self._pending = 0
+        self._last_commit = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def position(self) -> typing.Optional[int]:
+        """Last processed position or None if nothing was processed yet."""
+        return self._position
+
+    def advance(self, position: int):
+        """Marks everything up to a position as processed.
+
+        :param position: Last processed position
+        :type position: int
+        """
+        with self._lock:
+            if self._position is not None and position <= self._position:
+                return
+            self._position = position
+            self._pending += 1
+            if (
+                self._pending >= self.commit_every
+                or time.monotonic() - self._last_commit >= self.commit_interval
+            ):
+                self._flush()
+
+    def flush(self):
+        """Writes the current position to the store."""
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if self._position is None or self._position == self._committed:
+            return
+        self.store.set(self.key, self._position)
+        self._committed = self._position
+        self._pending = 0
+        self._last_commit = time.monotonic()
+        logger.debug("Checkpoint %s committed at %d", self.key, self._position)
@@ -0,0 +1,144 @@
+import logging
+import threading
+import typing
+from concurrent.futures import CancelledError, Future
+
+logger = logging.getLogger(__name__)
+
+
+class Coalescer:
+    """Folds updates of the same key arriving within a time window into one.
+
+    The first update of a key starts the window, later updates are merged into
+    the pending one and the handler is called once with the result when the
+    window ends. Updates arriving while the handler of their key runs, or the
+    future it returned is pending, start a new window after it finishes, so a
+    key is never handled concurrently. Every submitted update gets a future
+    resolved with the outcome of the handler call it was folded into.
+    """
+
+    def __init__(
+        self,
+        handler: typing.Callable[[typing.Hashable, typing.Any], typing.Any],
+        merge: typing.Callable[[typing.Any, typing.Any], typing.Any],
+        window: float,
+    ):
+        """
+        :param handler: Function called with a key and its merged update, it may
+            return a future of the write it started
+        :param merge: Function merging a pending update with a newer one
+        :param window: Seconds updates of a key are held
+        :type window: float
+        """
+        self.handler = handler
+        self.merge = merge
+        self.window = window
+        self.submitted = 0
+        self.emitted = 0
+        self.folded = 0
+        self._call_later = None
+        self._pending = {}
+        self._running = set()
+        self._lock = threading.Lock()
+
+    def start(self, call_later: typing.Callable):
+        """Starts holding updates, until then they are handled immediately.
+
+        :param call_later: Function scheduling a call, e.g. Scheduler.call_later
+        """
+        self._call_later = call_later
+
+    def submit(self, key: typing.Hashable, update: typing.Any) -> Future:
+        """Adds an update of a key.
+
+        :param key: Key the updates are folded by
+        :param update: Update
+        :return: future resolved when the handler, and the write it started, end
+        :rtype: concurrent.futures.Future
+        """
+        future = Future()
+        with self._lock:
+            self.submitted += 1
+            entry = self._pending.get(key)
+            if entry is not None:
+                entry[0] = self.merge(entry[0], update)
+                entry[1].append(future)
+                return future
+            self._pending[key] = [update, [future]]
+            if key in self._running:
+                # scheduled when the running handler finishes
+                return future
+        if self._call_later is None:
+            self._flush(key)
+        else:
+            self._call_later(self.window, self._flush, key)
+        return future
+
+    def _flush(self, key: typing.Hashable):
+        with self._lock:
+            entry = self._pending.pop(key, None)
+            if entry is None:
+                return
+            self._running.add(key)
+        update, futures = entry
+        count = len(futures)
+        if count > 1:
+            logger.info("Folded %d updates of %s", count, key)
+        try:
+            result = self.handler(key, update)
+        except Exception as e:
+            logger.exception("Failed to handle the update of %s", key)
+            self._finish(key, count)
+            for future in futures:
+                future.set_exception(e)
+            return
+        if isinstance(result, Future):
+            # the key stays busy until the write started by the handler ends
+            result.add_done_callback(lambda done: self._done(key, futures, done))
+        else:
+            self._finish(key, count)
+            for future in futures:
+                future.set_result(result)
+
+    def _done(self, key: typing.Hashable, futures: list, done: Future):
+        self._finish(key, len(futures))
+        error = CancelledError() if done.cancelled() else done.exception()
+        for future in futures:
+            if error is None:
+                future.set_result(done.result())
+            else:
+                future.set_exception(error)
+
+    def _finish(self, key: typing.Hashable, count: int):
+        with self._lock:
+            self._running.discard(key)
+            self.emitted += 1
+            self.folded += count - 1
+            again = key in self._pending
+        if again:
+            if self._call_later is None:
+                self._flush(key)
+            else:
+                self._call_later(self.window, self._flush, key)
+
+    def flush_all(self):
+        """Handles all pending updates immediately."""
+        self._call_later = None
+        with self._lock:
+            keys = list(self._pending)
+        for key in keys:
+            self._flush(key)
+
+    def stats(self) -> dict:
+        """Returns the number of submitted, emitted and folded updates.
+
+        :return: dictionary with statistics
+        :rtype: dict
+        """
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "submitted": self.submitted,
+                "emitted": self.emitted,
+                "folded": self.folded,
+            }
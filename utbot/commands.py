@@ -0,0 +1,268 @@
+import functools
+import logging
+import re
+import typing
+
+from constants import get_bot
+
+logger = logging.getLogger(__name__)
+
+PARAMS = (
+    "status",
+    "bounty",
+    "description",
+    "note",
+    "skills",
+    "discord",
+    "deadline",
+    "assignees",
+)
+STATUSES = ("open", "in progress", "closed")
+GROUPS = ("bot_cmd", "help") + PARAMS
+
+
+# every pattern is anchored at the current position and has no nested
+# ambiguous repetition, so a failed match gives up in linear time
+_HELP_RE = re.compile(r"[ \t]+(help)", re.IGNORECASE)
+_PARAM_RE = re.compile(
+    r"\s+(?:--)?(?:%s):?\s" % "|".join(f"(?P<{name}>{name})" for name in PARAMS),
+    re.IGNORECASE,
+)
+_STATUS_RE = re.compile(r"\s*(%s)" % "|".join(STATUSES), re.IGNORECASE)
+_BOUNTY_RE = re.compile(r"(?:\s*\d+(?:\.\d+)? \w+(?:\s*,)?)+")
+_TEXT_RE = re.compile(r'\s*"([^\n][^"\n]*)"')
+_QUOTED_RE = re.compile(r'\s*"([^"]*)"')
+_SKILLS_RE = re.compile(r"[\w\s,-]*")
+_SKILL_RE = re.compile(r"[\w -]")
+_ASSIGNEES_RE = re.compile(r"(?:@[\w.-]+(?:\s*,\s*)?)*")
+_DISCORD_ID_RE = re.compile(r"<@!?\d+>")
+_DISCORD_TAG_RE = re.compile(r"#\d{4}")
+_DEADLINE_RE = re.compile(
+    r"\s*(\d{4}-\d{2}-\d{2})(?:T\d{2}:\d{2}:\d{2}(?:Z|[+-]\d{4})?)?",
+    re.IGNORECASE,
+)
+
+
+def _parse_match(pattern: typing.Pattern, group: int = 0):
+    def parse(text: str, pos: int):
+        found = pattern.match(text, pos)
+        if found is None:
+            return None
+        return found.group(group), found.end()
+
+    return parse
+
+
+def _valid_skills(value: str) -> bool:
+    # comma separated words, the chunk before every comma needs a word
+    # character, hyphen or space
+    if not _SKILLS_RE.fullmatch(value):
+        return False
+    if value and not _SKILL_RE.match(value):
+        return False
+    return all(_SKILL_RE.search(chunk) for chunk in value.split(",")[:-1])
+
+
+def _parse_skills(text: str, pos: int):
+    found = _QUOTED_RE.match(text, pos)
+    if found is None or not _valid_skills(found.group(1)):
+        return None
+    return found.group(1), found.end()
+
+
+def _parse_assignees(text: str, pos: int):
+    # @name[, @name2] or @name@name2
+    found = _QUOTED_RE.match(text, pos)
+    if found is None or not _ASSIGNEES_RE.fullmatch(found.group(1)):
+        return None
+    return found.group(1), found.end()
+
+
+def _parse_discord(text: str, pos: int):
+    # <@0000> or anything on the line followed by #0000; the value may start
+    # with the spaces between the name of the parameter and the value
+    n = len(text)
+    tag_missing = False
+    while pos < n:
+        found = _DISCORD_ID_RE.match(text, pos)
+        if found is not None:
+            return found.group(), found.end()
+        if text[pos] == "\n":
+            tag_missing = False
+        elif not tag_missing:
+            line_end = text.find("\n", pos)
+            tag = _DISCORD_TAG_RE.search(
+                text, pos + 1, n if line_end == -1 else line_end
+            )
+            if tag is not None:
+                return text[pos : tag.end()], tag.end()
+            tag_missing = True
+        if not text[pos].isspace():
+            return None
+        pos += 1
+    return None
+
+
+_PARSERS = {
+    "status": _parse_match(_STATUS_RE, 1),
+    "bounty": _parse_match(_BOUNTY_RE),
+    "description": _parse_match(_TEXT_RE, 1),
+    "note": _parse_match(_TEXT_RE, 1),
+    "skills": _parse_skills,
+    "discord": _parse_discord,
+    "deadline": _parse_match(_DEADLINE_RE, 1),
+    "assignees": _parse_assignees,
+}
+
+
+def _parse_call(text: str, start: int, pos: int) -> typing.Tuple[dict, int]:
+    """Parses the parameters of a bot call, returns the raw values and the end."""
+    found = dict.fromkeys(GROUPS)
+    found["bot_cmd"] = text[start:pos]
+    help_cmd = _HELP_RE.match(text, pos)
+    if help_cmd is not None:
+        found["help"] = help_cmd.group(1)
+        return found, help_cmd.end()
+    while True:
+        param = _PARAM_RE.match(text, pos)
+        if param is None:
+            break
+        # the value starts after at least one whitespace character
+        parsed = _PARSERS[param.lastgroup](text, param.end())
+        if parsed is None:
+            break
+        found[param.lastgroup], pos = parsed
+        if text.startswith(";", pos):
+            pos += 1
+    return found, pos
+
+
+def build_command(found: dict) -> dict:
+    """Converts raw parameter values to a command.
+
+    :param found: Raw values of the parameters
+    :type found: dict
+    :return: dictionary with the command and its arguments
+    :rtype: dict
+    """
+    return {
+        "help": found.get("help"),
+        "status": found.get("status"),
+        "bounty": (
+            [x.strip().upper() for x in found["bounty"].split(",")]
+            if found.get("bounty")
+            else None
+        ),
+        "description": (
+            found["description"].strip() if found.get("description") else None
+        ),
+        "note": found["note"].strip() if found.get("note") else None,
+        "skills": (
+            [s.strip() for s in found["skills"].split(",") if s.strip()]
+            if found.get("skills")
+            else None
+        ),
+        "discord": found.get("discord"),
+        "deadline": found.get("deadline"),
+        "assignees": (
+            [a.strip("@ ") for a in found["assignees"].split(",") if a.strip("@ ")]
+            if found.get("assignees")
+            else None
+        ),
+    }
+
+
+@functools.lru_cache(maxsize=None)
+def get_call_pattern() -> typing.Pattern:
+    """Compiles the pattern of the configured bot call.
+
+    :rtype: re.Pattern
+    """
+    return re.compile(re.escape(get_bot().call), re.IGNORECASE)
+
+
+def iter_raw_commands(text: str) -> typing.Iterator[dict]:
+    """Yields raw parameter values of every bot call in a text.
+
+    Texts without the bot call are rejected by a substring check. Calls are
+    parsed in a single pass without backtracking, so the time is linear in the
+    length of the text. A call inside the parameters of a previous call is not
+    a new call.
+
+    :param text: Text with bot calls
+    :type text: str
+    """
+    bot = get_bot()
+    if bot.prefix not in text or bot.call not in text.lower():
+        return
+    call_re = get_call_pattern()
+    pos = 0
+    while True:
+        call = call_re.search(text, pos)
+        if call is None:
+            return
+        found, pos = _parse_call(text, call.start(), call.end())
+        yield found
+
+
+def parse_commands(text: str) -> typing.List[dict]:
+    """Parses all bot calls in a text.
+
+    :param text: Text with bot calls
+    :type text: str
+    :return: list of commands in the order of the calls
+    :rtype: list
+    """
+    return [build_command(found) for found in iter_raw_commands(text)]
+
+
+def merge_commands(commands: typing.Sequence[dict]) -> typing.Optional[dict]:
+    """Merges commands, the arguments of later commands take precedence.
+
+    Used for several bot calls in one comment: an argument a later call leaves
+    out keeps the value of an earlier call.
+
+    :param commands: Commands in the order of the calls
+    :type commands: list
+    :return: merged command or None if there are no commands
+    :rtype: dict
+    """
+    if not commands:
+        return None
+    merged = dict(commands[0])
+    for command in commands[1:]:
+        merged.update((k, v) for k, v in command.items() if v is not None)
+    return merged
+
+
+def command_action(
+    parsed_cmd: typing.Optional[dict], author: str, account: str
+) -> typing.Optional[str]:
+    """Decides how the bot reacts to the merged commands of a comment.
+
+    Help calls of the bot account itself are not answered, their other
+    arguments are handled like any other command.
+
+    :param parsed_cmd: Merged command or None
+    :type parsed_cmd: dict
+    :param author: Author of the comment
+    :type author: str
+    :param account: Account of the bot
+    :type account: str
+    :return: ``"help"``, ``"status_missing"``, ``"task"`` or None if the bot
+        ignores the comment
+    :rtype: str
+    """
+    if parsed_cmd is None:
+        return None
+    if parsed_cmd["help"] is not None and author != account:
+        return "help"
+    if parsed_cmd["status"] is not None:
+        return "task"
+    # the status is asked for only if the call has several other arguments
+    if (
+        parsed_cmd["help"] is None
+        and sum(v is not None for v in parsed_cmd.values()) > 1
+    ):
+        return "status_missing"
+    return None
@@ -1,40 +1,38 @@
-import json
-import os
-import re
-
-from beem import Steem
-from beem.instance import set_shared_steem_instance
-from beem.nodelist import NodeList
-
-from dotenv import find_dotenv, load_dotenv
-
-load_dotenv(find_dotenv())
-here = os.path.dirname(__file__)
-
-# Load config
-with open(os.path.join(here, "config.json"), "r") as f:
-    CONFIG = json.load(f)
-# load keys from ENV if not defined in config file
-if not CONFIG["steem"]["posting_key"]:
-    CONFIG["steem"]["posting_key"] = os.environ.get("UT_PK")
-if not CONFIG["steem"]["account"]:
-    CONFIG["steem"]["account"] = os.environ.get("UT_ACCOUNT")
-if not CONFIG["discord"]["webhooks"]["tasks"]:
-    CONFIG["discord"]["webhooks"]["tasks"] = os.environ.get("UT_WH_TASKS")
-if not CONFIG["discord"]["webhooks"]["contributions"]:
-    CONFIG["discord"]["webhooks"]["contributions"] = os.environ.get("UT_WH_CONTRS")
-
-
-# Steem config
-STM = Steem(
-    node=NodeList().get_nodes(), keys=CONFIG["steem"]["posting_key"], timeout=15
-)
-set_shared_steem_instance(STM)
-ACCOUNT = CONFIG["steem"]["account"]
-
-# DISCORD
-DISCORD_WEBHOOK_TASKS = CONFIG["discord"]["webhooks"]["tasks"]
-DISCORD_WEBHOOK_CONTRIBUTIONS = CONFIG["discord"]["webhooks"]["contributions"]
+import functools
+import typing
+
+from settings import get_config
+
+
+# BOT PROPERTIES
+class Bot(typing.NamedTuple):
+    """Identity of the bot from the ``bot`` section of the configuration."""
+
+    prefix: str
+    name: str
+    url: str
+    ui_url: str
+
+    @property
+    def call(self) -> str:
+        """Lower-case bot call, e.g. ``!utbot``."""
+        return f"{self.prefix}{self.name}".lower()
+
+
+@functools.lru_cache(maxsize=None)
+def get_bot() -> Bot:
+    """Gets the bot's prefix, name and URLs, the configuration is read once.
+
+    :rtype: Bot
+    """
+    config = get_config()
+    return Bot(
+        config["bot"]["prefix"],
+        config["bot"]["name"],
+        config["bot"]["url"],
+        config["steem"]["ui_url"],
+    )
+
 
 # UTOPIAN CATEGORIES
 CATEGORIES_PROPERTIES = {
@@ -129,39 +127,6 @@ for k, v in CATEGORIES_PROPERTIES.items():
         "image_url": v["image_url"],
     }
 
-# BOT PROPERTIES
-BOT_PREFIX = CONFIG["bot"]["prefix"]
-BOT_NAME = CONFIG["bot"]["name"]
-BOT_REPO_URL = CONFIG["bot"]["url"]
-
-# BOT COMMANDS REGEX
-CMD_RE = re.compile(
-    rf"""
-(?P<bot_cmd>{BOT_PREFIX}{BOT_NAME})     # bot called
-"""
-    r"""
-(?:
-    (?:
-        [ \t]+(?P<help>help)                # help command with preceding space
-    )
-    | (?:\s+(?:--)?(?:
-          (?:status:?\s+?(?P<status>open|in[ ]progress|closed))                     # status [open, in progress, closed]
-        | (?:bounty:?\s+?(?P<bounty>(?:\s*?\d+(?:\.\d+?)?[ ]\w+(?:\s*?,\s*?)?)+))   # bounty 00 name[, 01 name2]
-        | (?:description:?\s+?"(?P<description>.+?)")     # description "text"
-        | (?:note:?\s+?"(?P<note>.+?)")     # note "text"
-        | (?:skills:?\s+?"(?P<skills>(?:[-_\w ]+(?:\s*?,?\s*?))*)")   # skills skillone[, skilltwo, ...]
-        | (?:discord:?\s+?(?P<discord><@!?\d+>|.+?[#]\d{4}))                 # <@00000000000> | username#0000
-        | (?:deadline:?\s+?(?P<deadline>\d{4}-\d{2}-\d{2})(?:T\d{2}:\d{2}:\d{2}(?:Z|[+-]\d{4})?)?) # deadline YYYY-MM-DD (considers only date)
-        | (?:assignees:?\s+?"(?P<assignees>(?:@[\w\d.-]+(?:\s*?,\s*?)?)*)")  # naive regex
-    );?)*
-)?
-""",
-    flags=re.VERBOSE | re.IGNORECASE | re.MULTILINE,
-)
-
-ACCOUNTS = CONFIG["steem"]["reviewers"]
-UI_BASE_URL = CONFIG["steem"]["ui_url"]
-
 TASK_EXAMPLE = {
     "status": "open",
     "bounty": "10 SBD",
@@ -171,21 +136,39 @@ TASK_EXAMPLE = {
     "discord": "<@351997733646761985>",
 }
 
-MSG_TASK_EXAMPLE_MULT_LINES = f"{BOT_PREFIX}{BOT_NAME}\n" + "\n".join(
-    f"{k}: {v}" for k, v in TASK_EXAMPLE.items()
-)
-
-MSG_TASK_EXAMPLE_ONE_LINE = f"{BOT_PREFIX}{BOT_NAME} " + " ".join(
-    f"--{k} {v}" for k, v in TASK_EXAMPLE.items()
-)
-
-MESSAGES = {
-    "HELP": "Hi, you called for help. Brief examples of the bot calls are included below. "
-    f"You can read about the parameters in the bot's [description]({BOT_REPO_URL})."
-    "\n\n<hr/>"
-    f"\n\n```\n{MSG_TASK_EXAMPLE_ONE_LINE}\n```"
-    "\n\n<hr/>"
-    f"\n\n```\n{MSG_TASK_EXAMPLE_MULT_LINES}\n```",
-    "STATUS_MISSING": f"Hello, we detected that you called {BOT_NAME} without defining the current "
-    f"status of the task. Please read the bot's [description]({BOT_REPO_URL}).",
-}
+
+def get_task_examples() -> typing.Tuple[str, str]:
+    """Builds example bot calls with all parameters.
+
+    :return: tuple of the call on one line and on multiple lines
+    :rtype: tuple
+    """
+    bot = get_bot()
+    one_line = f"{bot.prefix}{bot.name} " + " ".join(
+        f"--{k} {v}" for k, v in TASK_EXAMPLE.items()
+    )
+    multiple_lines = f"{bot.prefix}{bot.name}\n" + "\n".join(
+        f"{k}: {v}" for k, v in TASK_EXAMPLE.items()
+    )
+    return one_line, multiple_lines
+
+
+@functools.lru_cache(maxsize=None)
+def get_messages() -> dict:
+    """Builds the bot's replies from its configured name and repository.
+
+    :return: mapping of message names to Markdown bodies
+    :rtype: dict
+    """
+    bot = get_bot()
+    one_line, multiple_lines = get_task_examples()
+    return {
+        "HELP": "Hi, you called for help. Brief examples of the bot calls are included below. "
+        f"You can read about the parameters in the bot's [description]({bot.url})."
+        "\n\n<hr/>"
+        f"\n\n```\n{one_line}\n```"
+        "\n\n<hr/>"
+        f"\n\n```\n{multiple_lines}\n```",
+        "STATUS_MISSING": f"Hello, we detected that you called {bot.name} without defining the current "
+        f"status of the task. Please read the bot's [description]({bot.url}).",
+    }
@@ -0,0 +1,41 @@
+import typing
+
+from beem.comment import Comment
+from beem.exceptions import ContentDoesNotExistsException
+from beem.utils import resolve_authorperm
+
+from settings import get_node_pool
+
+
+def load_comment(authorperm: str) -> Comment:
+    """Fetches a post from the healthiest node.
+
+    :param authorperm: ``@author/permlink`` of the post
+    :type authorperm: str
+    :return: post
+    :rtype: Comment
+    """
+    author, permlink = resolve_authorperm(authorperm)
+    data = get_node_pool().call("condenser_api.get_content", [author, permlink])
+    if not data or not data.get("author"):
+        raise ContentDoesNotExistsException(authorperm)
+    return Comment(data)
+
+
+def find_reply(comment: Comment, account: str) -> typing.Optional[Comment]:
+    """Finds a reply of an account on a post.
+
+    :param comment: Replied post
+    :type comment: Comment
+    :param account: Author of the reply
+    :type account: str
+    :return: reply or None if the account didn't reply
+    :rtype: Comment
+    """
+    replies = get_node_pool().call(
+        "condenser_api.get_content_replies", [comment["author"], comment["permlink"]]
+    )
+    for reply in replies:
+        if reply["author"] == account:
+            return Comment(reply)
+    return None
@@ -0,0 +1,526 @@
+import bisect
+import collections
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+import typing
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+MEMBER_PREFIX = "member:"
+
+REPLICAS = REGISTRY.gauge("utbot_replicas", "Live replicas seen by this replica")
+
+
+class LeaseBackend:
+    """Shared store of named leases with an owner and an expiry time.
+
+    The backend also keeps completion marks of processed items, so a replica
+    taking over a key skips the items its old owner finished, and expiring
+    values shared by the replicas, e.g. block ranges fetched by one of them.
+    Backends for other stores (etcd, Redis, a database server) implement the
+    same seven methods; the leases are compared with the clocks of the
+    replicas, so they have to be roughly in sync.
+    """
+
+    def acquire(self, name: str, owner: str, ttl: float) -> bool:
+        """Takes a lease that is free or expired, or renews a lease of the owner.
+
+        :param name: Name of the lease
+        :type name: str
+        :param owner: Identifier of the replica
+        :type owner: str
+        :param ttl: Seconds the lease is valid without a renewal
+        :type ttl: float
+        :return: whether the owner holds the lease
+        :rtype: bool
+        """
+        raise NotImplementedError
+
+    def release(self, name: str, owner: str):
+        """Gives up a lease if it is held by the owner.
+
+        :param name: Name of the lease
+        :type name: str
+        :param owner: Identifier of the replica
+        :type owner: str
+        """
+        raise NotImplementedError
+
+    def holders(self, prefix: str) -> typing.Dict[str, str]:
+        """Gets the owners of the valid leases with a name prefix.
+
+        :param prefix: Prefix of the lease names
+        :type prefix: str
+        :return: mapping of lease names to owners
+        :rtype: dict
+        """
+        raise NotImplementedError
+
+    def mark_done(self, name: str, version: float, ttl: float):
+        """Records that an item was processed, keeping the highest version.
+
+        :param name: Idempotency key of the item
+        :type name: str
+        :param version: Version of the item, e.g. the time of its last command
+        :type version: float
+        :param ttl: Seconds the mark is kept
+        :type ttl: float
+        """
+        raise NotImplementedError
+
+    def done_version(self, name: str) -> typing.Optional[float]:
+        """Gets the highest processed version of an item.
+
+        :param name: Idempotency key of the item
+        :type name: str
+        :return: version or None if the item has no valid mark
+        :rtype: float
+        """
+        raise NotImplementedError
+
+    def put(self, name: str, value: str, ttl: float):
+        """Stores a value shared by the replicas.
+
+        :param name: Name of the value
+        :type name: str
+        :param value: Value, e.g. a JSON document
+        :type value: str
+        :param ttl: Seconds the value is kept
+        :type ttl: float
+        """
+        raise NotImplementedError
+
+    def get(self, name: str) -> typing.Optional[str]:
+        """Gets a value shared by the replicas.
+
+        :param name: Name of the value
+        :type name: str
+        :return: value or None if it isn't stored or expired
+        :rtype: str
+        """
+        raise NotImplementedError
+
+
+class SQLiteLeaseBackend(LeaseBackend):
+    """Leases kept in a SQLite file shared by replicas on one host.
+
+    Every acquisition runs in an immediate transaction, so SQLite's file lock
+    serializes the replicas. Meant for a single host and for testing, the file
+    must not be on a network file system.
+    """
+
+    def __init__(self, path: str, clock: typing.Callable[[], float] = time.time):
+        """
+        :param path: Path to the SQLite database file
+        :type path: str
+        :param clock: Function returning the current epoch time
+        """
+        self.path = path
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, "
+            "owner TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS done (name TEXT PRIMARY KEY, "
+            "version REAL NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS shared (name TEXT PRIMARY KEY, "
+            "value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS shared_expires ON shared (expires_at)"
+        )
+
+    def acquire(self, name: str, owner: str, ttl: float) -> bool:
+        now = self._clock()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT owner, expires_at FROM leases WHERE name = ?", (name,)
+                ).fetchone()
+                acquired = row is None or row[0] == owner or row[1] <= now
+                if acquired:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO leases (name, owner, expires_at) "
+                        "VALUES (?, ?, ?)",
+                        (name, owner, now + ttl),
+                    )
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        return acquired
+
+    def release(self, name: str, owner: str):
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner)
+            )
+
+    def holders(self, prefix: str) -> typing.Dict[str, str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT name, owner FROM leases "
+                "WHERE substr(name, 1, ?) = ? AND expires_at > ?",
+                (len(prefix), prefix, self._clock()),
+            ).fetchall()
+        return dict(rows)
+
+    def mark_done(self, name: str, version: float, ttl: float):
+        now = self._clock()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM done WHERE expires_at <= ?", (now,))
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO done (name, version, expires_at) "
+                    "VALUES (?, MAX(?, COALESCE((SELECT version FROM done "
+                    "WHERE name = ?), ?)), ?)",
+                    (name, version, name, version, now + ttl),
+                )
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def done_version(self, name: str) -> typing.Optional[float]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT version FROM done WHERE name = ? AND expires_at > ?",
+                (name, self._clock()),
+            ).fetchone()
+        return row[0] if row is not None else None
+
+    def put(self, name: str, value: str, ttl: float):
+        now = self._clock()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM shared WHERE expires_at <= ?", (now,))
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO shared (name, value, expires_at) "
+                    "VALUES (?, ?, ?)",
+                    (name, value, now + ttl),
+                )
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def get(self, name: str) -> typing.Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM shared WHERE name = ? AND expires_at > ?",
+                (name, self._clock()),
+            ).fetchone()
+        return row[0] if row is not None else None
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """Consistent hashing of keys to replicas.
+
+    Every replica is placed on the ring ``vnodes`` times, so the keys are
+    spread evenly and a replica joining or leaving moves only its share of
+    them.
+    """
+
+    def __init__(self, nodes: typing.Iterable[str], vnodes: int = 64):
+        """
+        :param nodes: Identifiers of the replicas
+        :type nodes: list
+        :param vnodes: Points of every replica on the ring
+        :type vnodes: int
+        """
+        self.nodes = frozenset(nodes)
+        points = sorted(
+            (_hash(f"{n}#{i}"), n) for n in self.nodes for i in range(vnodes)
+        )
+        self._hashes = [p[0] for p in points]
+        self._owners = [p[1] for p in points]
+
+    def owner(self, key: str) -> typing.Optional[str]:
+        """Gets the replica owning a key.
+
+        :param key: Key, e.g. an ``authorperm``
+        :type key: str
+        :return: replica or None if the ring is empty
+        :rtype: str
+        """
+        if not self._hashes:
+            return None
+        i = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._owners[i]
+
+
+class Coordinator:
+    """Partitions work between replicas with leases and a hash ring.
+
+    Every replica renews a membership lease on :meth:`heartbeat` and builds a
+    hash ring of the live members. A replica that can't renew its lease stops
+    owning anything before the others take over its keys, and a new member
+    starts owning keys only ``lease_ttl`` seconds after it joined, when the
+    others have seen it at their heartbeats and stopped owning them. A key has
+    no owner during that gap instead of two, as long as the heartbeats run
+    more often than ``lease_ttl``; :meth:`start` runs them in a thread of their
+    own, so slow work doesn't delay them.
+
+    Items a replica doesn't own are held for ``handoff_window`` seconds. When
+    keys move to this replica, its held items of those keys are passed to their
+    handlers, so the work of a replica that died before finishing it isn't
+    lost. Items held with an idempotency key are skipped if their owner marked
+    them done with :meth:`mark_done`; the others have to be idempotent.
+    """
+
+    def __init__(
+        self,
+        backend: LeaseBackend,
+        replica_id: str,
+        lease_ttl: float = 5,
+        handoff_window: float = 120,
+        vnodes: int = 64,
+        max_held: int = 10000,
+        clock: typing.Callable[[], float] = time.time,
+    ):
+        """
+        :param backend: Store of the leases
+        :type backend: LeaseBackend
+        :param replica_id: Unique identifier of this replica
+        :type replica_id: str
+        :param lease_ttl: Seconds the leases are valid without a renewal
+        :type lease_ttl: float
+        :param handoff_window: Seconds items of other replicas are held
+        :type handoff_window: float
+        :param vnodes: Points of every replica on the hash ring
+        :type vnodes: int
+        :param max_held: Maximum number of held items, the oldest are dropped
+        :type max_held: int
+        :param clock: Function returning the current epoch time
+        """
+        self.backend = backend
+        self.replica_id = replica_id
+        self.lease_ttl = lease_ttl
+        self.handoff_window = handoff_window
+        self.vnodes = vnodes
+        self.ring = HashRing((), vnodes)
+        self.changes = 0
+        self.taken_over = 0
+        self.already_done = 0
+        self._clock = clock
+        self._valid_until = 0
+        self._owning_from = None
+        self._owning = False
+        self._call_later = None
+        self._held = collections.deque(maxlen=max_held)
+        self._lock = threading.Lock()
+
+    def heartbeat(self):
+        """Renews the leases, updates the hash ring and takes over held items."""
+        now = self._clock()
+        try:
+            member = self.backend.acquire(
+                MEMBER_PREFIX + self.replica_id, self.replica_id, self.lease_ttl
+            )
+            if not member:
+                logger.error(
+                    "Replica id %s is held by another process", self.replica_id
+                )
+                self._valid_until = 0
+                self._owning_from = None
+                self._owning = False
+                return
+            members = self.backend.holders(MEMBER_PREFIX).values()
+        except Exception:
+            logger.exception("Can't renew the leases of %s", self.replica_id)
+            return
+        self._valid_until = now + self.lease_ttl
+        if self._owning_from is None:
+            self._owning_from = now + self.lease_ttl
+        moved = False
+        if frozenset(members) != self.ring.nodes:
+            self.ring = HashRing(members, self.vnodes)
+            self.changes += 1
+            REPLICAS.set(len(self.ring.nodes))
+            logger.info("Replicas: %s", sorted(self.ring.nodes))
+            moved = True
+        if not self._owning and now >= self._owning_from:
+            logger.info("Replica %s starts owning its keys", self.replica_id)
+            self._owning = moved = True
+        if moved:
+            self._take_over()
+        self._expire(now)
+
+    def start(
+        self,
+        spawn: typing.Callable,
+        shutdown: threading.Event,
+        interval: float,
+        call_later: typing.Callable = None,
+    ):
+        """Runs the heartbeats in their own thread until a shutdown is requested.
+
+        :param spawn: Function running a long running function in a thread
+        :param shutdown: Event stopping the heartbeats
+        :type shutdown: threading.Event
+        :param interval: Seconds between heartbeats
+        :type interval: float
+        :param call_later: Function scheduling a call, e.g. Scheduler.call_later;
+            items taken over are processed with it instead of in the heartbeat
+            thread
+        """
+        self._call_later = call_later
+        spawn(self.run, shutdown, interval, name="coordination-heartbeat")
+
+    def run(self, shutdown: threading.Event, interval: float):
+        """Sends heartbeats until a shutdown is requested.
+
+        :param shutdown: Event stopping the heartbeats
+        :type shutdown: threading.Event
+        :param interval: Seconds between heartbeats
+        :type interval: float
+        """
+        while not shutdown.wait(interval):
+            try:
+                self.heartbeat()
+            except Exception:
+                logger.exception("Heartbeat of %s failed", self.replica_id)
+
+    def owns(self, key: str) -> bool:
+        """Checks whether this replica is responsible for a key.
+
+        :param key: Key, e.g. an ``authorperm``
+        :type key: str
+        :rtype: bool
+        """
+        if not self._owning or self._clock() >= self._valid_until:
+            return False
+        return self.ring.owner(key) == self.replica_id
+
+    def hold(
+        self,
+        key: str,
+        handler: typing.Callable,
+        payload,
+        done_key: str = None,
+        version: float = 0,
+    ):
+        """Keeps an item of another replica in case its key moves here.
+
+        :param key: Key of the item
+        :type key: str
+        :param handler: Function processing the item
+        :param payload: Argument of the handler
+        :param done_key: Idempotency key checked before the item is taken over
+        :type done_key: str
+        :param version: Version of the item, it is skipped if a version as
+            high is marked done
+        :type version: float
+        """
+        with self._lock:
+            self._held.append(
+                (
+                    self._clock() + self.handoff_window,
+                    key,
+                    handler,
+                    payload,
+                    done_key,
+                    version,
+                )
+            )
+
+    def mark_done(self, done_key: str, version: float = 0):
+        """Records that an item was processed, so other replicas don't repeat it.
+
+        :param done_key: Idempotency key of the item
+        :type done_key: str
+        :param version: Version of the item
+        :type version: float
+        """
+        try:
+            self.backend.mark_done(done_key, version, self.handoff_window)
+        except Exception:
+            logger.exception("Can't mark %s done", done_key)
+
+    def _take_over(self):
+        with self._lock:
+            held = list(self._held)
+            self._held.clear()
+            owned = []
+            for item in held:
+                if self.owns(item[1]):
+                    owned.append(item)
+                else:
+                    self._held.append(item)
+        if owned:
+            logger.info("Taking over %d items from other replicas", len(owned))
+        for item in owned:
+            if self._call_later is None:
+                self._process_held(*item[1:])
+            else:
+                self._call_later(0, self._process_held, *item[1:])
+
+    def _process_held(self, key, handler, payload, done_key, version):
+        if done_key is not None:
+            try:
+                done = self.backend.done_version(done_key)
+            except Exception:
+                logger.exception("Can't check whether %s is done", done_key)
+                done = None
+            if done is not None and done >= version:
+                logger.debug("%s was done by its previous owner", done_key)
+                self.already_done += 1
+                return
+        self.taken_over += 1
+        try:
+            handler(payload)
+        except Exception:
+            logger.exception("Failed to process %s taken over", key)
+
+    def _expire(self, now: float):
+        with self._lock:
+            while self._held and self._held[0][0] < now:
+                self._held.popleft()
+
+    def stop(self):
+        """Releases the leases, so the other replicas take over right away."""
+        self._valid_until = 0
+        self._owning = False
+        try:
+            self.backend.release(MEMBER_PREFIX + self.replica_id, self.replica_id)
+        except Exception:
+            logger.exception("Can't release the leases of %s", self.replica_id)
+
+    def stats(self) -> dict:
+        """Returns the replicas and the handoff counters.
+
+        :return: dictionary with statistics
+        :rtype: dict
+        """
+        return {
+            "replicas": sorted(self.ring.nodes),
+            "changes": self.changes,
+            "held": len(self._held),
+            "taken_over": self.taken_over,
+            "already_done": self.already_done,
+        }
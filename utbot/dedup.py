@@ -0,0 +1,160 @@
+import calendar
+import logging
+import sqlite3
+import threading
+import time
+import typing
+
+logger = logging.getLogger(__name__)
+
+
+def parse_utc_timestamp(value: str) -> int:
+    """Converts a ``YYYY-MM-DD HH:MM:SS`` (or ISO ``T``) UTC date to epoch seconds.
+
+    Slices the fixed width fields instead of calling ``datetime.strptime``.
+
+    :param value: UTC date
+    :type value: str
+    :return: seconds since the epoch
+    :rtype: int
+    """
+    return calendar.timegm(
+        (
+            int(value[0:4]),
+            int(value[5:7]),
+            int(value[8:10]),
+            int(value[11:13]),
+            int(value[14:16]),
+            int(value[17:19]),
+        )
+    )
+
+
+class SeenStore:
+    """Remembers when items were last seen to announce every item only once.
+
+    Every key maps to the epoch timestamp of its last announced update. Entries
+    older than ``ttl`` are dropped, so the store stays bounded by the number of
+    items updated within that horizon. New and updated entries are saved to
+    SQLite on :meth:`flush` and loaded again on start.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        name: str,
+        ttl: float,
+        min_interval: float = 0,
+        clock: typing.Callable[[], float] = time.time,
+    ):
+        """
+        :param path: Path to the SQLite database file
+        :type path: str
+        :param name: Name of the store, several stores can share a database
+        :type name: str
+        :param ttl: Seconds an entry is kept, updates older than that are ignored
+        :type ttl: float
+        :param min_interval: Seconds an update has to be newer than the last one
+            to be announced again
+        :type min_interval: float
+        :param clock: Function returning the current epoch time
+        """
+        self.path = path
+        self.name = name
+        self.ttl = ttl
+        self.min_interval = min_interval
+        self._clock = clock
+        self._since = int(clock())
+        self._seen = {}
+        self._dirty = {}
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS seen (store TEXT NOT NULL, "
+                    "key TEXT NOT NULL, seen_at INTEGER NOT NULL, "
+                    "PRIMARY KEY (store, key))"
+                )
+            horizon = int(self._clock() - self.ttl)
+            self._seen = dict(
+                conn.execute(
+                    "SELECT key, seen_at FROM seen WHERE store = ? AND seen_at >= ?",
+                    (self.name, horizon),
+                )
+            )
+            self._conn = conn
+            logger.debug("Loaded %d %s entries", len(self._seen), self.name)
+        return self._conn
+
+    def __len__(self):
+        with self._lock:
+            self._connect()
+            return len(self._seen)
+
+    def mark(self, key: str, timestamp: int) -> bool:
+        """Records an update of an item unless it was already announced.
+
+        An update is new if it is within the horizon and more than
+        ``min_interval`` newer than the last announced update of the key, or
+        than the start of the bot for unknown keys.
+
+        :param key: Key of the item
+        :type key: str
+        :param timestamp: Epoch time of the update
+        :type timestamp: int
+        :return: True if the update is new
+        :rtype: bool
+        """
+        with self._lock:
+            self._connect()
+            return self._mark(key, timestamp, self._clock() - self.ttl)
+
+    def mark_many(self, items: typing.Iterable[tuple]) -> typing.List[bool]:
+        """Records several ``(key, timestamp)`` updates, see :meth:`mark`.
+
+        :param items: Pairs of a key and an epoch time
+        :type items: list
+        :return: whether each update is new
+        :rtype: list
+        """
+        with self._lock:
+            self._connect()
+            horizon = self._clock() - self.ttl
+            return [self._mark(key, timestamp, horizon) for key, timestamp in items]
+
+    def _mark(self, key: str, timestamp: int, horizon: float) -> bool:
+        if timestamp < horizon:
+            return False
+        if timestamp <= self._seen.get(key, self._since) + self.min_interval:
+            return False
+        self._seen[key] = timestamp
+        self._dirty[key] = timestamp
+        return True
+
+    def flush(self):
+        """Saves new entries and deletes expired ones."""
+        with self._lock:
+            conn = self._connect()
+            horizon = int(self._clock() - self.ttl)
+            expired = [key for key, seen_at in self._seen.items() if seen_at < horizon]
+            for key in expired:
+                del self._seen[key]
+            dirty = list(self._dirty.items())
+            self._dirty.clear()
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO seen (store, key, seen_at) VALUES (?, ?, ?)",
+                    [(self.name, key, seen_at) for key, seen_at in dirty],
+                )
+                conn.execute(
+                    "DELETE FROM seen WHERE store = ? AND seen_at < ?",
+                    (self.name, horizon),
+                )
+        if expired:
+            logger.debug("Expired %d %s entries", len(expired), self.name)
@@ -0,0 +1,394 @@
+import collections
+import json
+import logging
+import queue
+import threading
+import time
+import typing
+from concurrent.futures import Future
+
+import requests
+
+from metrics import PIPELINE_BUCKETS, REGISTRY
+from ratelimit import (
+    WRITE_FAILURES,
+    WRITE_LATENCY,
+    WRITE_RETRIES,
+    RateLimiter,
+    TokenBucket,
+    backoff_delay,
+)
+
+logger = logging.getLogger(__name__)
+
+MAX_EMBEDS = 10
+MAX_CONTENT_LENGTH = 2000
+MAX_EMBEDS_LENGTH = 6000
+# Discord allows 5 requests per 2 seconds to a webhook
+WEBHOOK_RATE = 2.5
+WEBHOOK_BURST = 5
+
+
+class DeliveryError(Exception):
+    pass
+
+
+BLOCK_TO_DISCORD = REGISTRY.histogram(
+    "utbot_block_to_discord_seconds",
+    "Seconds from the block of a reviewer comment to the delivery of its Discord "
+    "message",
+    buckets=PIPELINE_BUCKETS,
+)
+
+
+def embed_to_dict(embed) -> dict:
+    """Converts a DiscordEmbed (or a dict) to the JSON payload of an embed.
+
+    :param embed: DiscordEmbed or an embed dictionary
+    :return: embed payload without empty values
+    :rtype: dict
+    """
+    data = embed if isinstance(embed, dict) else vars(embed)
+    return {k: v for k, v in data.items() if v is not None and v != []}
+
+
+def embed_length(embed: dict) -> int:
+    """Counts the characters Discord includes in the embed size limit.
+
+    :param embed: Embed payload
+    :type embed: dict
+    :return: number of characters
+    :rtype: int
+    """
+    length = len(embed.get("title") or "") + len(embed.get("description") or "")
+    length += len((embed.get("footer") or {}).get("text") or "")
+    length += len((embed.get("author") or {}).get("name") or "")
+    for field in embed.get("fields") or ():
+        length += len(field.get("name") or "") + len(field.get("value") or "")
+    return length
+
+
+class Message:
+    __slots__ = ("content", "embeds", "length", "enqueued_at", "origin", "future")
+
+    def __init__(self, content: str, embeds: list, origin: float = None):
+        self.origin = origin
+        self.content = content or ""
+        self.embeds = [embed_to_dict(embed) for embed in embeds]
+        self.length = sum(embed_length(embed) for embed in self.embeds)
+        self.enqueued_at = time.monotonic()
+        self.future = Future()
+
+
+class WebhookSender:
+    """Delivers queued messages to a single Discord webhook.
+
+    Consecutive messages are packed into one request with up to 10 embeds. The
+    sender follows the rate limit headers returned by Discord, waits for
+    ``retry_after`` on HTTP 429 and retries server and connection errors with a
+    jittered exponential backoff.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        session: requests.Session,
+        max_attempts: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        timeout: float = 15,
+        bucket: TokenBucket = None,
+    ):
+        """
+        :param url: Webhook URL
+        :type url: str
+        :param session: Shared HTTP session
+        :type session: requests.Session
+        :param max_attempts: Attempts to deliver a message before it is dropped
+        :type max_attempts: int
+        :param backoff_base: Delay after the first failed attempt
+        :type backoff_base: float
+        :param backoff_max: Maximum delay between attempts
+        :type backoff_max: float
+        :param timeout: Request timeout in seconds
+        :type timeout: float
+        :param bucket: Token bucket of the webhook
+        :type bucket: TokenBucket
+        """
+        self.url = url
+        self.session = session
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.bucket = bucket or TokenBucket(WEBHOOK_RATE, WEBHOOK_BURST)
+        self.queue = queue.Queue()
+        self.delivered = 0
+        self.failed = 0
+        self.requests = 0
+        self.latencies = collections.deque(maxlen=100)
+        self._carry = None
+
+    def enqueue(self, content: str, embeds: list, origin: float = None) -> Future:
+        """Queues a message for delivery.
+
+        :param content: Message text
+        :type content: str
+        :param embeds: List of DiscordEmbed objects or embed dictionaries
+        :type embeds: list
+        :param origin: Epoch seconds of the event the message reports
+        :type origin: float
+        :return: future resolved when the message is delivered or dropped
+        :rtype: concurrent.futures.Future
+        """
+        message = Message(content, embeds, origin)
+        self.queue.put(message)
+        return message.future
+
+    def _next_batch(self, timeout: float) -> list:
+        if self._carry is not None:
+            first, self._carry = self._carry, None
+        else:
+            first = self.queue.get(timeout=timeout)
+        batch = [first]
+        contents = len(first.content)
+        embeds = len(first.embeds)
+        length = first.length
+        while embeds < MAX_EMBEDS:
+            try:
+                message = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if (
+                embeds + len(message.embeds) > MAX_EMBEDS
+                or contents + len(message.content) + 1 > MAX_CONTENT_LENGTH
+                or length + message.length > MAX_EMBEDS_LENGTH
+            ):
+                self._carry = message
+                break
+            batch.append(message)
+            contents += len(message.content) + 1
+            embeds += len(message.embeds)
+            length += message.length
+        return batch
+
+    def _update_rate_limit(self, status: int, headers: typing.Mapping, text: str):
+        delay = None
+        if status == 429:
+            delay = headers.get("Retry-After")
+            if delay is None:
+                try:
+                    delay = json.loads(text).get("retry_after")
+                except ValueError:
+                    delay = None
+            delay = float(delay) if delay is not None else self.backoff_base
+        elif headers.get("X-RateLimit-Remaining") == "0":
+            delay = float(headers.get("X-RateLimit-Reset-After", self.backoff_base))
+        if delay is not None:
+            self.bucket.block(delay)
+
+    def _handle_response(
+        self, status: int, headers: typing.Mapping, text: str
+    ) -> typing.Optional[bool]:
+        """Follows the rate limits of a response and classifies it.
+
+        :return: True if delivered, False if rejected and None to retry
+        """
+        self._update_rate_limit(status, headers, text)
+        if status == 429 or status >= 500:
+            logger.warning("Discord webhook responded with %d", status)
+            return None
+        if status >= 400:
+            logger.error("Discord rejected a message: %d %s", status, text)
+            return False
+        return True
+
+    def _post(self, payload: dict) -> typing.Optional[bool]:
+        """Posts a payload.
+
+        :return: True if delivered, False if rejected and None to retry
+        """
+        self.requests += 1
+        start = time.monotonic()
+        try:
+            resp = self.session.post(self.url, json=payload, timeout=self.timeout)
+        except requests.RequestException as e:
+            logger.warning("Discord webhook request failed. %s", e)
+            return None
+        finally:
+            WRITE_LATENCY.labels("discord").observe(time.monotonic() - start)
+        return self._handle_response(resp.status_code, resp.headers, resp.text)
+
+    @staticmethod
+    def _payload(batch: list) -> dict:
+        return {
+            "content": "\n".join(m.content for m in batch if m.content),
+            "embeds": [embed for m in batch for embed in m.embeds],
+        }
+
+    def _record(self, batch: list, delivered: bool):
+        if delivered:
+            now = time.monotonic()
+            self.delivered += len(batch)
+            self.latencies.extend(now - m.enqueued_at for m in batch)
+            wall_now = time.time()
+            for m in batch:
+                if m.origin is not None:
+                    BLOCK_TO_DISCORD.observe(wall_now - m.origin)
+                m.future.set_result(True)
+        else:
+            WRITE_FAILURES.labels("discord").inc()
+            self.failed += len(batch)
+            for m in batch:
+                m.future.set_exception(DeliveryError("Discord message dropped"))
+
+    def _retry_later(self, attempt: int, batch: list):
+        if attempt < self.max_attempts:
+            WRITE_RETRIES.labels("discord").inc()
+            self.bucket.block(
+                backoff_delay(attempt, self.backoff_base, self.backoff_max)
+            )
+            return
+        logger.error(
+            "Dropping %d Discord messages after %d attempts",
+            len(batch),
+            self.max_attempts,
+        )
+        self._record(batch, False)
+
+    def deliver(self, batch: list, shutdown: threading.Event):
+        """Sends a batch of messages as one webhook message.
+
+        :param batch: Messages to send
+        :type batch: list
+        :param shutdown: Event interrupting the waits
+        :type shutdown: threading.Event
+        """
+        payload = self._payload(batch)
+        for attempt in range(1, self.max_attempts + 1):
+            delay = self.bucket.reserve()
+            if delay > 0 and shutdown.wait(delay):
+                return
+            result = self._post(payload)
+            if result is not None:
+                self._record(batch, result)
+                return
+            self._retry_later(attempt, batch)
+
+    def run(self, shutdown: threading.Event):
+        """Delivers messages until a shutdown is requested.
+
+        :param shutdown: Event stopping the sender
+        :type shutdown: threading.Event
+        """
+        while not shutdown.is_set():
+            try:
+                batch = self._next_batch(timeout=1.0)
+            except queue.Empty:
+                continue
+            self.deliver(batch, shutdown)
+
+    def stats(self) -> dict:
+        """Returns queue depth and delivery statistics.
+
+        :return: dictionary with statistics
+        :rtype: dict
+        """
+        latencies = sorted(self.latencies)
+        return {
+            "queue_depth": self.queue.qsize() + (self._carry is not None),
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "requests": self.requests,
+            "latency_avg": sum(latencies) / len(latencies) if latencies else None,
+            "latency_p95": latencies[int(len(latencies) * 0.95)] if latencies else None,
+        }
+
+
+class DiscordDelivery:
+    """Keeps one sender per webhook URL, all sharing a pooled HTTP session."""
+
+    def __init__(self, limiter: RateLimiter = None, **options):
+        """
+        :param limiter: Rate limiter keeping the token buckets of the webhooks
+        :type limiter: RateLimiter
+        :param options: Options of the WebhookSender
+        """
+        self.limiter = limiter or RateLimiter()
+        self.limiter.set_limit("discord", WEBHOOK_RATE, WEBHOOK_BURST)
+        self.session = requests.Session()
+        self.senders = {}
+        self._options = options
+        self._spawn = None
+        self._shutdown = None
+        self._lock = threading.Lock()
+
+    def start(self, spawn: typing.Callable, shutdown: threading.Event):
+        """Starts the senders. Senders of new webhooks start on their first use.
+
+        :param spawn: Function running a long running function in a thread
+        :param shutdown: Event stopping the senders
+        :type shutdown: threading.Event
+        """
+        with self._lock:
+            self._spawn = spawn
+            self._shutdown = shutdown
+            for sender in self.senders.values():
+                self._start_sender(sender)
+
+    def _start_sender(self, sender: WebhookSender):
+        self._spawn(sender.run, self._shutdown, name="discord-sender")
+
+    def _create_sender(self, url: str) -> WebhookSender:
+        return WebhookSender(
+            url,
+            self.session,
+            bucket=self.limiter.bucket(("discord", url)),
+            **self._options,
+        )
+
+    def sender(self, url: str) -> WebhookSender:
+        """Gets the sender of a webhook.
+
+        :param url: Webhook URL
+        :type url: str
+        :return: sender
+        :rtype: WebhookSender
+        """
+        with self._lock:
+            if url not in self.senders:
+                sender = self._create_sender(url)
+                self.senders[url] = sender
+                if self._spawn is not None:
+                    self._start_sender(sender)
+            return self.senders[url]
+
+    def send(
+        self, url: str, content: str, embeds: list, origin: float = None
+    ) -> Future:
+        """Queues a message for a webhook.
+
+        :param url: Webhook URL
+        :type url: str
+        :param content: Message text
+        :type content: str
+        :param embeds: List of DiscordEmbed objects or embed dictionaries
+        :type embeds: list
+        :param origin: Epoch seconds of the event the message reports
+        :type origin: float
+        :return: future resolved when the message is delivered or dropped
+        :rtype: concurrent.futures.Future
+        """
+        return self.sender(url).enqueue(content, embeds, origin)
+
+    def stats(self) -> dict:
+        """Returns statistics of all senders keyed by an index of the webhook.
+
+        Webhook URLs contain their token, so they are not used as keys.
+
+        :return: dictionary with statistics
+        :rtype: dict
+        """
+        with self._lock:
+            senders = list(self.senders.values())
+        return {f"webhook-{i}": sender.stats() for i, sender in enumerate(senders)}
@@ -0,0 +1,179 @@
+import hashlib
+import json
+import logging
+import typing
+
+import requests
+
+from ratelimit import backoff_delay
+
+logger = logging.getLogger(__name__)
+
+
+class FeedError(Exception):
+    pass
+
+
+class JsonFeed:
+    """Polls a JSON endpoint and passes its payload on only when it changes.
+
+    Requests carry ``If-None-Match`` and ``If-Modified-Since`` validators from
+    the previous response, a hash of the body catches unchanged payloads served
+    without them. :meth:`poll` returns the delay before the next poll, which
+    shrinks while the handler reports new items and grows while the feed is
+    idle or failing.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        session: requests.Session = None,
+        min_interval: float = 180,
+        max_interval: float = 600,
+        backoff_base: float = 10,
+        timeout: float = 30,
+        chunk_size: int = 65536,
+    ):
+        """
+        :param url: URL of the endpoint
+        :type url: str
+        :param session: HTTP session, a new one is kept by the feed if None
+        :type session: requests.Session
+        :param min_interval: Shortest delay between polls
+        :type min_interval: float
+        :param max_interval: Longest delay between polls
+        :type max_interval: float
+        :param backoff_base: Delay after the first failed poll
+        :type backoff_base: float
+        :param timeout: Request timeout in seconds
+        :type timeout: float
+        :param chunk_size: Size of the chunks the body is read in
+        :type chunk_size: int
+        """
+        self.url = url
+        self.session = session or requests.Session()
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff_base = backoff_base
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.interval = min_interval
+        self.failures = 0
+        self.requests = 0
+        self.not_modified = 0
+        self._etag = None
+        self._last_modified = None
+        self._digest = None
+        self._pending = None
+
+    def _request_headers(self) -> dict:
+        headers = {}
+        if self._etag:
+            headers["If-None-Match"] = self._etag
+        if self._last_modified:
+            headers["If-Modified-Since"] = self._last_modified
+        return headers
+
+    def _parse(
+        self, headers: typing.Mapping, digest: bytes, body: bytes
+    ) -> typing.Optional[typing.Any]:
+        validators = (headers.get("ETag"), headers.get("Last-Modified"), digest)
+        if digest == self._digest:
+            self._pending = validators
+            self.accept()
+            self.not_modified += 1
+            return None
+        try:
+            payload = json.loads(body.decode("utf-8"))
+            # utopian.rocks serves some payloads as a JSON encoded string
+            if isinstance(payload, str):
+                payload = json.loads(payload)
+        except ValueError as e:
+            raise FeedError(f"Invalid JSON from {self.url}. {e}") from e
+        self._pending = validators
+        return payload
+
+    def fetch(self) -> typing.Optional[typing.Any]:
+        """Downloads the payload if it changed since the last accepted one.
+
+        :return: parsed payload or None if it didn't change
+        :raises FeedError: if the request fails
+        """
+        self.requests += 1
+        try:
+            with self.session.get(
+                self.url,
+                headers=self._request_headers(),
+                timeout=self.timeout,
+                stream=True,
+            ) as resp:
+                if resp.status_code == 304:
+                    self.not_modified += 1
+                    return None
+                if resp.status_code != 200:
+                    raise FeedError(f"{self.url} responded with {resp.status_code}")
+                digest = hashlib.sha1()
+                body = bytearray()
+                for chunk in resp.iter_content(self.chunk_size):
+                    digest.update(chunk)
+                    body += chunk
+        except requests.RequestException as e:
+            raise FeedError(f"Request to {self.url} failed. {e}") from e
+        return self._parse(resp.headers, digest.digest(), body)
+
+    def accept(self):
+        """Marks the last fetched payload as handled.
+
+        Until then the payload is fetched again by the next :meth:`fetch`.
+        """
+        if self._pending is not None:
+            self._etag, self._last_modified, self._digest = self._pending
+            self._pending = None
+
+    def poll(self, handler: typing.Callable[[typing.Any], int]) -> float:
+        """Fetches the payload and passes it to a handler if it changed.
+
+        :param handler: Function called with the payload, returns the number of
+            new items in it
+        :return: seconds to wait before the next poll
+        :rtype: float
+        """
+        try:
+            payload = self.fetch()
+        except FeedError as e:
+            return self._retry_delay(e)
+        self.failures = 0
+        new = 0
+        if payload is not None:
+            new = handler(payload)
+            self.accept()
+        return self._next_interval(new)
+
+    def _retry_delay(self, error: FeedError) -> float:
+        self.failures += 1
+        delay = self.min_interval + backoff_delay(
+            self.failures, self.backoff_base, self.max_interval
+        )
+        logger.warning("%s Retrying in %.0f s", error, delay)
+        return delay
+
+    def _next_interval(self, new: int) -> float:
+        if new:
+            self.interval = max(self.min_interval, self.interval / 2)
+        else:
+            self.interval = min(self.max_interval, self.interval * 1.5)
+        logger.debug("Next poll of %s in %.0f s", self.url, self.interval)
+        return self.interval
+
+    def stats(self) -> dict:
+        """Returns request counters and the current poll interval.
+
+        :return: dictionary with statistics
+        :rtype: dict
+        """
+        return {
+            "requests": self.requests,
+            "not_modified": self.not_modified,
+            "failures": self.failures,
+            "interval": self.interval,
+        }
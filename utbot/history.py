@@ -0,0 +1,95 @@
+import logging
+import typing
+
+from checkpoint import Checkpoint, StateStore
+from ingest import COMMENT_OP_TYPES, OPS_MATCHED
+from nodepool import NodePool
+
+logger = logging.getLogger(__name__)
+
+HISTORY_METHOD = "condenser_api.get_account_history"
+
+
+class AccountHistoryPoller:
+    """Polls account histories of selected accounts for their new reply comments.
+
+    Every account has its own cursor with the index of the last processed
+    history entry. A poll requests the latest page of all accounts in one batch
+    and pages backwards only for accounts with more new entries than one page.
+    """
+
+    def __init__(
+        self,
+        pool: NodePool,
+        accounts: typing.Iterable[str],
+        store: StateStore,
+        page_size: int = 100,
+    ):
+        """
+        :param pool: Pool of API nodes
+        :type pool: NodePool
+        :param accounts: Accounts to follow
+        :type accounts: list
+        :param store: Store keeping the history cursors
+        :type store: StateStore
+        :param page_size: Number of history entries requested at once
+        :type page_size: int
+        """
+        self.pool = pool
+        self.page_size = page_size
+        self.cursors = {
+            account: Checkpoint(store, f"history:{account}", commit_every=page_size)
+            for account in accounts
+        }
+
+    def _new_entries(self, account: str, page: list) -> list:
+        """Collects entries newer than the cursor, paging backwards if needed."""
+        cursor = self.cursors[account].position
+        entries = [e for e in page if e[0] > cursor]
+        while page and page[0][0] > cursor + 1 and page[0][0] > 0:
+            start = page[0][0] - 1
+            limit = min(self.page_size, start)
+            page = self.pool.batch([(HISTORY_METHOD, [account, start, limit])])[0]
+            entries[:0] = [e for e in page if e[0] > cursor]
+        return entries
+
+    def poll(self, callback: typing.Callable[[dict], typing.Any]) -> int:
+        """Passes new reply comments of the followed accounts to a callback.
+
+        The cursor of an account advances only after the callback returned for
+        all of its new comments. On the first poll of an account the cursor is
+        set to its latest entry without replaying the history.
+
+        :param callback: Function called with every new comment operation
+        :return: Number of new comments
+        :rtype: int
+        """
+        accounts = list(self.cursors)
+        pages = self.pool.batch(
+            [(HISTORY_METHOD, [account, -1, self.page_size]) for account in accounts]
+        )
+        found = 0
+        for account, page in zip(accounts, pages):
+            if not page:
+                continue
+            cursor = self.cursors[account]
+            if cursor.position is None:
+                cursor.advance(page[-1][0])
+                cursor.flush()
+                continue
+            for index, entry in self._new_entries(account, page):
+                op_type, value = entry["op"]
+                if (
+                    op_type in COMMENT_OP_TYPES
+                    and value["author"] == account
+                    and value["parent_author"]
+                ):
+                    op = dict(value, type="comment", block_num=entry["block"])
+                    op["timestamp"] = entry["timestamp"]
+                    op["trx_id"] = entry["trx_id"]
+                    OPS_MATCHED.inc()
+                    callback(op)
+                    found += 1
+                cursor.advance(index)
+            cursor.flush()
+        return found
@@ -0,0 +1,509 @@
+import collections
+import json
+import logging
+import threading
+import time
+import typing
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import REGISTRY
+from nodepool import NodePool
+from rpc import RPCError
+
+logger = logging.getLogger(__name__)
+
+COMMENT_OP_TYPES = frozenset(["comment", "comment_operation"])
+
+BLOCKS_SCANNED = REGISTRY.counter("utbot_blocks_scanned", "Blocks scanned")
+OPS_MATCHED = REGISTRY.counter(
+    "utbot_ops_matched", "Reviewer comments found on the blockchain"
+)
+HEAD_LAG = REGISTRY.gauge(
+    "utbot_head_lag_blocks", "Blocks between the last scanned block and the head"
+)
+
+
+def comment_ops_in_block(
+    block: dict, block_num: int, authors: typing.AbstractSet[str]
+) -> list:
+    """Extracts reply comment operations of selected authors from a raw block.
+
+    Both the appbase (``{"type": ..., "value": ...}``) and the condenser
+    (``[type, value]``) operation formats are accepted.
+
+    :param block: Raw block as returned by the node
+    :type block: dict
+    :param block_num: Number of the block
+    :type block_num: int
+    :param authors: Authors whose comments are kept
+    :type authors: set
+    :return: list of comment operations extended with block info
+    :rtype: list
+    """
+    matched = []
+    timestamp = block.get("timestamp")
+    trx_ids = block.get("transaction_ids") or ()
+    for i, trx in enumerate(block.get("transactions", ())):
+        for op in trx["operations"]:
+            value = reply_value(op, authors)
+            if value is not None:
+                op = dict(value, type="comment", block_num=block_num)
+                op["timestamp"] = timestamp
+                op["trx_id"] = trx_ids[i] if i < len(trx_ids) else None
+                matched.append(op)
+    return matched
+
+
+def reply_value(op, authors: typing.AbstractSet[str]) -> typing.Optional[dict]:
+    """Gets the value of an operation if it is a reply of a selected author.
+
+    :param op: Operation in the appbase or the condenser format
+    :param authors: Authors whose comments are kept
+    :type authors: set
+    :return: value of the comment operation or None
+    :rtype: dict
+    """
+    if isinstance(op, dict):
+        op_type, value = op["type"], op["value"]
+    else:
+        op_type, value = op
+    if (
+        op_type in COMMENT_OP_TYPES
+        and value["author"] in authors
+        and value["parent_author"]
+    ):
+        return value
+    return None
+
+
+def compact_block(block: dict, authors: typing.AbstractSet[str]) -> dict:
+    """Strips a raw block down to the replies of selected authors.
+
+    The result is still a block for :func:`comment_ops_in_block`, small enough
+    to be shared with other replicas.
+
+    :param block: Raw block as returned by the node
+    :type block: dict
+    :param authors: Authors whose comments are kept
+    :type authors: set
+    :return: block with the matching operations only
+    :rtype: dict
+    """
+    transactions = []
+    kept_ids = []
+    trx_ids = block.get("transaction_ids") or ()
+    for i, trx in enumerate(block.get("transactions", ())):
+        ops = [op for op in trx["operations"] if reply_value(op, authors) is not None]
+        if ops:
+            transactions.append({"operations": ops})
+            kept_ids.append(trx_ids[i] if i < len(trx_ids) else None)
+    return {
+        "timestamp": block.get("timestamp"),
+        "transactions": transactions,
+        "transaction_ids": kept_ids,
+    }
+
+
+def range_calls(start: int, count: int) -> list:
+    """Builds the calls requesting consecutive blocks.
+
+    :param start: First block number
+    :type start: int
+    :param count: Number of blocks
+    :type count: int
+    :return: list of ``(method, params)`` tuples
+    :rtype: list
+    """
+    return [
+        ("block_api.get_block", {"block_num": n}) for n in range(start, start + count)
+    ]
+
+
+def range_blocks(start: int, count: int, results: list) -> list:
+    """Pairs the results of :func:`range_calls` with their block numbers.
+
+    :param start: First block number
+    :type start: int
+    :param count: Number of blocks
+    :type count: int
+    :param results: Results of the calls
+    :type results: list
+    :return: list of ``(block_num, block)`` tuples
+    :rtype: list
+    :raises RPCError: if some of the blocks are missing
+    """
+    blocks = [r.get("block") if r else None for r in results]
+    if not all(blocks):
+        raise RPCError(f"Blocks {start}-{start + count - 1} are not available yet")
+    return list(zip(range(start, start + count), blocks))
+
+
+class SharedRanges:
+    """Splits the fetching of old block ranges between replicas.
+
+    A range far enough behind the head is fetched only by the replica owning it
+    on the coordinator's hash ring. The owner publishes it in the lease backend
+    stripped down to the reviewer comments, the other replicas read it from
+    there. A replica fetches a range of another replica itself if it isn't
+    published within ``wait`` seconds, e.g. because its owner is behind or
+    died. Every replica still processes every block, so the task boards stay
+    complete, but a backfill needs only a share of the node requests.
+    """
+
+    def __init__(
+        self,
+        coordinator,
+        authors: typing.AbstractSet[str],
+        lag: int = 1000,
+        wait: float = 30.0,
+        poll_interval: float = 0.05,
+        ttl: float = 600.0,
+    ):
+        """
+        :param coordinator: Coordinator of the replicas
+        :type coordinator: coordination.Coordinator
+        :param authors: Authors whose comments are kept
+        :type authors: set
+        :param lag: Blocks behind the head from which ranges are split
+        :type lag: int
+        :param wait: Seconds to wait for a range of another replica
+        :type wait: float
+        :param poll_interval: Seconds between lookups of a range
+        :type poll_interval: float
+        :param ttl: Seconds a published range is kept
+        :type ttl: float
+        """
+        self.coordinator = coordinator
+        self.authors = frozenset(authors)
+        self.lag = lag
+        self.wait = wait
+        self.poll_interval = poll_interval
+        self.ttl = ttl
+        self.fetched = 0
+        self.received = 0
+        self.missed = 0
+
+    def covers(self, start: int, count: int, head: int) -> bool:
+        """Checks whether a range is split between the replicas.
+
+        :param start: First block number
+        :type start: int
+        :param count: Number of blocks
+        :type count: int
+        :param head: Head block number
+        :type head: int
+        :rtype: bool
+        """
+        return start + count - 1 <= head - self.lag
+
+    def owns(self, start: int) -> bool:
+        """Checks whether this replica fetches a range.
+
+        :param start: First block number of the range
+        :type start: int
+        :rtype: bool
+        """
+        return self.coordinator.owns(f"blocks:{start}")
+
+    def lookup(self, start: int) -> typing.Optional[list]:
+        """Gets a range published by another replica.
+
+        :param start: First block number of the range
+        :type start: int
+        :return: list of ``(block_num, block)`` tuples or None
+        :rtype: list
+        """
+        try:
+            value = self.coordinator.backend.get(f"blocks:{start}")
+        except Exception:
+            logger.exception("Can't read blocks from %d", start)
+            return None
+        if value is None:
+            return None
+        self.received += 1
+        return [tuple(item) for item in json.loads(value)]
+
+    def publish(self, start: int, blocks: list):
+        """Shares a fetched range with the other replicas.
+
+        :param start: First block number of the range
+        :type start: int
+        :param blocks: List of ``(block_num, block)`` tuples
+        :type blocks: list
+        """
+        value = json.dumps([[n, compact_block(b, self.authors)] for n, b in blocks])
+        try:
+            self.coordinator.backend.put(f"blocks:{start}", value, self.ttl)
+        except Exception:
+            logger.exception("Can't share blocks from %d", start)
+
+    def fetch(self, fetch_range: typing.Callable, start: int, count: int) -> list:
+        """Gets a range from its owner or fetches it.
+
+        :param fetch_range: Function fetching the range from the nodes
+        :param start: First block number
+        :type start: int
+        :param count: Number of blocks
+        :type count: int
+        :return: list of ``(block_num, block)`` tuples
+        :rtype: list
+        """
+        if not self.owns(start):
+            deadline = time.monotonic() + self.wait
+            while True:
+                blocks = self.lookup(start)
+                if blocks is not None:
+                    return blocks
+                if time.monotonic() >= deadline:
+                    break
+                time.sleep(self.poll_interval)
+            self.missed += 1
+        blocks = fetch_range(start, count)
+        self.fetched += 1
+        self.publish(start, blocks)
+        return blocks
+
+    def stats(self) -> dict:
+        """Returns the number of fetched, received and missed ranges.
+
+        :return: dictionary with statistics
+        :rtype: dict
+        """
+        return {
+            "fetched": self.fetched,
+            "received": self.received,
+            "missed": self.missed,
+        }
+
+
+class BlockFetcher:
+    """Fetches blocks concurrently from several nodes and yields them in order.
+
+    Consecutive block ranges are requested as JSON-RPC batches by a pool of
+    worker threads. The node pool spreads the ranges over healthy nodes, since
+    requests in flight count against a node's score, and a failed range is
+    retried after a pause. Ranges start at multiples of ``range_size``, so
+    replicas sharing them with :class:`SharedRanges` request the same ones.
+    """
+
+    def __init__(
+        self,
+        pool: NodePool,
+        workers: int = 8,
+        range_size: int = 10,
+        poll_interval: float = 3.0,
+        report_interval: float = 60.0,
+        share: SharedRanges = None,
+    ):
+        """
+        :param pool: Pool of API nodes
+        :type pool: NodePool
+        :param workers: Number of concurrent range requests
+        :type workers: int
+        :param range_size: Number of blocks requested in one batch
+        :type range_size: int
+        :param poll_interval: Seconds to wait for a new head block
+        :type poll_interval: float
+        :param report_interval: Seconds between throughput reports in the log
+        :type report_interval: float
+        :param share: Splits old ranges with other replicas, None to fetch all
+        :type share: SharedRanges
+        """
+        self.pool = pool
+        self.workers = workers
+        self.range_size = range_size
+        self.poll_interval = poll_interval
+        self.report_interval = report_interval
+        self.share = share
+        self.head = None
+        self._limit = threading.BoundedSemaphore(workers)
+        self.last_block = None
+        self.blocks_per_sec = 0.0
+        self._window_start = time.monotonic()
+        self._window_blocks = 0
+
+    def get_head_block_num(self) -> int:
+        """Gets the current head block number.
+
+        :return: head block number
+        :rtype: int
+        """
+        props = self.pool.call("condenser_api.get_dynamic_global_properties")
+        self.head = props["head_block_number"]
+        return self.head
+
+    def fetch_range(self, start: int, count: int) -> list:
+        """Fetches consecutive blocks.
+
+        :param start: First block number
+        :type start: int
+        :param count: Number of blocks
+        :type count: int
+        :return: list of ``(block_num, block)`` tuples
+        :rtype: list
+        :raises RPCError: if the blocks are not available
+        """
+        with self._limit:
+            results = self.pool.batch(range_calls(start, count))
+        return range_blocks(start, count, results)
+
+    @property
+    def window(self) -> int:
+        """Number of ranges requested ahead, more while sharing with replicas."""
+        return self.workers * (2 if self.share is None else 4)
+
+    def fetch(self, start: int, count: int, head: int) -> list:
+        """Fetches consecutive blocks or gets them from the replica owning them.
+
+        :param start: First block number
+        :type start: int
+        :param count: Number of blocks
+        :type count: int
+        :param head: Head block number
+        :type head: int
+        :return: list of ``(block_num, block)`` tuples
+        :rtype: list
+        :raises RPCError: if the blocks are not available
+        """
+        if self._shared(start, count, head):
+            return self.share.fetch(self.fetch_range, start, count)
+        return self.fetch_range(start, count)
+
+    def _shared(self, start: int, count: int, head: int) -> bool:
+        # a replica starting in the middle of a range fetches that one itself
+        return (
+            self.share is not None
+            and count == self.range_size
+            and start % self.range_size == 0
+            and self.share.covers(start, count, head)
+        )
+
+    def range_count(self, start: int, head: int) -> int:
+        """Gets the size of the range starting at a block, up to the head.
+
+        :param start: First block number
+        :type start: int
+        :param head: Head block number
+        :type head: int
+        :return: number of blocks
+        :rtype: int
+        """
+        return min(self.range_size - start % self.range_size, head - start + 1)
+
+    @property
+    def head_lag(self) -> typing.Optional[int]:
+        """Number of blocks between the last yielded block and the head."""
+        if self.head is None or self.last_block is None:
+            return None
+        return max(self.head - self.last_block, 0)
+
+    def stats(self) -> dict:
+        """Returns throughput statistics of the fetcher.
+
+        :return: dictionary with blocks per second, head block and head lag
+        :rtype: dict
+        """
+        stats = {
+            "blocks_per_sec": self.blocks_per_sec,
+            "head": self.head,
+            "last_block": self.last_block,
+            "head_lag": self.head_lag,
+        }
+        if self.share is not None:
+            stats["shared_ranges"] = self.share.stats()
+        return stats
+
+    def blocks(self, start: int) -> typing.Iterator[tuple]:
+        """Yields blocks in order starting at a block number, following the head.
+
+        :param start: First block number
+        :type start: int
+        :return: iterator of ``(block_num, block)`` tuples
+        """
+        pending = collections.deque()
+        next_num = start
+        head = self.get_head_block_num()
+        window = self.window
+        # ranges waiting for another replica don't hold up the requests
+        with ThreadPoolExecutor(
+            max_workers=window, thread_name_prefix="block-fetcher"
+        ) as executor:
+            while True:
+                while len(pending) < window and next_num <= head:
+                    count = self.range_count(next_num, head)
+                    future = executor.submit(self.fetch, next_num, count, head)
+                    pending.append((next_num, count, future))
+                    next_num += count
+                if not pending:
+                    time.sleep(self.poll_interval)
+                    head = self._refresh_head(head)
+                    continue
+                range_start, count, future = pending[0]
+                try:
+                    blocks = future.result()
+                except RPCError:
+                    logger.exception(
+                        "Blocks %d-%d unavailable", range_start, range_start + count - 1
+                    )
+                    time.sleep(self.poll_interval)
+                    future = executor.submit(self.fetch, range_start, count, head)
+                    pending[0] = (range_start, count, future)
+                    continue
+                pending.popleft()
+                for block_num, block in blocks:
+                    self.last_block = block_num
+                    yield block_num, block
+                self._record(len(blocks))
+                if next_num > head and len(pending) < self.workers:
+                    head = self._refresh_head(head)
+
+    def _refresh_head(self, head: int) -> int:
+        try:
+            return self.get_head_block_num()
+        except RPCError:
+            return head
+
+    def _record(self, count: int):
+        BLOCKS_SCANNED.inc(count)
+        if self.head_lag is not None:
+            HEAD_LAG.set(self.head_lag)
+        self._window_blocks += count
+        elapsed = time.monotonic() - self._window_start
+        if elapsed < self.report_interval:
+            return
+        self.blocks_per_sec = self._window_blocks / elapsed
+        self._window_start = time.monotonic()
+        self._window_blocks = 0
+        logger.info(
+            "Ingesting %.1f blocks/s, at block %s, head lag %s blocks",
+            self.blocks_per_sec,
+            self.last_block,
+            self.head_lag,
+        )
+
+
+def iter_comment_ops(
+    fetcher: BlockFetcher,
+    start: int,
+    authors: typing.AbstractSet[str],
+    checkpoint=None,
+) -> typing.Iterator[dict]:
+    """Yields reply comments of selected authors from consecutive blocks.
+
+    :param fetcher: Block fetcher
+    :type fetcher: BlockFetcher
+    :param start: First block number
+    :type start: int
+    :param authors: Authors whose comments are kept
+    :type authors: set
+    :param checkpoint: Checkpoint advanced after every fully processed block
+    :type checkpoint: checkpoint.Checkpoint
+    """
+    authors = frozenset(authors)
+    for block_num, block in fetcher.blocks(start):
+        comment_ops = comment_ops_in_block(block, block_num, authors)
+        if comment_ops:
+            OPS_MATCHED.inc(len(comment_ops))
+            yield from comment_ops
+        if checkpoint is not None:
+            checkpoint.advance(block_num)
@@ -0,0 +1,406 @@
+import bisect
+import json
+import logging
+import math
+import threading
+import typing
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qsl, urlsplit
+
+logger = logging.getLogger(__name__)
+
+# seconds, from fast RPC reads to slow Steem writes
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# seconds an item spends in the pipeline, command windows and rate limits included
+PIPELINE_BUCKETS = (1, 3, 6, 10, 20, 30, 60, 120, 300, 600, 1800, 3600)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if isinstance(value, int) or value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: typing.Sequence[tuple]) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels)
+    return "{" + pairs + "}"
+
+
+class _CounterValue:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def samples(self):
+        yield "_total", (), self.value
+
+
+class _GaugeValue:
+    __slots__ = ("value", "function", "_lock")
+
+    def __init__(self):
+        self.value = 0
+        self.function = None
+        self._lock = threading.Lock()
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.inc(-amount)
+
+    def set_function(self, function: typing.Callable[[], float]):
+        self.function = function
+
+    def samples(self):
+        value = self.value
+        if self.function is not None:
+            try:
+                value = self.function()
+            except Exception:
+                logger.exception("Gauge function failed")
+                return
+            if value is None:
+                return
+        yield "", (), value
+
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    def samples(self):
+        with self._lock:
+            counts = list(self.counts)
+            total = self.sum
+        cumulative = 0
+        for bound, count in zip(self.bounds + (math.inf,), counts):
+            cumulative += count
+            yield "_bucket", (("le", _format_value(bound)),), cumulative
+        yield "_count", (), cumulative
+        yield "_sum", (), total
+
+
+class Metric:
+    """Metric with optional labels, every label combination has its own value."""
+
+    kind = None
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: typing.Sequence[str] = ()
+    ):
+        """
+        :param name: Name of the metric
+        :type name: str
+        :param documentation: Help text of the metric
+        :type documentation: str
+        :param labelnames: Names of the labels
+        :type labelnames: list
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        # value of a metric without labels, updated without a lookup
+        self._value = None
+        if not self.labelnames:
+            self._value = self._children[()] = self._new_value()
+
+    def _new_value(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        """Gets the value of a label combination.
+
+        The result can be kept by the caller to skip the lookup on a hot path.
+
+        :param values: Label values in the order of the label names
+        :return: value with the methods of the metric
+        """
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_value())
+        return child
+
+    def collect(self) -> typing.Iterator[str]:
+        """Yields the lines of the metric in the Prometheus text format."""
+        yield f"# HELP {self.name} {_escape(self.documentation)}"
+        yield f"# TYPE {self.name} {self.kind}"
+        with self._lock:
+            children = list(self._children.items())
+        for values, child in children:
+            labels = tuple(zip(self.labelnames, values))
+            for suffix, extra, value in child.samples():
+                yield (
+                    f"{self.name}{suffix}{_format_labels(labels + extra)} "
+                    f"{_format_value(value)}"
+                )
+
+
+class Counter(Metric):
+    """Monotonically increasing count, e.g. of processed blocks."""
+
+    kind = "counter"
+
+    def _new_value(self):
+        return _CounterValue()
+
+    def inc(self, amount: float = 1):
+        self._value.inc(amount)
+
+
+class Gauge(Metric):
+    """Value that goes up and down, e.g. a queue depth.
+
+    A gauge may read its value from a function when it is collected, which
+    keeps the instrumented code free of any bookkeeping.
+    """
+
+    kind = "gauge"
+
+    def _new_value(self):
+        return _GaugeValue()
+
+    def set(self, value: float):
+        self._value.set(value)
+
+    def inc(self, amount: float = 1):
+        self._value.inc(amount)
+
+    def dec(self, amount: float = 1):
+        self._value.dec(amount)
+
+    def set_function(self, function: typing.Callable[[], float]):
+        self._value.set_function(function)
+
+
+class Histogram(Metric):
+    """Distribution of observed values in fixed buckets, e.g. latencies."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: typing.Sequence[str] = (),
+        buckets: typing.Sequence[float] = LATENCY_BUCKETS,
+    ):
+        """
+        :param name: Name of the metric
+        :type name: str
+        :param documentation: Help text of the metric
+        :type documentation: str
+        :param labelnames: Names of the labels
+        :type labelnames: list
+        :param buckets: Upper bounds of the buckets, +Inf is added
+        :type buckets: list
+        """
+        self.buckets = tuple(sorted(float(b) for b in buckets if not math.isinf(b)))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_value(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self._value.observe(value)
+
+
+class Registry:
+    """Collection of metrics rendered together."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        """Adds a metric.
+
+        :param metric: Metric
+        :type metric: Metric
+        :return: the metric
+        :rtype: Metric
+        :raises ValueError: if a metric with the same name exists
+        """
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(
+        self, name: str, documentation: str, labelnames: typing.Sequence[str] = ()
+    ) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(
+        self, name: str, documentation: str, labelnames: typing.Sequence[str] = ()
+    ) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: typing.Sequence[str] = (),
+        buckets: typing.Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """Renders all metrics in the Prometheus text format.
+
+        :return: exposition text
+        :rtype: str
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+# metrics of the bot's modules
+REGISTRY = Registry()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path in self.server.queries:
+            self._query(self.server.queries[url.path], dict(parse_qsl(url.query)))
+            return
+        if url.path not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.server.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _query(self, query: typing.Callable[[dict], typing.Any], params: dict):
+        try:
+            body = json.dumps(query(params)).encode("utf-8")
+        except KeyError:
+            self.send_error(404)
+            return
+        except ValueError as e:
+            self.send_error(400, str(e))
+            return
+        except Exception as e:
+            logger.exception("Query %s failed", self.path)
+            self.send_error(500, str(e))
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        action = self.server.actions.get(self.path.split("?", 1)[0])
+        if action is None:
+            self.send_error(404)
+            return
+        try:
+            body = str(action()).encode("utf-8")
+        except Exception as e:
+            logger.exception("Admin action %s failed", self.path)
+            self.send_error(500, str(e))
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("%s %s", self.address_string(), format % args)
+
+
+class MetricsServer(ThreadingMixIn, HTTPServer):
+    """HTTP server exposing a registry at ``/metrics`` for Prometheus.
+
+    Admin actions, e.g. starting the profiler, can be added as POST endpoints
+    and read-only JSON queries as GET endpoints. The server should listen only
+    on a local address.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address: tuple, registry: Registry = REGISTRY):
+        """
+        :param address: ``(host, port)`` to listen on
+        :type address: tuple
+        :param registry: Registry of the exposed metrics
+        :type registry: Registry
+        """
+        super().__init__(address, _MetricsHandler)
+        self.registry = registry
+        self.actions = {}
+        self.queries = {}
+
+    def add_action(self, path: str, action: typing.Callable[[], typing.Any]):
+        """Adds a POST endpoint calling a function.
+
+        :param path: Path of the endpoint, e.g. ``/debug/profile/start``
+        :type path: str
+        :param action: Function called without arguments, its result is sent
+            back as text
+        """
+        self.actions[path] = action
+
+    def add_query(self, path: str, query: typing.Callable[[dict], typing.Any]):
+        """Adds a GET endpoint answering with JSON.
+
+        :param path: Path of the endpoint, e.g. ``/tasks``
+        :type path: str
+        :param query: Function called with the query string parameters, its
+            result is sent back as JSON; KeyError is answered with 404 and
+            ValueError with 400
+        """
+        self.queries[path] = query
+
+    def stop(self):
+        """Stops serving and closes the socket."""
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,334 @@
+import collections
+import functools
+import logging
+import threading
+import time
+import typing
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from metrics import REGISTRY
+from rpc import JsonRpcClient, RPCError
+
+logger = logging.getLogger(__name__)
+
+BLOCK_INTERVAL = 3.0
+
+NODE_LATENCY_P95 = REGISTRY.gauge(
+    "utbot_node_latency_p95_seconds", "95th percentile of recent latencies", ["node"]
+)
+NODE_ERROR_RATE = REGISTRY.gauge(
+    "utbot_node_error_rate", "Smoothed share of failed requests", ["node"]
+)
+NODE_HEAD_LAG = REGISTRY.gauge(
+    "utbot_node_head_lag_blocks", "Blocks behind the freshest node", ["node"]
+)
+HEDGED_REQUESTS = REGISTRY.counter(
+    "utbot_hedged_requests", "Requests sent to a second node", ["node"]
+)
+
+
+class NodeStats:
+    """Health statistics of a single API node."""
+
+    __slots__ = (
+        "url",
+        "latencies",
+        "latency",
+        "error_rate",
+        "head_block",
+        "requests",
+        "errors",
+        "inflight",
+        "consecutive_errors",
+        "cooldown_until",
+    )
+
+    def __init__(self, url: str, window: int = 100):
+        self.url = url
+        self.latencies = collections.deque(maxlen=window)
+        self.latency = None
+        self.error_rate = 0.0
+        self.head_block = None
+        self.requests = 0
+        self.errors = 0
+        self.inflight = 0
+        self.consecutive_errors = 0
+        self.cooldown_until = 0.0
+
+    def record_success(self, latency: float, alpha: float = 0.2):
+        self.requests += 1
+        self.consecutive_errors = 0
+        self.latencies.append(latency)
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += alpha * (latency - self.latency)
+        self.error_rate -= alpha * self.error_rate
+
+    def record_error(self, cooldown: float, alpha: float = 0.2):
+        self.requests += 1
+        self.errors += 1
+        self.consecutive_errors += 1
+        self.error_rate += alpha * (1 - self.error_rate)
+        if self.consecutive_errors >= 3:
+            self.cooldown_until = time.monotonic() + cooldown
+
+    def p95(self) -> typing.Optional[float]:
+        """95th percentile of recent latencies or None without samples."""
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)]
+
+    def to_dict(self) -> dict:
+        return {
+            "latency": self.latency,
+            "p95": self.p95(),
+            "error_rate": self.error_rate,
+            "head_block": self.head_block,
+            "requests": self.requests,
+            "errors": self.errors,
+            "inflight": self.inflight,
+        }
+
+
+class NodePool:
+    """Sends read requests to the healthiest API node and hedges slow ones.
+
+    Nodes are ranked by their smoothed latency, error rate, number of requests
+    in flight and by how many blocks their head lags behind the freshest node.
+    When the chosen node doesn't answer within its p95 latency, the same request
+    is sent to the next node and the first successful answer wins. A request
+    that fails on both falls over to the remaining nodes.
+    """
+
+    def __init__(
+        self,
+        nodes: typing.Sequence[str],
+        timeout: float = 15,
+        hedge_min: float = 0.25,
+        hedge_max: float = 5.0,
+        cooldown: float = 30.0,
+        workers: int = 16,
+        client_factory: typing.Callable = JsonRpcClient,
+    ):
+        """
+        :param nodes: URLs of the API nodes
+        :type nodes: list
+        :param timeout: Request timeout in seconds
+        :type timeout: float
+        :param hedge_min: Minimum seconds before a request is hedged
+        :type hedge_min: float
+        :param hedge_max: Maximum seconds before a request is hedged
+        :type hedge_max: float
+        :param cooldown: Seconds a node failing repeatedly is avoided
+        :type cooldown: float
+        :param workers: Number of threads executing requests
+        :type workers: int
+        :param client_factory: Function creating a client for a node URL and
+            a timeout
+        """
+        if not nodes:
+            raise ValueError("At least one node is required")
+        self.nodes = {url: NodeStats(url) for url in nodes}
+        self.timeout = timeout
+        self.hedge_min = hedge_min
+        self.hedge_max = hedge_max
+        self.cooldown = cooldown
+        self.hedged = 0
+        self._client_factory = client_factory
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="node-pool"
+        )
+        for node in self.nodes.values():
+            NODE_LATENCY_P95.labels(node.url).set_function(
+                functools.partial(self._locked, node.p95)
+            )
+            NODE_ERROR_RATE.labels(node.url).set_function(
+                functools.partial(getattr, node, "error_rate")
+            )
+            NODE_HEAD_LAG.labels(node.url).set_function(
+                functools.partial(self.head_lag, node)
+            )
+
+    def _locked(self, function: typing.Callable):
+        with self._lock:
+            return function()
+
+    def _client(self, url: str):
+        clients = getattr(self._local, "clients", None)
+        if clients is None:
+            clients = self._local.clients = {}
+        if url not in clients:
+            clients[url] = self._client_factory(url, self.timeout)
+        return clients[url]
+
+    def _score(self, node: NodeStats, best_head: int, now: float) -> float:
+        latency = node.latency if node.latency is not None else self.hedge_min
+        score = latency * (1 + node.inflight) * (1 + 10 * node.error_rate)
+        if best_head is not None and node.head_block is not None:
+            score += (best_head - node.head_block) * BLOCK_INTERVAL
+        if node.cooldown_until > now:
+            score += self.timeout
+        return score
+
+    def ranked(self) -> typing.List[NodeStats]:
+        """Returns nodes ordered from the healthiest one.
+
+        :return: list of node statistics
+        :rtype: list
+        """
+        now = time.monotonic()
+        with self._lock:
+            heads = [n.head_block for n in self.nodes.values() if n.head_block]
+            best_head = max(heads) if heads else None
+            return sorted(
+                self.nodes.values(), key=lambda n: self._score(n, best_head, now)
+            )
+
+    def head_lag(self, node: NodeStats) -> typing.Optional[int]:
+        """Number of blocks the head of a node lags behind the freshest node.
+
+        :param node: Node
+        :type node: NodeStats
+        :return: blocks or None before the node was probed
+        :rtype: int
+        """
+        with self._lock:
+            heads = [n.head_block for n in self.nodes.values() if n.head_block]
+            if node.head_block is None or not heads:
+                return None
+            return max(heads) - node.head_block
+
+    def hedge(self, node: NodeStats):
+        """Counts a request to a node that was sent to the next node as well.
+
+        :param node: Node that didn't answer in time
+        :type node: NodeStats
+        """
+        self.hedged += 1
+        HEDGED_REQUESTS.labels(node.url).inc()
+
+    def begin_request(self, node: NodeStats):
+        """Counts a request sent to a node as in flight.
+
+        :param node: Node the request is sent to
+        :type node: NodeStats
+        """
+        with self._lock:
+            node.inflight += 1
+
+    def end_request(self, node: NodeStats, latency: typing.Optional[float]):
+        """Records the outcome of a request started by :meth:`begin_request`.
+
+        :param node: Node the request was sent to
+        :type node: NodeStats
+        :param latency: Seconds the request took or None if it failed
+        :type latency: float
+        """
+        with self._lock:
+            node.inflight -= 1
+            if latency is None:
+                node.record_error(self.cooldown)
+            else:
+                node.record_success(latency)
+
+    def _attempt(self, node: NodeStats, calls: list) -> list:
+        self.begin_request(node)
+        start = time.monotonic()
+        try:
+            results = self._client(node.url).batch(calls)
+        except RPCError:
+            self.end_request(node, None)
+            raise
+        self.end_request(node, time.monotonic() - start)
+        return results
+
+    def hedge_delay(self, node: NodeStats) -> float:
+        """Seconds to wait for a node before the request is hedged.
+
+        :param node: Node the request was sent to
+        :type node: NodeStats
+        :return: seconds
+        :rtype: float
+        """
+        with self._lock:
+            p95 = node.p95()
+        if p95 is None:
+            return self.hedge_max
+        return min(max(p95, self.hedge_min), self.hedge_max)
+
+    def batch(self, calls: typing.Sequence[tuple]) -> list:
+        """Sends several calls in one request to the healthiest node.
+
+        :param calls: Sequence of ``(method, params)`` tuples
+        :type calls: list
+        :return: Results in the order of the calls
+        :rtype: list
+        :raises RPCError: if all nodes fail
+        """
+        calls = list(calls)
+        ranked = self.ranked()
+        futures = {self._executor.submit(self._attempt, ranked[0], calls): ranked[0]}
+        done, _ = wait(futures, timeout=self.hedge_delay(ranked[0]))
+        if not done and len(ranked) > 1:
+            self.hedge(ranked[0])
+            futures[self._executor.submit(self._attempt, ranked[1], calls)] = ranked[1]
+        last_error = None
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    return future.result()
+                except RPCError as e:
+                    logger.warning("Request to %s failed. %s", futures[future].url, e)
+                    last_error = e
+        for node in ranked[len(futures) :]:
+            try:
+                return self._attempt(node, calls)
+            except RPCError as e:
+                logger.warning("Request to %s failed. %s", node.url, e)
+                last_error = e
+        raise last_error
+
+    def call(self, method: str, params: typing.Any = None) -> typing.Any:
+        """Calls a single API method on the healthiest node.
+
+        :param method: Full method name, e.g. ``condenser_api.get_content``
+        :type method: str
+        :param params: Method parameters
+        :return: Result of the call
+        :raises RPCError: if all nodes fail
+        """
+        return self.batch([(method, params)])[0]
+
+    def probe(self):
+        """Updates latency and head block of every node."""
+        futures = {
+            self._executor.submit(
+                self._attempt,
+                node,
+                [("condenser_api.get_dynamic_global_properties", None)],
+            ): node
+            for node in self.nodes.values()
+        }
+        for future, node in futures.items():
+            try:
+                props = future.result()[0]
+            except RPCError as e:
+                logger.warning("Node %s is unavailable. %s", node.url, e)
+                continue
+            with self._lock:
+                node.head_block = props["head_block_number"]
+
+    def stats(self) -> dict:
+        """Returns statistics of all nodes keyed by their URL.
+
+        :return: dictionary with node statistics
+        :rtype: dict
+        """
+        with self._lock:
+            return {url: node.to_dict() for url, node in self.nodes.items()}
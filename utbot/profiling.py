@@ -0,0 +1,470 @@
+import collections
+import logging
+import os
+import re
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+import typing
+
+logger = logging.getLogger(__name__)
+
+# stage of the bot's modules
+MODULE_STAGES = {
+    "ingest": "ingest",
+    "nodepool": "ingest",
+    "rpc": "ingest",
+    "history": "ingest",
+    "checkpoint": "ingest",
+    "content": "ingest",
+    "cache": "ingest",
+    "feed": "ingest",
+    "dedup": "ingest",
+    "commands": "parse",
+    "records": "parse",
+    "coalesce": "write",
+    "taskboard": "write",
+    "render": "render",
+    "delivery": "deliver",
+    "ratelimit": "deliver",
+}
+# stage of functions in modules serving several stages
+FUNCTION_STAGES = {
+    ("utbot", "listen_blockchain_comments"): "ingest",
+    ("utbot", "listen_blockchain_comments_async"): "ingest",
+    ("utbot", "enqueue_comment_op"): "ingest",
+    ("utbot", "poll_reviewer_histories"): "ingest",
+    ("utbot", "put_contributions_to_queue"): "ingest",
+    ("utbot", "process_cmd_comments"): "parse",
+    ("utbot", "update_task"): "write",
+    ("utbot", "send_summary_to_steem"): "deliver",
+    ("utbot", "reply_to_comment"): "deliver",
+    ("utbot", "send_message_to_discord"): "deliver",
+}
+# innermost functions of a thread waiting for work
+IDLE_FUNCTIONS = frozenset(["wait", "select", "poll", "get", "_worker", "accept"])
+
+_THREAD_SUFFIX_RE = re.compile(r"[-_]\d+$")
+# tracebacks list the most recent frame first before Python 3.7
+_TRACEBACK_OLDEST_FIRST = sys.version_info >= (3, 7)
+
+
+def _module(filename: str) -> str:
+    return os.path.splitext(os.path.basename(filename))[0]
+
+
+def code_stage(filename: str, name: str) -> typing.Optional[str]:
+    """Gets the pipeline stage of a function.
+
+    :param filename: File the function is defined in
+    :type filename: str
+    :param name: Name of the function
+    :type name: str
+    :return: stage or None if the function doesn't belong to one
+    :rtype: str
+    """
+    module = _module(filename)
+    return FUNCTION_STAGES.get((module, name)) or MODULE_STAGES.get(module)
+
+
+def stack_stage(stack: typing.Sequence[tuple]) -> str:
+    """Attributes a stack to the stage of its innermost function with a stage.
+
+    :param stack: ``(filename, name)`` pairs from the outermost frame
+    :type stack: list
+    :return: stage, ``idle`` for threads waiting for work or ``other``
+    :rtype: str
+    """
+    for filename, name in reversed(stack):
+        stage = code_stage(filename, name)
+        if stage is not None:
+            return stage
+    if stack and stack[-1][1] in IDLE_FUNCTIONS:
+        return "idle"
+    return "other"
+
+
+def _timestamp() -> str:
+    return time.strftime("%Y%m%d-%H%M%S")
+
+
+class SamplingProfiler:
+    """Samples the stacks of all threads at a fixed interval.
+
+    Unlike cProfile, which sees only the thread that enabled it, the sampler
+    reads the current frame of every thread, so the worker and scheduler
+    threads are profiled without restarting them. Stacks are counted by thread
+    name, the samples show where the wall clock time goes.
+    """
+
+    def __init__(self, interval: float = 0.01):
+        """
+        :param interval: Seconds between samples
+        :type interval: float
+        """
+        self.interval = interval
+        self.samples = 0
+        self.started_at = None
+        self.stopped_at = None
+        self._stacks = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Starts sampling in a daemon thread."""
+        if self.running:
+            return
+        self._stacks.clear()
+        self.samples = 0
+        self.started_at = time.monotonic()
+        self.stopped_at = None
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="profiler")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stops sampling and waits for the sampling thread."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.stopped_at = time.monotonic()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                codes = []
+                while frame is not None:
+                    codes.append(frame.f_code)
+                    frame = frame.f_back
+                codes.reverse()
+                name = _THREAD_SUFFIX_RE.sub("", names.get(ident, str(ident)))
+                self._stacks[name, tuple(codes)] += 1
+            self.samples += 1
+
+    def stacks(self) -> typing.List[tuple]:
+        """Returns the sampled stacks.
+
+        :return: list of ``(thread, stack, count)`` tuples, the stack is a tuple
+            of ``(filename, name)`` pairs from the outermost frame
+        :rtype: list
+        """
+        return [
+            (thread, tuple((c.co_filename, c.co_name) for c in codes), count)
+            for (thread, codes), count in self._stacks.items()
+        ]
+
+    def report(self, top: int = 30) -> str:
+        """Summarizes the samples by stage, thread and function.
+
+        :param top: Number of functions listed
+        :type top: int
+        :return: text report
+        :rtype: str
+        """
+        stacks = self.stacks()
+        total = sum(count for _, _, count in stacks) or 1
+        end = self.stopped_at or time.monotonic()
+        stages = collections.Counter()
+        threads = collections.Counter()
+        own = collections.Counter()
+        cumulative = collections.Counter()
+        for thread, stack, count in stacks:
+            stages[stack_stage(stack)] += count
+            threads[thread] += count
+            if stack:
+                own[stack[-1]] += count
+            for frame in set(stack):
+                cumulative[frame] += count
+        lines = [
+            f"Sampled {self.samples} times every {self.interval * 1000:.0f} ms "
+            f"for {end - (self.started_at or end):.1f} s, {total} thread samples",
+            "",
+            "Stage",
+        ]
+        lines.extend(
+            f"  {stage:<12}{count:>8}{count / total:>8.1%}"
+            for stage, count in stages.most_common()
+        )
+        lines += ["", "Thread"]
+        lines.extend(
+            f"  {thread:<32}{count:>8}{count / total:>8.1%}"
+            for thread, count in threads.most_common()
+        )
+        for title, counter in (("Own", own), ("Cumulative", cumulative)):
+            lines += ["", f"{title} samples of busy functions"]
+            listed = 0
+            for (filename, name), count in counter.most_common():
+                if name in IDLE_FUNCTIONS and title == "Own":
+                    continue
+                stage = code_stage(filename, name) or ""
+                lines.append(
+                    f"  {count:>8}{count / total:>8.1%}  {stage:<8}"
+                    f"{_module(filename)}.{name}"
+                )
+                listed += 1
+                if listed >= top:
+                    break
+        return "\n".join(lines) + "\n"
+
+    def collapsed(self) -> str:
+        """Formats the samples as collapsed stacks for flame graph tools.
+
+        :return: one ``thread;module.function;... count`` line per stack
+        :rtype: str
+        """
+        lines = []
+        for thread, stack, count in self.stacks():
+            frames = [thread] + [f"{_module(f)}.{name}" for f, name in stack]
+            lines.append(f"{';'.join(frames)} {count}")
+        return "\n".join(sorted(lines)) + "\n"
+
+
+class MemoryTracker:
+    """Takes tracemalloc snapshots and compares them with a baseline.
+
+    Tracing starts with the first snapshot, which becomes the baseline. Later
+    snapshots are reported as the growth since the baseline, attributed to
+    the stages by the innermost frame of the allocation with a stage.
+    """
+
+    def __init__(self, frames: int = 10):
+        """
+        :param frames: Number of frames stored per allocation
+        :type frames: int
+        """
+        self.frames = frames
+        self.baseline = None
+
+    @staticmethod
+    def _take() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(
+            (
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+                tracemalloc.Filter(False, "<unknown>"),
+            )
+        )
+
+    @staticmethod
+    def _stages(snapshot: tracemalloc.Snapshot) -> collections.Counter:
+        sizes = collections.Counter()
+        for stat in snapshot.statistics("traceback"):
+            stack = [(frame.filename, "") for frame in stat.traceback]
+            if not _TRACEBACK_OLDEST_FIRST:
+                stack.reverse()
+            sizes[stack_stage(stack)] += stat.size
+        return sizes
+
+    def snapshot(self, top: int = 30) -> str:
+        """Takes a snapshot and reports it.
+
+        :param top: Number of allocation sites listed
+        :type top: int
+        :return: text report
+        :rtype: str
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self.baseline = None
+        snapshot = self._take()
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [
+            f"Traced memory {current / 2 ** 20:.1f} MiB, "
+            f"peak {peak / 2 ** 20:.1f} MiB",
+            "",
+        ]
+        if self.baseline is None:
+            self.baseline = snapshot
+            lines.append("Baseline taken, later snapshots are compared with it")
+            lines += ["", "Stage"]
+            for stage, size in self._stages(snapshot).most_common():
+                lines.append(f"  {stage:<12}{size / 1024:>12.1f} KiB")
+            lines += ["", "Largest allocation sites"]
+            for stat in snapshot.statistics("lineno")[:top]:
+                lines.append(f"  {stat}")
+            return "\n".join(lines) + "\n"
+        before = self._stages(self.baseline)
+        after = self._stages(snapshot)
+        lines += ["Stage growth since the baseline"]
+        for stage in sorted(set(before) | set(after)):
+            diff = after[stage] - before[stage]
+            lines.append(
+                f"  {stage:<12}{diff / 1024:>+12.1f} KiB"
+                f"{after[stage] / 1024:>12.1f} KiB"
+            )
+        lines += ["", "Largest growth by allocation site"]
+        for stat in snapshot.compare_to(self.baseline, "lineno")[:top]:
+            lines.append(f"  {stat}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        """Drops the baseline, the next snapshot becomes the new one."""
+        self.baseline = None
+
+    def stop(self):
+        """Stops tracing and frees the snapshots."""
+        self.baseline = None
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+class Profiling:
+    """Controls the profiler and memory snapshots of the running bot.
+
+    Actions can be triggered by signals or through the admin endpoints of the
+    metrics server, reports are written to a directory.
+    """
+
+    def __init__(
+        self, report_dir: str, interval: float = 0.01, frames: int = 10, top: int = 30
+    ):
+        """
+        :param report_dir: Directory the reports are written to
+        :type report_dir: str
+        :param interval: Seconds between profiler samples
+        :type interval: float
+        :param frames: Number of frames stored per traced allocation
+        :type frames: int
+        :param top: Number of functions and allocation sites in reports
+        :type top: int
+        """
+        self.report_dir = report_dir
+        self.top = top
+        self.profiler = SamplingProfiler(interval)
+        self.memory = MemoryTracker(frames)
+        self._lock = threading.Lock()
+
+    def _write(self, name: str, text: str) -> str:
+        os.makedirs(self.report_dir, exist_ok=True)
+        path = os.path.join(self.report_dir, name)
+        with open(path, "w") as f:
+            f.write(text)
+        return path
+
+    def start_profile(self) -> str:
+        """Starts the sampling profiler.
+
+        :return: status message
+        :rtype: str
+        """
+        with self._lock:
+            if self.profiler.running:
+                return "Profiler is already running"
+            self.profiler.start()
+        logger.info("Profiler started")
+        return "Profiler started"
+
+    def stop_profile(self) -> str:
+        """Stops the sampling profiler and writes its reports.
+
+        :return: status message with the report path
+        :rtype: str
+        """
+        with self._lock:
+            if not self.profiler.running:
+                return "Profiler is not running"
+            self.profiler.stop()
+            name = f"profile-{_timestamp()}"
+            path = self._write(f"{name}.txt", self.profiler.report(self.top))
+            self._write(f"{name}.collapsed", self.profiler.collapsed())
+        logger.info("Profile written to %s", path)
+        return f"Profile written to {path}"
+
+    def toggle_profile(self) -> str:
+        """Starts the profiler or stops it if it runs.
+
+        :return: status message
+        :rtype: str
+        """
+        if self.profiler.running:
+            return self.stop_profile()
+        return self.start_profile()
+
+    def memory_snapshot(self) -> str:
+        """Takes a memory snapshot and writes its report.
+
+        :return: status message with the report path
+        :rtype: str
+        """
+        with self._lock:
+            report = self.memory.snapshot(self.top)
+            path = self._write(f"memory-{_timestamp()}.txt", report)
+        logger.info("Memory report written to %s", path)
+        return f"Memory report written to {path}"
+
+    def memory_reset(self) -> str:
+        """Drops the memory baseline.
+
+        :return: status message
+        :rtype: str
+        """
+        with self._lock:
+            self.memory.reset()
+        return "Memory baseline dropped"
+
+    def memory_stop(self) -> str:
+        """Stops tracing allocations.
+
+        :return: status message
+        :rtype: str
+        """
+        with self._lock:
+            self.memory.stop()
+        return "Memory tracing stopped"
+
+    def install_signals(self):
+        """Toggles the profiler on SIGUSR1 and takes a memory snapshot on SIGUSR2.
+
+        Must be called from the main thread. Does nothing on platforms without
+        these signals.
+        """
+        if not hasattr(signal, "SIGUSR1"):
+            return
+        signal.signal(
+            signal.SIGUSR1,
+            lambda signum, frame: self._guard_signal(self.toggle_profile),
+        )
+        signal.signal(
+            signal.SIGUSR2,
+            lambda signum, frame: self._guard_signal(self.memory_snapshot),
+        )
+
+    @staticmethod
+    def _guard_signal(func: typing.Callable[[], str]):
+        # signal handlers run in the main thread, an exception would stop it
+        try:
+            func()
+        except Exception:
+            logger.exception("Profiling action %s failed", func.__name__)
+
+    def add_actions(self, server):
+        """Adds the profiling endpoints to the metrics server.
+
+        :param server: Metrics server
+        :type server: metrics.MetricsServer
+        """
+        server.add_action("/debug/profile/start", self.start_profile)
+        server.add_action("/debug/profile/stop", self.stop_profile)
+        server.add_action("/debug/memory/snapshot", self.memory_snapshot)
+        server.add_action("/debug/memory/reset", self.memory_reset)
+        server.add_action("/debug/memory/stop", self.memory_stop)
+
+    def stop(self):
+        """Writes the report of a running profile and stops memory tracing."""
+        if self.profiler.running:
+            self.stop_profile()
+        self.memory_stop()
@@ -0,0 +1,358 @@
+import logging
+import random
+import threading
+import time
+import typing
+from concurrent.futures import CancelledError, Future
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+WRITE_LATENCY = REGISTRY.histogram(
+    "utbot_write_latency_seconds",
+    "Duration of write attempts to Steem and Discord",
+    ["destination"],
+)
+WRITE_RETRIES = REGISTRY.counter(
+    "utbot_write_retries",
+    "Write attempts that failed and were retried",
+    ["destination"],
+)
+WRITE_FAILURES = REGISTRY.counter(
+    "utbot_write_failures", "Writes dropped after failing", ["destination"]
+)
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Exponential backoff with full jitter.
+
+    :param attempt: Number of the failed attempt, starting at 1
+    :type attempt: int
+    :param base: Delay after the first failure
+    :type base: float
+    :param cap: Maximum delay
+    :type cap: float
+    :return: seconds to wait
+    :rtype: float
+    """
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+class TokenBucket:
+    """Paces requests to a destination.
+
+    The bucket holds up to ``capacity`` tokens and refills ``rate`` tokens per
+    second. Every request reserves a token; when the bucket is empty the token
+    is borrowed from the future and the caller is told how long to wait, so
+    callers are served in the order of their reservations.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: float = 1,
+        clock: typing.Callable[[], float] = time.monotonic,
+    ):
+        """
+        :param rate: Tokens added per second
+        :type rate: float
+        :param capacity: Maximum number of tokens, i.e. the allowed burst
+        :type capacity: float
+        :param clock: Monotonic clock
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.waited = 0.0
+        self._clock = clock
+        self._tokens = capacity
+        self._updated = clock()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    def reserve(self) -> float:
+        """Takes a token.
+
+        :return: seconds to wait before the request may be sent
+        :rtype: float
+        """
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+            self._tokens -= 1
+            delay = max(-self._tokens / self.rate, self._blocked_until - now, 0.0)
+            self.waited += delay
+            return delay
+
+    def block(self, seconds: float):
+        """Holds all requests for a while, e.g. after a rate limit response.
+
+        :param seconds: Seconds to hold the requests
+        :type seconds: float
+        """
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, self._clock() + seconds)
+
+    def stats(self) -> dict:
+        """Returns the available tokens and the total time callers had to wait.
+
+        :return: dictionary with statistics
+        :rtype: dict
+        """
+        with self._lock:
+            self._refill(self._clock())
+            return {"tokens": self._tokens, "waited": self.waited}
+
+
+class RateLimiter:
+    """Keeps a token bucket per destination.
+
+    Destinations are ``(kind, name)`` tuples, e.g. ``("steem", account)`` or
+    ``("discord", webhook_url)``, the rate and burst are set per kind.
+    """
+
+    def __init__(self, rate: float = 1.0, capacity: float = 1):
+        """
+        :param rate: Requests per second of kinds without their own limit
+        :type rate: float
+        :param capacity: Burst of kinds without their own limit
+        :type capacity: float
+        """
+        self._limits = {None: (rate, capacity)}
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def set_limit(self, kind: str, rate: float, capacity: float = 1):
+        """Sets the limit of a kind of destinations.
+
+        :param kind: Kind of destinations
+        :type kind: str
+        :param rate: Requests per second to a destination
+        :type rate: float
+        :param capacity: Requests a destination may receive in a burst
+        :type capacity: float
+        """
+        with self._lock:
+            self._limits[kind] = (rate, capacity)
+
+    def bucket(self, destination: tuple) -> TokenBucket:
+        """Gets the token bucket of a destination.
+
+        :param destination: ``(kind, name)`` of the destination
+        :type destination: tuple
+        :return: token bucket
+        :rtype: TokenBucket
+        """
+        with self._lock:
+            bucket = self._buckets.get(destination)
+            if bucket is None:
+                limit = self._limits.get(destination[0], self._limits[None])
+                bucket = self._buckets[destination] = TokenBucket(*limit)
+            return bucket
+
+
+class _Write:
+    __slots__ = ("destination", "func", "fatal", "name", "attempts", "future")
+
+    def __init__(self, destination, func, fatal, name):
+        self.destination = destination
+        self.func = func
+        self.fatal = fatal
+        self.name = name
+        self.attempts = 0
+        self.future = Future()
+
+
+class Outbox:
+    """Performs outbound writes paced by a rate limiter.
+
+    A write waits for a token of its destination and is retried with a jittered
+    exponential backoff when it fails. The waits are scheduled with
+    ``call_later`` instead of sleeping, so a stuck write holds up neither its
+    caller nor the writes queued behind it. When the scheduler stops,
+    :meth:`drain` runs the waiting writes in the caller.
+    """
+
+    def __init__(
+        self,
+        limiter: RateLimiter,
+        max_attempts: int = 5,
+        backoff_base: float = 3.0,
+        backoff_max: float = 300.0,
+    ):
+        """
+        :param limiter: Rate limiter of the destinations
+        :type limiter: RateLimiter
+        :param max_attempts: Attempts of a write before it is dropped
+        :type max_attempts: int
+        :param backoff_base: Delay after the first failed attempt
+        :type backoff_base: float
+        :param backoff_max: Maximum delay between attempts
+        :type backoff_max: float
+        """
+        self.limiter = limiter
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.pending = 0
+        self.done = 0
+        self.retried = 0
+        self.failed = 0
+        self._call_later = None
+        self._deadline = None
+        # scheduled writes and their monotonic due times
+        self._waiting = {}
+        self._lock = threading.Lock()
+
+    def start(self, call_later: typing.Callable):
+        """Starts scheduling the writes, until then the caller waits for them.
+
+        :param call_later: Function scheduling a call, e.g. Scheduler.call_later
+        """
+        self._call_later = call_later
+
+    def submit(
+        self,
+        destination: tuple,
+        func: typing.Callable[[], typing.Any],
+        fatal: typing.Tuple[type, ...] = (),
+        name: str = None,
+        after: Future = None,
+    ) -> Future:
+        """Queues a write.
+
+        :param destination: ``(kind, name)`` of the destination
+        :type destination: tuple
+        :param func: Function performing the write, an exception means failure
+        :param fatal: Exceptions that are not worth a retry
+        :type fatal: tuple
+        :param name: Description of the write for the log
+        :type name: str
+        :param after: Future of a preceding write, the write starts when it
+            succeeds and fails with it otherwise
+        :type after: concurrent.futures.Future
+        :return: future resolved with the result of the write
+        :rtype: concurrent.futures.Future
+        """
+        write = _Write(destination, func, fatal, name or getattr(func, "__name__", ""))
+        with self._lock:
+            self.pending += 1
+        if after is None:
+            self._start(write)
+        else:
+            after.add_done_callback(lambda done: self._start(write, done))
+        return write.future
+
+    def _start(self, write: _Write, after: Future = None):
+        if after is not None:
+            error = CancelledError() if after.cancelled() else after.exception()
+            if error is not None:
+                logger.info("Skipping %s, the preceding write failed", write.name)
+                self._finish(write, failed=True)
+                write.future.set_exception(error)
+                return
+        self._schedule(write, self.limiter.bucket(write.destination).reserve())
+
+    def drain(self, timeout: float = 30.0):
+        """Runs the waiting writes in the caller, e.g. when the scheduler stops.
+
+        Later writes run in the caller too. A write that fails while draining
+        isn't retried, a write that can't start within the timeout is
+        abandoned and its future stays pending, so the queued job waiting for
+        it isn't acked and is processed again after a restart.
+
+        :param timeout: Maximum seconds to wait for the rate limits
+        :type timeout: float
+        """
+        with self._lock:
+            self._call_later = None
+            self._deadline = time.monotonic() + timeout
+            waiting = sorted(self._waiting.items(), key=lambda item: item[1])
+            self._waiting.clear()
+        if waiting:
+            logger.info("Draining %d writes", len(waiting))
+        for write, due in waiting:
+            self._schedule(write, max(due - time.monotonic(), 0))
+
+    def _schedule(self, write: _Write, delay: float):
+        with self._lock:
+            call_later = self._call_later
+            if call_later is not None:
+                self._waiting[write] = time.monotonic() + delay
+        if call_later is not None:
+            call_later(delay, self._run_waiting, write)
+            return
+        if self._deadline is not None and time.monotonic() + delay > self._deadline:
+            logger.warning(
+                "Abandoning %s, it can't start before the deadline", write.name
+            )
+            return
+        time.sleep(delay)
+        self._run(write)
+
+    def _run_waiting(self, write: _Write):
+        with self._lock:
+            if self._waiting.pop(write, None) is None:
+                # taken over by drain
+                return
+        self._run(write)
+
+    def _run(self, write: _Write):
+        write.attempts += 1
+        kind = write.destination[0]
+        start = time.monotonic()
+        try:
+            result = write.func()
+        except Exception as e:
+            WRITE_LATENCY.labels(kind).observe(time.monotonic() - start)
+            if (
+                isinstance(e, write.fatal)
+                or write.attempts >= self.max_attempts
+                or self._deadline is not None
+            ):
+                logger.exception(
+                    "Dropping %s after %d attempts", write.name, write.attempts
+                )
+                WRITE_FAILURES.labels(kind).inc()
+                self._finish(write, failed=True)
+                write.future.set_exception(e)
+                return
+            delay = backoff_delay(write.attempts, self.backoff_base, self.backoff_max)
+            logger.warning("%s failed (%s), retrying in %.1f s", write.name, e, delay)
+            WRITE_RETRIES.labels(kind).inc()
+            with self._lock:
+                self.retried += 1
+            bucket = self.limiter.bucket(write.destination)
+            self._schedule(write, max(delay, bucket.reserve()))
+        else:
+            WRITE_LATENCY.labels(kind).observe(time.monotonic() - start)
+            self._finish(write, failed=False)
+            write.future.set_result(result)
+
+    def _finish(self, write: _Write, failed: bool):
+        with self._lock:
+            self.pending -= 1
+            if failed:
+                self.failed += 1
+            else:
+                self.done += 1
+
+    def stats(self) -> dict:
+        """Returns the number of pending, done, retried and failed writes.
+
+        :return: dictionary with statistics
+        :rtype: dict
+        """
+        with self._lock:
+            return {
+                "pending": self.pending,
+                "done": self.done,
+                "retried": self.retried,
+                "failed": self.failed,
+            }
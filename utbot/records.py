@@ -0,0 +1,118 @@
+import typing
+
+
+class CommentTask:
+    """Compact record of a reviewer comment waiting for processing.
+
+    Keeps only the fields needed to process the bot commands and refers to the
+    root post by its authorperm, so that queued items don't hold whole posts
+    with their votes and metadata. Item access mirrors ``beem.comment.Comment``
+    for the fields it keeps.
+    """
+
+    __slots__ = (
+        "authorperm",
+        "author",
+        "permlink",
+        "url",
+        "body",
+        "tags",
+        "root",
+        "block_time",
+    )
+
+    def __init__(
+        self,
+        author: str,
+        permlink: str,
+        url: str,
+        body: str,
+        tags: typing.Sequence[str],
+        root: str,
+        block_time: int = None,
+    ):
+        """
+        :param author: Author of the comment
+        :type author: str
+        :param permlink: Permlink of the comment
+        :type permlink: str
+        :param url: Relative URL of the comment
+        :type url: str
+        :param body: Body of the comment with the bot commands
+        :type body: str
+        :param tags: Tags of the comment
+        :type tags: list
+        :param root: ``@author/permlink`` of the root post
+        :type root: str
+        :param block_time: Epoch seconds of the block with the comment
+        :type block_time: int
+        """
+        self.authorperm = f"@{author}/{permlink}"
+        self.author = author
+        self.permlink = permlink
+        self.url = url
+        self.body = body
+        self.tags = tuple(tags)
+        self.root = root
+        self.block_time = block_time
+
+    def __getitem__(self, key: str):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __repr__(self):
+        return f"CommentTask({self.authorperm!r}, root={self.root!r})"
+
+    @classmethod
+    def from_comment(cls, comment, root: str, block_time: int = None) -> "CommentTask":
+        """Creates a record from a loaded comment.
+
+        :param comment: Reviewer comment
+        :type comment: beem.comment.Comment
+        :param root: ``@author/permlink`` of the root post
+        :type root: str
+        :param block_time: Epoch seconds of the block with the comment
+        :type block_time: int
+        :return: record
+        :rtype: CommentTask
+        """
+        return cls(
+            comment["author"],
+            comment["permlink"],
+            comment["url"],
+            comment["body"],
+            comment["tags"],
+            root,
+            block_time,
+        )
+
+    def to_payload(self) -> list:
+        """Converts the record to a JSON serializable list.
+
+        :return: list of the fields
+        :rtype: list
+        """
+        return [
+            self.author,
+            self.permlink,
+            self.url,
+            self.body,
+            list(self.tags),
+            self.root,
+            self.block_time,
+        ]
+
+    @classmethod
+    def from_payload(cls, payload: list) -> "CommentTask":
+        """Creates a record from the output of :meth:`to_payload`.
+
+        Payloads queued before the block time was recorded are accepted.
+
+        :param payload: List of the fields
+        :type payload: list
+        :return: record
+        :rtype: CommentTask
+        """
+        return cls(*payload)
@@ -0,0 +1,183 @@
+import time
+import typing
+from datetime import datetime, timezone
+
+from categories import CATEGORIES
+from constants import get_bot
+
+AVATAR_URL = "https://steemitimages.com/u/{}/avatar"
+TASK_FOOTER = {"text": "Verified by Utopian.io team"}
+NO_BOUNTY = "See the task details"
+NO_DEADLINE = "Not specified"
+UNKNOWN = "Unknown"
+
+SUMMARY_INTRO = "Hello, I was called to collect basic information about this task."
+SUMMARY_STATUS = "This task is currently **{}**{}."
+SUMMARY_DEADLINE = " with an expected deadline **{}** to complete the task"
+SUMMARY_ASSIGNEES = "The task has been assigned to **{}**."
+SUMMARY_VOTE = (
+    "The solvers may reach a potential vote from @utopian-io as a part "
+    "of the reward by submitting the solution via Utopian.io."
+)
+SUMMARY_BOUNTY = (
+    "The requester put a bounty of **{}** on "
+    "top of a potential vote from Utopian.io for completing the task."
+)
+SUMMARY_CLOSED = "Thanks to everyone who participated in this task."
+SUMMARY_DISCORD = (
+    "All contributors are encouraged to join the [Utopian Discord](https://discord.gg/azdmM3v)."
+    " The requester's identifier is **{}**."
+)
+SUMMARY_NO_DISCORD = (
+    "Don't hesitate to join the [Utopian Discord](https://discord.gg/azdmM3v) "
+    "to learn more about the task."
+)
+SUMMARY_OUTRO = "<sub>Last update: {}.</sub>"
+
+# current second with its embed timestamp and summary update time
+_times = (None, None, None)
+
+
+def current_times() -> tuple:
+    """Gets the current time formatted for embeds and summaries.
+
+    The strings are formatted once per second.
+
+    :return: tuple of the ISO timestamp and the ``Last update`` time
+    :rtype: tuple
+    """
+    global _times
+    second = int(time.time())
+    if _times[0] != second:
+        now = datetime.fromtimestamp(second, timezone.utc)
+        _times = (second, now.isoformat(), now.strftime("%Y-%m-%dT%H:%M:%SZ"))
+    return _times[1:]
+
+
+def field(name: str, value: str, inline: bool = True) -> dict:
+    return {"name": name, "value": value, "inline": inline}
+
+
+def author(name: str) -> dict:
+    return {
+        "name": name,
+        "url": f"{get_bot().ui_url}/@{name}",
+        "icon_url": AVATAR_URL.format(name),
+    }
+
+
+def account_links(accounts: typing.Iterable[str]) -> str:
+    """Formats accounts as comma separated Markdown links to their profiles.
+
+    :param accounts: Account names
+    :type accounts: list
+    :rtype: str
+    """
+    ui_url = get_bot().ui_url
+    return ", ".join(f"[{a}]({ui_url}/@{a})" for a in accounts)
+
+
+def render_task_embed(post: typing.Mapping, parsed_cmd: dict) -> dict:
+    """Renders the Discord embed payload of a task request.
+
+    :param post: Steem root post with task request
+    :param parsed_cmd: Parsed bot commands and arguments
+    :type parsed_cmd: dict
+    :return: embed payload with the current time as timestamp
+    :rtype: dict
+    """
+    task = CATEGORIES.classify(post["tags"]).task
+    embed = {"title": post["title"], "timestamp": current_times()[0]}
+    if parsed_cmd.get("description"):
+        embed["description"] = parsed_cmd["description"]
+    embed["footer"] = TASK_FOOTER
+    embed["author"] = author(post["author"])
+    embed["color"] = 0
+    fields = embed["fields"] = []
+    if task is not None:
+        embed["thumbnail"] = {"url": task.image_url}
+        embed["color"] = task.color
+        fields.append(field("Task Type", task.type.upper()))
+
+    status = parsed_cmd.get("status")
+    if status is not None:
+        status = status.upper()
+        fields.append(field("Status", status))
+    if status == "CLOSED":
+        return embed
+
+    if parsed_cmd.get("skills"):
+        fields.append(field("Required skills", ", ".join(parsed_cmd["skills"])))
+    if parsed_cmd.get("discord"):
+        fields.append(field("Discord", f'{parsed_cmd["discord"]}'))
+    bounty = parsed_cmd.get("bounty")
+    fields.append(field("Bounty", ", ".join(bounty) if bounty else NO_BOUNTY))
+    fields.append(field("Due date", parsed_cmd.get("deadline") or NO_DEADLINE))
+    if status == "IN PROGRESS" and parsed_cmd.get("assignees"):
+        links = account_links(parsed_cmd["assignees"])
+        fields.append(field("Assignees", links, inline=False))
+    if parsed_cmd.get("note") is not None:
+        fields.append(field("Misc", f'{parsed_cmd["note"]}', inline=False))
+    return embed
+
+
+def render_contribution_embed(contribution: dict) -> dict:
+    """Renders the Discord embed payload of a reviewed contribution.
+
+    :param contribution: Reviewed contribution from utopian.rocks
+    :type contribution: dict
+    :return: embed payload
+    :rtype: dict
+    """
+    category = contribution.get("category")
+    properties = CATEGORIES.get(category) if category else None
+    embed = {}
+    if contribution.get("title") is not None:
+        embed["title"] = contribution["title"]
+    if contribution.get("author"):
+        embed["author"] = author(contribution["author"])
+    embed["color"] = 0
+    if properties is not None:
+        embed["thumbnail"] = {"url": properties.image_url}
+        embed["color"] = properties.color
+    staff_picked = "Yes" if contribution.get("staff_picked") is True else "No"
+    embed["fields"] = [
+        field("Category", (category or UNKNOWN).upper()),
+        field("Reviewer", contribution.get("moderator", UNKNOWN)),
+        field("Score", str(contribution.get("score", UNKNOWN))),
+        field("Picked by staff", staff_picked),
+        field("Created at", contribution.get("created", UNKNOWN)),
+        field("Reviewed at", contribution.get("review_date", UNKNOWN)),
+    ]
+    return embed
+
+
+def render_task_summary(parsed_cmd: dict) -> str:
+    """Renders the bot's summary of a task request.
+
+    :param parsed_cmd: Parsed bot commands and arguments
+    :type parsed_cmd: dict
+    :return: Markdown body ending with the current time
+    :rtype: str
+    """
+    status = parsed_cmd["status"].upper()
+    closed = status == "CLOSED"
+    deadline = ""
+    if parsed_cmd["deadline"] and not closed:
+        deadline = SUMMARY_DEADLINE.format(parsed_cmd["deadline"])
+    parts = [SUMMARY_INTRO, SUMMARY_STATUS.format(status, deadline)]
+    if status in ("IN PROGRESS", "CLOSED") and parsed_cmd["assignees"]:
+        assignees = ", ".join([f"@{a}" for a in parsed_cmd["assignees"]])
+        parts.append(SUMMARY_ASSIGNEES.format(assignees))
+    if closed:
+        parts.append(SUMMARY_CLOSED)
+    elif parsed_cmd["bounty"]:
+        parts.append(SUMMARY_BOUNTY.format(", ".join(parsed_cmd["bounty"])))
+    else:
+        parts.append(SUMMARY_VOTE)
+    if parsed_cmd["discord"]:
+        parts.append(SUMMARY_DISCORD.format(parsed_cmd["discord"]))
+    else:
+        parts.append(SUMMARY_NO_DISCORD)
+    parts.append(SUMMARY_OUTRO.format(current_times()[1]))
+    return "\n\n".join(parts)
@@ -0,0 +1,303 @@
+import json
+import logging
+import multiprocessing
+import os
+import time
+import typing
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+from beem.exceptions import ContentDoesNotExistsException
+
+from cache import ContentCache
+from categories import CATEGORIES
+from commands import command_action, merge_commands, parse_commands
+from content import find_reply, load_comment
+from ingest import BlockFetcher, comment_ops_in_block
+from ratelimit import backoff_delay
+from render import render_task_embed
+from rpc import RPCError
+from settings import get_config, get_http_nodes, get_ingest_pool
+from utils import build_comment_link, is_utopian_task_request
+
+logger = logging.getLogger(__name__)
+
+# state of a pool worker, set up by _init_worker
+_worker = None
+
+
+def split_range(first: int, last: int, size: int) -> typing.List[tuple]:
+    """Splits a block range into consecutive chunks.
+
+    :param first: First block number
+    :type first: int
+    :param last: Last block number, inclusive
+    :type last: int
+    :param size: Maximum number of blocks in a chunk
+    :type size: int
+    :return: list of ``(first, last)`` tuples
+    :rtype: list
+    """
+    return [(n, min(n + size - 1, last)) for n in range(first, last + 1, size)]
+
+
+def peak_memory() -> typing.Optional[int]:
+    """Gets the peak resident memory of the current process.
+
+    :return: peak memory in bytes or None if it can't be measured
+    :rtype: int
+    """
+    if resource is None:
+        return None
+    # kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class JsonLinesSink:
+    """Writes replay results to a file, one JSON object per line."""
+
+    def __init__(self, path: str):
+        """
+        :param path: Path to the output file
+        :type path: str
+        """
+        self.path = path
+        self.written = 0
+        self._file = open(path, "w")
+
+    def write(self, record: dict):
+        self._file.write(json.dumps(record, sort_keys=True))
+        self._file.write("\n")
+        self.written += 1
+
+    def close(self):
+        self._file.close()
+
+
+class DryRunSink:
+    """Only logs replay results."""
+
+    def __init__(self):
+        self.written = 0
+
+    def write(self, record: dict):
+        logger.info(
+            "[%s] %s at %s", record["action"], record["comment"], record["root"]
+        )
+        self.written += 1
+
+    def close(self):
+        pass
+
+
+class _Worker:
+    def __init__(self, range_size: int, max_attempts: int):
+        config = get_config()
+        self.account = config["steem"]["account"]
+        self.authors = frozenset(config["steem"]["reviewers"])
+        self.fetcher = BlockFetcher(get_ingest_pool(), range_size=range_size)
+        self.max_attempts = max_attempts
+        cache_config = config["cache"]
+        self.cache = ContentCache(
+            load_comment, find_reply, cache_config["maxsize"], cache_config["ttl"]
+        )
+
+    def fetch_range(self, start: int, count: int) -> list:
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                return self.fetcher.fetch_range(start, count)
+            except RPCError:
+                if attempt == self.max_attempts:
+                    raise
+                time.sleep(backoff_delay(attempt, 1, 30))
+
+
+def _init_worker(range_size: int, max_attempts: int):
+    from beem import Steem
+    from beem.instance import set_shared_steem_instance
+
+    global _worker
+    # posts are parsed by beem, but nothing is broadcasted
+    set_shared_steem_instance(Steem(node=get_http_nodes(), offline=True))
+    _worker = _Worker(range_size, max_attempts)
+
+
+def replay_comment_op(comment_op: dict) -> typing.Optional[dict]:
+    """Determines how the bot reacts to a historical reviewer comment.
+
+    Commands are parsed from the body in the operation, the root post is read in
+    its current state. The decision is the one of
+    :func:`utbot.process_cmd_comments`.
+
+    :param comment_op: Comment operation
+    :type comment_op: dict
+    :return: replay result or None if the bot ignores the comment
+    :rtype: dict
+    :raises RPCError: if the comment or its root post can't be loaded
+    """
+    parsed_cmd = merge_commands(parse_commands(comment_op["body"]))
+    action = command_action(parsed_cmd, comment_op["author"], _worker.account)
+    if action is None:
+        return None
+    authorperm = f'@{comment_op["author"]}/{comment_op["permlink"]}'
+    try:
+        comment = load_comment(authorperm)
+        root = _worker.cache.get_root(comment)
+    except ContentDoesNotExistsException:
+        logger.info("Comment or its root post does not exist. %s", authorperm)
+        return None
+    if not is_utopian_task_request(root):
+        return None
+    if action == "task" and CATEGORIES.classify(root["tags"]).task is None:
+        return None
+    record = {
+        "block_num": comment_op["block_num"],
+        "timestamp": comment_op["timestamp"],
+        "trx_id": comment_op["trx_id"],
+        "comment": comment["url"],
+        "root": root["url"],
+        "command": parsed_cmd,
+        "action": action,
+    }
+    if action == "task":
+        record["discord"] = {
+            "content": f'[{parsed_cmd["status"].upper()}] '
+            f"<{build_comment_link(root)}>",
+            "embeds": [render_task_embed(root, parsed_cmd)],
+        }
+    return record
+
+
+def replay_blocks(block_range: tuple) -> dict:
+    """Replays a chunk of blocks in a pool worker.
+
+    :param block_range: ``(first, last)`` block numbers
+    :type block_range: tuple
+    :return: results and statistics of the chunk
+    :rtype: dict
+    """
+    first, last = block_range
+    started = time.monotonic()
+    records = []
+    failed = []
+    comments = 0
+    range_size = _worker.fetcher.range_size
+    for start in range(first, last + 1, range_size):
+        count = min(range_size, last - start + 1)
+        try:
+            blocks = _worker.fetch_range(start, count)
+        except RPCError:
+            logger.exception("Blocks %d-%d unavailable", start, start + count - 1)
+            failed.append((start, start + count - 1))
+            continue
+        for block_num, block in blocks:
+            for comment_op in comment_ops_in_block(block, block_num, _worker.authors):
+                comments += 1
+                try:
+                    record = replay_comment_op(comment_op)
+                except RPCError:
+                    logger.exception(
+                        "Comment @%s/%s unavailable",
+                        comment_op["author"],
+                        comment_op["permlink"],
+                    )
+                    failed.append((block_num, block_num))
+                    continue
+                if record is not None:
+                    records.append(record)
+    return {
+        "pid": os.getpid(),
+        "blocks": last - first + 1,
+        "comments": comments,
+        "records": records,
+        "failed": failed,
+        "elapsed": time.monotonic() - started,
+        "peak_memory": peak_memory(),
+    }
+
+
+def replay_range(
+    first: int,
+    last: int,
+    sink,
+    workers: int = None,
+    chunk_size: int = 1000,
+    range_size: int = 50,
+    max_attempts: int = 5,
+) -> dict:
+    """Runs the bot's command processing over a historical block range.
+
+    The range is split into chunks processed by a pool of worker processes.
+    Results are passed to the sink in block order, nothing is posted to Steem
+    or Discord.
+
+    :param first: First block number
+    :type first: int
+    :param last: Last block number, inclusive
+    :type last: int
+    :param sink: Object with ``write(record)`` and ``close()`` methods
+    :param workers: Number of worker processes, defaults to the CPU count
+    :type workers: int
+    :param chunk_size: Number of blocks a worker processes at once
+    :type chunk_size: int
+    :param range_size: Number of blocks requested in one batch
+    :type range_size: int
+    :param max_attempts: Attempts to fetch a batch before it is skipped
+    :type max_attempts: int
+    :return: statistics per worker process id
+    :rtype: dict
+    """
+    # resolve the node list once, forked workers inherit it
+    get_http_nodes()
+    chunks = split_range(first, last, chunk_size)
+    stats = {}
+    failed = []
+    started = time.monotonic()
+    logger.info("Replaying blocks %d-%d in %d chunks", first, last, len(chunks))
+    try:
+        with multiprocessing.Pool(
+            workers, initializer=_init_worker, initargs=(range_size, max_attempts)
+        ) as pool:
+            for result in pool.imap(replay_blocks, chunks):
+                for record in result["records"]:
+                    sink.write(record)
+                failed.extend(result["failed"])
+                worker = stats.setdefault(
+                    result["pid"],
+                    {"blocks": 0, "comments": 0, "results": 0, "busy": 0.0},
+                )
+                worker["blocks"] += result["blocks"]
+                worker["comments"] += result["comments"]
+                worker["results"] += len(result["records"])
+                worker["busy"] += result["elapsed"]
+                worker["peak_memory"] = result["peak_memory"]
+    finally:
+        sink.close()
+    for pid, worker in sorted(stats.items()):
+        worker["blocks_per_sec"] = worker["blocks"] / max(worker["busy"], 1e-9)
+        logger.info(
+            "Worker %d: %d blocks, %.1f blocks/s, %d reviewer comments, "
+            "%d results, peak memory %s MiB",
+            pid,
+            worker["blocks"],
+            worker["blocks_per_sec"],
+            worker["comments"],
+            worker["results"],
+            (
+                "?"
+                if worker["peak_memory"] is None
+                else f'{worker["peak_memory"] / 2 ** 20:.1f}'
+            ),
+        )
+    logger.info(
+        "Replayed %d blocks in %.1f s, %d results",
+        last - first + 1,
+        time.monotonic() - started,
+        sink.written,
+    )
+    for start, stop in failed:
+        logger.warning("Blocks %d-%d were not fully replayed", start, stop)
+    return stats
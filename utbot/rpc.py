@@ -0,0 +1,128 @@
+import itertools
+import logging
+import time
+import typing
+
+import requests
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+RPC_LATENCY = REGISTRY.histogram(
+    "utbot_rpc_latency_seconds", "Latency of API node requests", ["method", "node"]
+)
+RPC_ERRORS = REGISTRY.counter(
+    "utbot_rpc_errors", "Failed API node requests", ["method", "node"]
+)
+
+
+class RPCError(Exception):
+    """Raised when a node returns an error or an invalid response."""
+
+
+def batch_payload(calls: typing.Sequence[tuple], ids: typing.Iterator[int]) -> list:
+    """Builds JSON-RPC requests of several calls.
+
+    :param calls: Sequence of ``(method, params)`` tuples
+    :type calls: list
+    :param ids: Iterator of request ids
+    :return: list of request objects
+    :rtype: list
+    """
+    return [
+        {
+            "jsonrpc": "2.0",
+            "id": next(ids),
+            "method": method,
+            "params": [] if params is None else params,
+        }
+        for method, params in calls
+    ]
+
+
+def batch_results(url: str, payload: list, data: typing.Any) -> list:
+    """Matches the responses of a batch to its requests.
+
+    :param url: URL of the node, used in error messages
+    :type url: str
+    :param payload: Request objects of the batch
+    :type payload: list
+    :param data: Decoded response body
+    :return: Results in the order of the requests
+    :rtype: list
+    :raises RPCError: if any of the calls fails
+    """
+    if isinstance(data, dict):
+        data = [data]
+    by_id = {item.get("id"): item for item in data}
+    results = []
+    for request in payload:
+        item = by_id.get(request["id"])
+        if item is None or "error" in item:
+            error = item.get("error") if item else "missing response"
+            raise RPCError(f"{url} {request['method']}: {error}")
+        results.append(item.get("result"))
+    return results
+
+
+class JsonRpcClient:
+    """Minimal JSON-RPC 2.0 client for a single Steem API node.
+
+    It works with raw response dicts and keeps one pooled HTTP session, so it is
+    much cheaper than going through beem for bulk reads.
+    """
+
+    def __init__(self, url: str, timeout: float = 15, session=None):
+        """
+        :param url: URL of the node
+        :type url: str
+        :param timeout: Request timeout in seconds
+        :type timeout: float
+        :param session: Requests session to reuse
+        """
+        self.url = url
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        self._ids = itertools.count(1)
+
+    def call(self, method: str, params: typing.Any = None) -> typing.Any:
+        """Calls a single API method.
+
+        :param method: Full method name, e.g. ``block_api.get_block``
+        :type method: str
+        :param params: Method parameters
+        :return: Result of the call
+        :raises RPCError: if the node returns an error
+        """
+        return self.batch([(method, params)])[0]
+
+    def batch(self, calls: typing.Sequence[tuple]) -> list:
+        """Sends several calls in one HTTP request.
+
+        :param calls: Sequence of ``(method, params)`` tuples
+        :type calls: list
+        :return: Results in the order of the calls
+        :rtype: list
+        :raises RPCError: if any of the calls fails
+        """
+        payload = batch_payload(calls, self._ids)
+        method = payload[0]["method"]
+        start = time.monotonic()
+        try:
+            resp = self.session.post(
+                self.url,
+                json=payload if len(payload) > 1 else payload[0],
+                timeout=self.timeout,
+            )
+            resp.raise_for_status()
+            data = resp.json()
+            results = batch_results(self.url, payload, data)
+        except (requests.RequestException, ValueError) as e:
+            RPC_ERRORS.labels(method, self.url).inc()
+            raise RPCError(f"{self.url}: {e}") from e
+        except RPCError:
+            RPC_ERRORS.labels(method, self.url).inc()
+            raise
+        RPC_LATENCY.labels(method, self.url).observe(time.monotonic() - start)
+        return results
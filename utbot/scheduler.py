@@ -0,0 +1,297 @@
+import heapq
+import itertools
+import logging
+import queue
+import threading
+import time
+import typing
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from metrics import REGISTRY
+from ratelimit import backoff_delay
+
+logger = logging.getLogger(__name__)
+
+# jittered delays before a crashed worker is restarted
+RESTART_BASE = 1.0
+RESTART_MAX = 60.0
+
+WORKER_RESTARTS = REGISTRY.counter(
+    "utbot_worker_restarts", "Long running workers restarted after a crash", ["worker"]
+)
+
+
+def restart_delay(name: str, attempt: int) -> float:
+    """Logs a crashed worker and gets the delay before its restart.
+
+    :param name: Name of the worker
+    :type name: str
+    :param attempt: Number of crashes in a row, starting at 1
+    :type attempt: int
+    :return: seconds to wait
+    :rtype: float
+    """
+    delay = backoff_delay(attempt, RESTART_BASE, RESTART_MAX)
+    logger.exception("Worker %s crashed, restarting in %.1f s", name, delay)
+    WORKER_RESTARTS.labels(name).inc()
+    return delay
+
+
+def settle_job(source, job, result, call: typing.Callable = None):
+    """Acks a processed job once the write started by its handler is done.
+
+    Handlers return a future of the write they started, the job is acked when
+    it succeeds and nacked to be retried after the queue's backoff when it
+    fails. Jobs whose handler returned anything else are acked right away.
+
+    :param source: Work queue of the job
+    :type source: workqueue.WorkQueue
+    :param job: Processed job
+    :type job: workqueue.Job
+    :param result: Value returned by the handler
+    :param call: Function running the ack or nack, e.g. in a thread pool
+    """
+    call = call or (lambda func, *args: func(*args))
+    if not isinstance(result, Future):
+        call(source.ack, job)
+        return
+
+    def done(future: Future):
+        if future.cancelled() or future.exception() is not None:
+            logger.warning("Write of %r failed, will retry", job)
+            call(source.nack, job)
+        else:
+            call(source.ack, job)
+
+    result.add_done_callback(done)
+
+
+class Scheduler:
+    """Runs the bot's workers without busy waiting.
+
+    Consumers block on their queues and process items as soon as they arrive,
+    periodic jobs are kept in a heap ordered by their next run time and executed
+    by a small thread pool, and the main thread waits on the shutdown event.
+    """
+
+    def __init__(self, job_workers: int = 4, poll_timeout: float = 1.0):
+        """
+        :param job_workers: Number of threads executing timed jobs
+        :type job_workers: int
+        :param poll_timeout: Seconds a consumer waits for an item before it
+            checks for a shutdown request
+        :type poll_timeout: float
+        """
+        self.shutdown = threading.Event()
+        self._poll_timeout = poll_timeout
+        self._timers = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._executor = ThreadPoolExecutor(
+            max_workers=job_workers, thread_name_prefix="scheduler-job"
+        )
+        self._threads = []
+        self._stop_hooks = []
+
+    def spawn(self, func: typing.Callable, *args, name: str = None, **kwargs):
+        """Runs a long running function in its own daemon thread.
+
+        A function that raises is called again after a jittered backoff until
+        a shutdown is requested, workers resuming from a checkpoint continue
+        after the last processed block.
+
+        :param func: Function to run
+        :param name: Name of the thread
+        :type name: str
+        """
+        thread = threading.Thread(
+            target=self._supervise, args=(func,) + args, kwargs=kwargs, name=name
+        )
+        thread.daemon = True
+        self._threads.append(thread)
+        thread.start()
+        return thread
+
+    def consume(
+        self,
+        source: queue.Queue,
+        func: typing.Callable,
+        workers: int = 1,
+        name: str = None,
+    ):
+        """Starts consumers that block on a queue and pass every item to a function.
+
+        :param source: Queue to consume
+        :type source: queue.Queue
+        :param func: Function called with every queue item
+        :param workers: Number of consumer threads
+        :type workers: int
+        :param name: Name prefix of the consumer threads
+        :type name: str
+        """
+        name = name or getattr(func, "__name__", "consumer")
+        for i in range(workers):
+            self.spawn(self._consume, source, func, name=f"{name}-{i}")
+
+    def consume_jobs(
+        self, source, func: typing.Callable, workers: int = 1, name: str = None
+    ):
+        """Starts consumers of a work queue, acking items processed without error.
+
+        Items whose processing raised an exception are nacked to be retried.
+        If the function returns a future, the item is acked or nacked when the
+        future is done, see :func:`settle_job`.
+
+        :param source: Work queue to consume
+        :type source: workqueue.WorkQueue
+        :param func: Function called with the payload of every item
+        :param workers: Number of consumer threads
+        :type workers: int
+        :param name: Name prefix of the consumer threads
+        :type name: str
+        """
+        name = name or getattr(func, "__name__", "consumer")
+        for i in range(workers):
+            self.spawn(self._consume_jobs, source, func, name=f"{name}-{i}")
+
+    def every(self, seconds: float, func: typing.Callable, *args, **kwargs):
+        """Runs a function periodically, the first run is immediate.
+
+        The next run is planned after the previous one finishes so that runs of
+        the same job never overlap. If the function returns a number, it is used
+        as the delay before the next run instead of ``seconds``.
+
+        :param seconds: Seconds between the end of a run and the next run
+        :type seconds: float
+        :param func: Function to run
+        """
+
+        def job():
+            delay = seconds
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                logger.exception("Periodic job %s failed", func.__name__)
+            else:
+                if isinstance(result, (int, float)) and not isinstance(result, bool):
+                    delay = result
+            if not self.shutdown.is_set():
+                self.call_later(delay, job)
+
+        self.call_later(0, job)
+
+    def call_later(self, delay: float, func: typing.Callable, *args, **kwargs):
+        """Runs a function once after a delay.
+
+        :param delay: Seconds to wait
+        :type delay: float
+        :param func: Function to run
+        """
+        entry = (time.monotonic() + delay, next(self._counter), func, args, kwargs)
+        with self._cond:
+            heapq.heappush(self._timers, entry)
+            self._cond.notify()
+
+    def start(self):
+        """Starts the timer thread."""
+        self.spawn(self._run_timers, name="scheduler-timers")
+
+    def on_stop(self, func: typing.Callable, *args, **kwargs):
+        """Registers a function called when the scheduler stops.
+
+        :param func: Function to call
+        """
+        self._stop_hooks.append((func, args, kwargs))
+
+    def stop(self):
+        """Requests all workers to stop and runs the stop hooks.
+
+        The hooks run in the caller, in the order they were registered, before
+        the thread pool shuts down, so the acks of writes they finish still run.
+        """
+        if self.shutdown.is_set():
+            return
+        self.shutdown.set()
+        with self._cond:
+            self._cond.notify_all()
+        for func, args, kwargs in self._stop_hooks:
+            self._guard(func, *args, **kwargs)
+        self._executor.shutdown(wait=False)
+
+    def wait(self, timeout: float = None) -> bool:
+        """Blocks until a shutdown is requested.
+
+        :param timeout: Maximum seconds to wait
+        :type timeout: float
+        :return: True if the shutdown was requested
+        :rtype: bool
+        """
+        return self.shutdown.wait(timeout)
+
+    def _run_timers(self):
+        while not self.shutdown.is_set():
+            with self._cond:
+                if not self._timers:
+                    self._cond.wait()
+                    continue
+                delay = self._timers[0][0] - time.monotonic()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+                _, _, func, args, kwargs = heapq.heappop(self._timers)
+            try:
+                self._executor.submit(self._guard, func, *args, **kwargs)
+            except RuntimeError:
+                # executor already shut down
+                return
+
+    def _consume(self, source: queue.Queue, func: typing.Callable):
+        while not self.shutdown.is_set():
+            try:
+                item = source.get(timeout=self._poll_timeout)
+            except queue.Empty:
+                continue
+            try:
+                func(item)
+            except Exception:
+                logger.exception("Failed to process %s", item)
+            finally:
+                source.task_done()
+
+    def _consume_jobs(self, source, func: typing.Callable):
+        while not self.shutdown.is_set():
+            try:
+                job = source.get(timeout=self._poll_timeout)
+            except queue.Empty:
+                continue
+            try:
+                result = func(job.payload)
+            except Exception:
+                logger.exception("Failed to process %r, will retry", job)
+                source.nack(job)
+            else:
+                settle_job(source, job, result)
+
+    def _supervise(self, func: typing.Callable, *args, **kwargs):
+        name = threading.current_thread().name
+        attempt = 0
+        while not self.shutdown.is_set():
+            start = time.monotonic()
+            try:
+                func(*args, **kwargs)
+                return
+            except Exception:
+                # a worker that ran for a while starts with a short delay again
+                if time.monotonic() - start > RESTART_MAX:
+                    attempt = 0
+                attempt += 1
+                delay = restart_delay(name, attempt)
+            if self.shutdown.wait(delay):
+                return
+
+    @staticmethod
+    def _guard(func: typing.Callable, *args, **kwargs):
+        try:
+            func(*args, **kwargs)
+        except Exception:
+            logger.exception("Worker %s crashed", getattr(func, "__name__", func))
@@ -0,0 +1,190 @@
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+here = os.path.dirname(__file__)
+CONFIG_PATH = os.path.join(here, "config.json")
+
+_lock = threading.RLock()
+_config = None
+_nodes = None
+_steem = None
+_node_pool = None
+
+
+def get_config() -> dict:
+    """Loads the configuration file and fills in missing keys from ENV.
+
+    :return: configuration
+    :rtype: dict
+    """
+    global _config
+    with _lock:
+        if _config is None:
+            from dotenv import find_dotenv, load_dotenv
+
+            load_dotenv(find_dotenv())
+            with open(CONFIG_PATH, "r") as f:
+                config = json.load(f)
+            # load keys from ENV if not defined in config file
+            if not config["steem"]["posting_key"]:
+                config["steem"]["posting_key"] = os.environ.get("UT_PK")
+            if not config["steem"]["account"]:
+                config["steem"]["account"] = os.environ.get("UT_ACCOUNT")
+            if not config["discord"]["webhooks"]["tasks"]:
+                config["discord"]["webhooks"]["tasks"] = os.environ.get("UT_WH_TASKS")
+            if not config["discord"]["webhooks"]["contributions"]:
+                config["discord"]["webhooks"]["contributions"] = os.environ.get(
+                    "UT_WH_CONTRS"
+                )
+            if not config["coordination"]["replica_id"]:
+                config["coordination"]["replica_id"] = os.environ.get("UT_REPLICA")
+            _config = config
+        return _config
+
+
+def get_path(name: str) -> str:
+    """Resolves a file name from the configuration relative to the bot directory.
+
+    :param name: File name or path
+    :type name: str
+    :return: absolute path
+    :rtype: str
+    """
+    return os.path.join(here, name)
+
+
+def _read_nodes_cache(path: str, max_age: float):
+    try:
+        with open(path, "r") as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if max_age is not None and time.time() - cached["fetched_at"] > max_age:
+        return None
+    return cached["nodes"]
+
+
+def _write_nodes_cache(path: str, nodes: list):
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            json.dump({"fetched_at": time.time(), "nodes": nodes}, f)
+        os.replace(tmp_path, path)
+    except OSError:
+        logger.warning("Can't write the node list cache %s", path)
+
+
+def get_nodes() -> list:
+    """Gets Steem API nodes.
+
+    Nodes set in the configuration take precedence. Otherwise the node list is
+    read from the on-disk cache and refreshed from beem's NodeList once it
+    expires. A stale cache is used when the refresh fails.
+
+    :return: list of node URLs
+    :rtype: list
+    """
+    global _nodes
+    with _lock:
+        if _nodes is None:
+            steem_config = get_config()["steem"]
+            cache_path = get_path(steem_config["nodes_cache"])
+            nodes = steem_config["nodes"] or _read_nodes_cache(
+                cache_path, steem_config["nodes_cache_ttl"]
+            )
+            if not nodes:
+                from beem.nodelist import NodeList
+
+                try:
+                    nodes = NodeList().get_nodes()
+                except Exception:
+                    nodes = _read_nodes_cache(cache_path, None)
+                    if not nodes:
+                        raise
+                    logger.warning("Can't refresh node list, using a stale one")
+                else:
+                    _write_nodes_cache(cache_path, nodes)
+            _nodes = nodes
+        return _nodes
+
+
+def get_http_nodes(nodes: list = None) -> list:
+    """Filters HTTP(S) nodes usable by the JSON-RPC client.
+
+    :param nodes: Node URLs, defaults to get_nodes()
+    :type nodes: list
+    :return: list of HTTP(S) node URLs
+    :rtype: list
+    """
+    if not nodes:
+        nodes = get_nodes()
+    return [node for node in nodes if node.startswith("http")]
+
+
+def get_steem():
+    """Gets the shared Steem client, creating it on the first call.
+
+    :return: Steem instance
+    :rtype: beem.Steem
+    """
+    global _steem
+    with _lock:
+        if _steem is None:
+            from beem import Steem
+            from beem.instance import set_shared_steem_instance
+
+            _steem = Steem(
+                node=get_nodes(), keys=get_config()["steem"]["posting_key"], timeout=15
+            )
+            set_shared_steem_instance(_steem)
+        return _steem
+
+
+def get_node_pool():
+    """Gets the shared pool of API nodes used for reads, creating it on the first call.
+
+    :return: node pool
+    :rtype: nodepool.NodePool
+    """
+    global _node_pool
+    with _lock:
+        if _node_pool is None:
+            _node_pool = create_node_pool(get_http_nodes())
+        return _node_pool
+
+
+def create_node_pool(nodes: list):
+    """Creates a pool of API nodes with the configured hedging parameters.
+
+    :param nodes: Node URLs
+    :type nodes: list
+    :return: node pool
+    :rtype: nodepool.NodePool
+    """
+    from nodepool import NodePool
+
+    pool_config = get_config()["node_pool"]
+    return NodePool(
+        nodes,
+        timeout=pool_config["timeout"],
+        hedge_min=pool_config["hedge_min"],
+        hedge_max=pool_config["hedge_max"],
+        workers=pool_config["workers"],
+    )
+
+
+def get_ingest_pool():
+    """Gets the node pool for block and account history reads.
+
+    :return: dedicated pool if ingestion nodes are configured, else the shared one
+    :rtype: nodepool.NodePool
+    """
+    nodes = get_config()["ingest"]["nodes"]
+    if nodes:
+        return create_node_pool(get_http_nodes(nodes))
+    return get_node_pool()
@@ -0,0 +1,346 @@
+import bisect
+import collections
+import datetime
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+import typing
+
+from categories import CATEGORIES
+from utils import build_comment_link
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+DATE_PATTERN = re.compile(r"(\d{4})-(\d{1,2})-(\d{1,2})")
+
+
+def parse_deadline(value) -> typing.Optional[str]:
+    """Normalizes a deadline to an ISO date.
+
+    :param value: Deadline of a command, e.g. ``2018-08-01``
+    :return: ``YYYY-MM-DD`` or None if the deadline isn't a date
+    :rtype: str
+    """
+    match = DATE_PATTERN.match(str(value or "").strip())
+    if match is None:
+        return None
+    try:
+        return datetime.date(*map(int, match.groups())).isoformat()
+    except ValueError:
+        return None
+
+
+class TaskBoard:
+    """In-memory index of task requests with the state of their last command.
+
+    Tasks are indexed by status, category, skill and deadline, so queries are
+    answered from memory by intersecting the matching sets. The board is saved
+    to SQLite on :meth:`flush` and loaded again on start, it doesn't need any
+    requests to the chain. Updates older than the stored one are ignored, so
+    commands processed again after a restart don't move a task back.
+    """
+
+    def __init__(self, path: str, name: str = "tasks"):
+        """
+        :param path: Path to the SQLite database file
+        :type path: str
+        :param name: Name of the board, several boards can share a database
+        :type name: str
+        """
+        self.path = path
+        self.name = name
+        self._tasks = {}
+        self._by_status = collections.defaultdict(set)
+        self._by_category = collections.defaultdict(set)
+        self._by_skill = collections.defaultdict(set)
+        # sorted (deadline, authorperm) pairs and (-updated_at, authorperm) pairs
+        self._deadlines = []
+        self._order = []
+        # deadlines and negated update times by authorperm
+        self._due = {}
+        self._rank = {}
+        self._dirty = {}
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS tasks (board TEXT NOT NULL, "
+                    "authorperm TEXT NOT NULL, task TEXT NOT NULL, "
+                    "PRIMARY KEY (board, authorperm))"
+                )
+            start = time.monotonic()
+            for (task,) in conn.execute(
+                "SELECT task FROM tasks WHERE board = ?", (self.name,)
+            ):
+                self._add(json.loads(task), ordered=False)
+            self._deadlines = sorted((d, k) for k, d in self._due.items())
+            self._order = sorted((r, k) for k, r in self._rank.items())
+            self._conn = conn
+            logger.info(
+                "Loaded %d tasks in %.3f s", len(self._tasks), time.monotonic() - start
+            )
+        return self._conn
+
+    def __len__(self):
+        with self._lock:
+            self._connect()
+            return len(self._tasks)
+
+    def load(self) -> int:
+        """Loads the saved board, it is also loaded on the first access.
+
+        :return: number of tasks
+        :rtype: int
+        """
+        return len(self)
+
+    def update(
+        self, post: typing.Mapping, parsed_cmd: dict, updated_at: float = None
+    ) -> bool:
+        """Stores the state of a task request after a command.
+
+        :param post: Steem root post with task request
+        :param parsed_cmd: Parsed bot commands and arguments
+        :type parsed_cmd: dict
+        :param updated_at: Epoch seconds of the block with the command, now if None
+        :type updated_at: float
+        :return: False if the board has a newer state of the task
+        :rtype: bool
+        """
+        if updated_at is None:
+            updated_at = time.time()
+        found = CATEGORIES.classify(post["tags"]).task
+        authorperm = f'@{post["author"]}/{post["permlink"]}'
+        task = {
+            "authorperm": authorperm,
+            "url": build_comment_link(post),
+            "title": post["title"],
+            "author": post["author"],
+            "category": found.type if found is not None else None,
+            "status": (parsed_cmd.get("status") or "").upper() or None,
+            "skills": parsed_cmd.get("skills") or [],
+            "bounty": parsed_cmd.get("bounty") or [],
+            "deadline": parsed_cmd.get("deadline"),
+            "assignees": parsed_cmd.get("assignees") or [],
+            "discord": parsed_cmd.get("discord"),
+            "description": parsed_cmd.get("description"),
+            "note": parsed_cmd.get("note"),
+            "updated_at": updated_at,
+        }
+        with self._lock:
+            self._connect()
+            old = self._tasks.get(authorperm)
+            if old is not None:
+                if old["updated_at"] > updated_at:
+                    return False
+                self._remove(old)
+            self._add(task)
+            self._dirty[authorperm] = task
+        return True
+
+    def _add(self, task: dict, ordered: bool = True):
+        key = task["authorperm"]
+        self._tasks[key] = task
+        self._by_status[task["status"]].add(key)
+        self._by_category[task["category"]].add(key)
+        for skill in task["skills"]:
+            self._by_skill[skill.lower()].add(key)
+        deadline = parse_deadline(task["deadline"])
+        self._rank[key] = -task["updated_at"]
+        if deadline is not None:
+            self._due[key] = deadline
+        if ordered:
+            if deadline is not None:
+                bisect.insort(self._deadlines, (deadline, key))
+            bisect.insort(self._order, (self._rank[key], key))
+
+    def _remove(self, task: dict):
+        key = task["authorperm"]
+        del self._tasks[key]
+        self._discard(self._by_status, task["status"], key)
+        self._discard(self._by_category, task["category"], key)
+        for skill in task["skills"]:
+            self._discard(self._by_skill, skill.lower(), key)
+        deadline = self._due.pop(key, None)
+        if deadline is not None:
+            del self._deadlines[bisect.bisect_left(self._deadlines, (deadline, key))]
+        rank = self._rank.pop(key)
+        del self._order[bisect.bisect_left(self._order, (rank, key))]
+
+    @staticmethod
+    def _discard(index: dict, value, key: str):
+        keys = index.get(value)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del index[value]
+
+    def get(self, authorperm: str) -> typing.Optional[dict]:
+        """Gets a task request.
+
+        :param authorperm: ``@author/permlink`` of the task request
+        :type authorperm: str
+        :return: task or None if it isn't on the board
+        :rtype: dict
+        """
+        with self._lock:
+            self._connect()
+            return self._tasks.get(authorperm)
+
+    def query(
+        self,
+        status: str = None,
+        category: str = None,
+        skill: str = None,
+        due_after: str = None,
+        due_before: str = None,
+        offset: int = 0,
+        limit: int = DEFAULT_LIMIT,
+    ) -> dict:
+        """Finds task requests, the most recently updated first.
+
+        :param status: Status, e.g. ``open`` or ``in progress``
+        :type status: str
+        :param category: Category, e.g. ``development``
+        :type category: str
+        :param skill: Required skill
+        :type skill: str
+        :param due_after: First deadline, ``YYYY-MM-DD``
+        :type due_after: str
+        :param due_before: Last deadline, ``YYYY-MM-DD``
+        :type due_before: str
+        :param offset: Number of skipped tasks
+        :type offset: int
+        :param limit: Maximum number of returned tasks
+        :type limit: int
+        :return: dictionary with the total count and a page of tasks
+        :rtype: dict
+        """
+        offset = max(offset, 0)
+        limit = min(max(limit, 0), MAX_LIMIT)
+        with self._lock:
+            self._connect()
+            sets = [
+                index.get(value, frozenset())
+                for index, value in (
+                    (self._by_status, status and status.upper()),
+                    (self._by_category, category and category.lower()),
+                    (self._by_skill, skill and skill.lower()),
+                )
+                if value is not None
+            ]
+            if due_after is not None or due_before is not None:
+                lo = bisect.bisect_left(self._deadlines, (due_after or "",))
+                hi = bisect.bisect_left(
+                    self._deadlines, ((due_before or "9999-12-31") + "~",)
+                )
+                sets.append(frozenset(key for _, key in self._deadlines[lo:hi]))
+            keys, total = self._select(sets, offset, limit)
+            tasks = [self._tasks[key] for key in keys]
+        return {"total": total, "offset": offset, "limit": limit, "tasks": tasks}
+
+    def _select(
+        self, sets: typing.List[typing.AbstractSet[str]], offset: int, limit: int
+    ) -> tuple:
+        """Gets a page of the keys in all sets and their total count.
+
+        Pages of frequent matches are taken from the keys in the board's order
+        until the page is full, rare matches are sorted.
+        """
+        order = self._order
+        if not sets:
+            return [key for _, key in order[offset : offset + limit]], len(order)
+        sets.sort(key=len)
+        found = sets[0].intersection(*sets[1:]) if len(sets) > 1 else sets[0]
+        if len(found) * 8 >= len(order):
+            keys = []
+            end = offset + limit
+            for _, key in order:
+                if key in found:
+                    keys.append(key)
+                    if len(keys) == end:
+                        break
+            return keys[offset:], len(found)
+        rank = self._rank
+        ranked = sorted(found, key=lambda k: (rank[k], k))
+        return ranked[offset : offset + limit], len(found)
+
+    def handle_query(self, params: typing.Mapping[str, str]) -> dict:
+        """Answers a query of the HTTP endpoint.
+
+        :param params: Query string parameters
+        :type params: dict
+        :return: page of tasks
+        :rtype: dict
+        :raises ValueError: if a parameter is invalid
+        """
+        filters = {}
+        for name in ("status", "category", "skill"):
+            if params.get(name):
+                filters[name] = params[name]
+        for name in ("due_after", "due_before"):
+            if params.get(name):
+                filters[name] = parse_deadline(params[name])
+                if filters[name] is None:
+                    raise ValueError(f"{name} is not a YYYY-MM-DD date")
+        return self.query(
+            offset=int(params.get("offset", 0)),
+            limit=int(params.get("limit", DEFAULT_LIMIT)),
+            **filters,
+        )
+
+    def handle_get(self, params: typing.Mapping[str, str]) -> dict:
+        """Answers a request for one task of the HTTP endpoint.
+
+        :param params: Query string parameters with ``authorperm``
+        :type params: dict
+        :return: task
+        :rtype: dict
+        :raises KeyError: if the task isn't on the board
+        """
+        task = self.get(params.get("authorperm", ""))
+        if task is None:
+            raise KeyError(params.get("authorperm"))
+        return task
+
+    def add_routes(self, server):
+        """Adds the task board endpoints to the metrics server.
+
+        :param server: Metrics server
+        :type server: metrics.MetricsServer
+        """
+        server.add_query("/tasks", self.handle_query)
+        server.add_query("/task", self.handle_get)
+
+    def flush(self):
+        """Saves the updated tasks."""
+        with self._lock:
+            conn = self._connect()
+            dirty = list(self._dirty.items())
+            self._dirty.clear()
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO tasks (board, authorperm, task) "
+                    "VALUES (?, ?, ?)",
+                    [(self.name, key, json.dumps(task)) for key, task in dirty],
+                )
+
+    def stats(self) -> dict:
+        """Returns the number of tasks per status.
+
+        :return: dictionary with statistics
+        :rtype: dict
+        """
+        with self._lock:
+            return {str(s).lower(): len(keys) for s, keys in self._by_status.items()}
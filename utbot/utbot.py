@@ -1,56 +1,191 @@
-import json
+import argparse
+import calendar
+import collections
+import datetime
 import logging
 import os
-import queue
-import time
-from collections import defaultdict
-from datetime import datetime, timedelta
-from queue import Queue
-from threading import Thread
+import signal
+import typing
+from concurrent.futures import Future
 
 import beem
-import requests
 from beem.blockchain import Blockchain
 from beem.comment import Comment
 
-from constants import (
-    ACCOUNT,
-    ACCOUNTS,
-    BOT_NAME,
-    CATEGORIES_PROPERTIES,
-    DISCORD_WEBHOOK_CONTRIBUTIONS,
-    DISCORD_WEBHOOK_TASKS,
-    MESSAGES,
-    STM,
-    TASKS_PROPERTIES,
-    UI_BASE_URL,
+from aio import (
+    AsyncBlockFetcher,
+    AsyncDiscordDelivery,
+    AsyncJsonFeed,
+    AsyncScheduler,
+    aiter_comment_ops,
 )
-from discord_webhook import DiscordEmbed, DiscordWebhook
+from cache import ContentCache
+from categories import CATEGORIES
+from checkpoint import Checkpoint, StateStore
+from coalesce import Coalescer
+from commands import command_action, merge_commands, parse_commands
+from constants import get_messages
+from content import find_reply, load_comment
+from coordination import Coordinator, SQLiteLeaseBackend
+from dedup import SeenStore, parse_utc_timestamp
+from delivery import DiscordDelivery
+from feed import JsonFeed
+from history import AccountHistoryPoller
+from ingest import BlockFetcher, SharedRanges, iter_comment_ops
+from metrics import MetricsServer
+from profiling import Profiling
+from ratelimit import Outbox, RateLimiter
+from records import CommentTask
+from render import render_contribution_embed, render_task_embed, render_task_summary
+from replay import DryRunSink, JsonLinesSink, replay_range
+from scheduler import Scheduler
+from settings import get_config, get_ingest_pool, get_node_pool, get_path, get_steem
+from taskboard import TaskBoard
 from utils import (
-    accounts_str_to_md_links,
-    build_bot_tr_message,
     build_comment_link,
-    build_steem_account_link,
     get_author_perm_from_url,
-    get_category,
-    infinite_loop,
     is_utopian_task_request,
-    parse_command,
-    replied_to_comment,
-    reply_message,
     setup_logger,
 )
+from workqueue import WorkQueue
+
+# Settings
+CONFIG = get_config()
+BOT_NAME = CONFIG["bot"]["name"]
+ACCOUNT = CONFIG["steem"]["account"]
+ACCOUNTS = CONFIG["steem"]["reviewers"]
+NODE_POOL_CONFIG = CONFIG["node_pool"]
+INGEST_CONFIG = CONFIG["ingest"]
+STREAM_CONFIG = CONFIG["stream"]
+CACHE_CONFIG = CONFIG["cache"]
+QUEUE_CONFIG = CONFIG["queue"]
+CONTRIBUTIONS_CONFIG = CONFIG["contributions"]
+FEED_CONFIG = CONFIG["feed"]
+TASKS_CONFIG = CONFIG["tasks"]
+OUTBOX_CONFIG = CONFIG["outbox"]
+DISCORD_CONFIG = CONFIG["discord"]
+ENGINE_CONFIG = CONFIG["engine"]
+METRICS_CONFIG = CONFIG["metrics"]
+PROFILING_CONFIG = CONFIG["profiling"]
+COORDINATION_CONFIG = CONFIG["coordination"]
+TASKBOARD_CONFIG = CONFIG["taskboard"]
+REPLICA_ID = COORDINATION_CONFIG["replica_id"]
+DISCORD_WEBHOOK_TASKS = CONFIG["discord"]["webhooks"]["tasks"]
+DISCORD_WEBHOOK_CONTRIBUTIONS = CONFIG["discord"]["webhooks"]["contributions"]
+
+
+def get_replica_path(name: str) -> str:
+    """Resolves a file name of the replica's own state.
+
+    Replicas keep their queues, checkpoints and seen contributions apart, the
+    replica id is added to the file name.
+
+    :param name: File name or path
+    :type name: str
+    :return: absolute path
+    :rtype: str
+    """
+    if REPLICA_ID:
+        root, ext = os.path.splitext(name)
+        name = f"{root}.{REPLICA_ID}{ext}"
+    return get_path(name)
+
+
+# Coordination of replicas, a single bot runs without it
+def create_coordinator() -> typing.Optional[Coordinator]:
+    if not REPLICA_ID:
+        return None
+    return Coordinator(
+        SQLiteLeaseBackend(get_path(COORDINATION_CONFIG["db"])),
+        REPLICA_ID,
+        lease_ttl=COORDINATION_CONFIG["lease_ttl"],
+        handoff_window=COORDINATION_CONFIG["handoff_window"],
+        vnodes=COORDINATION_CONFIG["vnodes"],
+    )
+
+
+COORDINATOR = create_coordinator()
+
+
+def create_shared_ranges() -> typing.Optional[SharedRanges]:
+    if COORDINATOR is None:
+        return None
+    return SharedRanges(
+        COORDINATOR,
+        ACCOUNTS,
+        lag=COORDINATION_CONFIG["backfill_lag"],
+        wait=COORDINATION_CONFIG["backfill_wait"],
+    )
+
+
+# Queues
+def create_work_queue(name: str) -> WorkQueue:
+    return WorkQueue(
+        get_replica_path(QUEUE_CONFIG["db"]),
+        name,
+        maxsize=QUEUE_CONFIG["maxsize"],
+        prefetch=QUEUE_CONFIG["prefetch"],
+        max_attempts=QUEUE_CONFIG["max_attempts"],
+        retry_delay=QUEUE_CONFIG["retry_delay"],
+    )
+
+
+QUEUE_COMMENTS = create_work_queue("comments")
 
-# Queue
-QUEUE_COMMENTS = Queue(maxsize=0)
+# Commands at the same task request are folded into one update
+TASK_UPDATES = Coalescer(
+    lambda root, update: update_task(root, *update),
+    lambda pending, update: merge_task_updates(pending, update),
+    TASKS_CONFIG["coalesce_window"],
+)
+
+# Task summaries skipped as unchanged, edited, posted and failed
+summary_writes = collections.Counter()
+
+# Outbound writes, paced per Steem account and Discord webhook
+RATE_LIMITER = RateLimiter()
+RATE_LIMITER.set_limit("steem", 1 / OUTBOX_CONFIG["steem_interval"])
+OUTBOX = Outbox(
+    RATE_LIMITER,
+    max_attempts=OUTBOX_CONFIG["max_attempts"],
+    backoff_base=OUTBOX_CONFIG["backoff_base"],
+    backoff_max=OUTBOX_CONFIG["backoff_max"],
+)
+
+# Discord delivery
+DISCORD = DiscordDelivery(RATE_LIMITER, max_attempts=DISCORD_CONFIG["max_attempts"])
+
+# Profiler and memory snapshots triggered by signals or admin endpoints
+PROFILING = Profiling(
+    get_path(PROFILING_CONFIG["dir"]),
+    interval=PROFILING_CONFIG["interval"],
+    frames=PROFILING_CONFIG["frames"],
+    top=PROFILING_CONFIG["top"],
+)
+
+# Cache of root posts and the bot's replies
+CONTENT_CACHE = ContentCache(
+    load_comment, find_reply, CACHE_CONFIG["maxsize"], CACHE_CONFIG["ttl"]
+)
+# State of the task requests served by the metrics server
+TASK_BOARD = TaskBoard(get_replica_path(STREAM_CONFIG["state_db"]))
 
 # Utopian Rocks
 UR_BASE_URL = "https://utopian.rocks"
 UR_BATCH_CONTRIBUTIONS_URL = "/".join([UR_BASE_URL, "api", "batch", "contributions"])
-UR_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
-queue_contributions = Queue(maxsize=0)
-seen_contributions = defaultdict(dict)
-DATETIME_UTC_NOW = datetime.utcnow()
+UR_CONTRIBUTIONS_FEED = JsonFeed(
+    UR_BATCH_CONTRIBUTIONS_URL,
+    min_interval=FEED_CONFIG["min_interval"],
+    max_interval=FEED_CONFIG["max_interval"],
+)
+queue_contributions = create_work_queue("contributions")
+# contributions reviewed again within 6 minutes are announced only once
+seen_contributions = SeenStore(
+    get_replica_path(STREAM_CONFIG["state_db"]),
+    "contributions",
+    ttl=CONTRIBUTIONS_CONFIG["seen_ttl"],
+    min_interval=360,
+)
 
 # Logger
 logger = logging.getLogger(__name__)
@@ -60,85 +195,25 @@ logger = logging.getLogger(__name__)
 ####################################
 
 
-def build_contribution_embed(contribution: dict):
-    color = 0
-    thumbnail_url = None
-    category = contribution.get("category")
-    if category:
-        color = int(CATEGORIES_PROPERTIES[category]["color"][1:], 16)
-        thumbnail_url = CATEGORIES_PROPERTIES[category]["image_url"]
-    embed = DiscordEmbed(title=contribution.get("title"))
-    embed.set_color(color=color)
-    embed.set_thumbnail(url=thumbnail_url)
-    author = contribution.get("author")
-    if author:
-        embed.set_author(
-            name=author,
-            url=build_steem_account_link(author),
-            icon_url=f"https://steemitimages.com/u/{author}/avatar",
-        )
-    if category:
-        category_text = category
-    else:
-        category_text = "Unknown"
-    embed.add_embed_field(name="Category", value=category_text.upper(), inline=True)
-    embed.add_embed_field(
-        name="Reviewer", value=contribution.get("moderator", "Unknown"), inline=True
-    )
-    embed.add_embed_field(
-        name="Score", value=str(contribution.get("score", "Unknown")), inline=True
-    )
-    staff_picked = "Yes" if contribution.get("staff_picked") is True else "No"
-    embed.add_embed_field(name="Picked by staff", value=staff_picked, inline=True)
-    embed.add_embed_field(
-        name="Created at", value=contribution.get("created", "Unknown"), inline=True
-    )
-    embed.add_embed_field(
-        name="Reviewed at",
-        value=contribution.get("review_date", "Unknown"),
-        inline=True,
-    )
-    logger.debug("%s", embed.__dict__)
-    return embed
-
+def process_reviewed_contributions(contr: dict) -> typing.Optional[Future]:
+    """Sends messages with Discord Webhook.
 
-def process_reviewed_contributions():
-    """Sends messages with Discord Webhook."""
-    try:
-        contr = queue_contributions.get_nowait()
-        logger.debug("%s", contr)
-    except queue.Empty:
+    :param contr: Reviewed contribution from utopian.rocks
+    :type contr: dict
+    :return: future of the delivery or None if another replica sends it
+    :rtype: concurrent.futures.Future
+    """
+    key = "@" + "/".join(get_author_perm_from_url(contr["url"]))
+    done_key = "contribution:" + key
+    if not owned_here(key, process_reviewed_contributions, contr, done_key):
+        logger.debug("Contribution owned by another replica. %s", contr["url"])
         return
-
     logger.debug("%s", contr)
     body = f"<{contr['url']}>"
-    embeds = [build_contribution_embed(contr)]
-    send_message_to_discord(DISCORD_WEBHOOK_CONTRIBUTIONS, body, embeds)
-    queue_contributions.task_done()
-
-
-def fetch_to_vote_contributions(session, url: str, retry: int = 3):
-    """Fetches reviewed contributions from utopian.rocks that will be voted.
-    \
-    :param session: Requests session
-    :type session:
-    :param url: utopian.rocks url for contributions
-    :type url: str
-    :param retry: Number of tries
-    :type retry: int
-    :return: Response from utopian.rocks
-    :rtype:
-    """
-    while retry > 0:
-        logger.info("Fetching contributions %s", url)
-        resp = session.get(url)
-        if resp.status_code != 200:
-            retry -= 1
-            time.sleep(10)
-            continue
-        logger.debug("%s", resp.json())
-        return resp.json()
-    return None
+    embeds = [render_contribution_embed(contr)]
+    return record_done(
+        send_message_to_discord(DISCORD_WEBHOOK_CONTRIBUTIONS, body, embeds), done_key
+    )
 
 
 def filter_contributions(contributions: list) -> list:
@@ -149,38 +224,36 @@ def filter_contributions(contributions: list) -> list:
     :return: list of filtered contributions
     :rtype: list
     """
-    tasks = set(TASKS_PROPERTIES.keys())
-    filtered = []
-    for c in contributions:
-        author, permlink = get_author_perm_from_url(c["url"])
-        review_date = datetime.strptime(c["review_date"], UR_DATE_FORMAT)
-        elapsed_time = (
-            seen_contributions[author].get(permlink, DATETIME_UTC_NOW)
-            + timedelta(minutes=6)
-            < review_date
+    candidates = [c for c in contributions if not CATEGORIES.is_task(c["category"])]
+    is_new = seen_contributions.mark_many(
+        (
+            "/".join(get_author_perm_from_url(c["url"])),
+            parse_utc_timestamp(c["review_date"]),
         )
-        if elapsed_time and c["category"] not in tasks:
-            filtered.append(c)
-            seen_contributions[author][permlink] = review_date
+        for c in candidates
+    )
+    filtered = [c for c, new in zip(candidates, is_new) if new]
     logger.debug("Contributions: %s", filtered)
     return filtered
 
 
-def put_contributions_to_queue():
-    """Puts new reviewed contributions to a queue for processing."""
-    with requests.Session() as session:
-        contributions = fetch_to_vote_contributions(session, UR_BATCH_CONTRIBUTIONS_URL)
-        logger.info("Fetched %d contributions from utopian.rocks", len(contributions))
-        logger.debug(contributions)
-        if not contributions:
-            return
-    if isinstance(contributions, str):
-        contributions = json.loads(contributions)
+def put_contributions_to_queue(contributions: list) -> int:
+    """Puts new reviewed contributions to a queue for processing.
+
+    :param contributions: Reviewed contributions from utopian.rocks
+    :type contributions: list
+    :return: Number of new contributions
+    :rtype: int
+    """
+    logger.info("Fetched %d contributions from utopian.rocks", len(contributions))
+    logger.debug(contributions)
     contributions = filter_contributions(contributions)
     logger.info("%d new contributions", len(contributions))
     for c in contributions:
         logger.debug("Adding to queue: %s", c)
-        queue_contributions.put_nowait(c)
+        queue_contributions.put(c, key=f'{c["url"]}@{c["review_date"]}')
+    seen_contributions.flush()
+    return len(contributions)
 
 
 #############################################
@@ -188,215 +261,453 @@ def put_contributions_to_queue():
 #############################################
 
 
-def build_discord_tr_embed(comment: dict, cmds_args: dict) -> DiscordEmbed:
-    """Creates a Discord embed for a Utopian task request.
+def listen_blockchain_ops(op_names: list, checkpoint: Checkpoint):
+    """Listens to Steem blockchain and yields specified operations.
+
+    The stream resumes after the last fully processed block stored in the
+    checkpoint. While it is far behind the head block, the missed range is
+    replayed with batched block requests before switching to live streaming.
 
-    :param comment: Steem root post with task request
-    :type comment: dict
-    :param cmds_args: Parsed bot commands and arguments
-    :type cmds_args: dict
+    :param op_names: List of operations to yield
+    :type op_names: list
+    :param checkpoint: Checkpoint of the last fully processed block
+    :type checkpoint: Checkpoint
     """
-    category = get_category(comment, TASKS_PROPERTIES)
-    color = 0
-    type_ = None
-    thumbnail = None
-    if category is not None:
-        color = int(TASKS_PROPERTIES[category]["color"][1:], 16)
-        type_ = TASKS_PROPERTIES[category]["category"]
-        thumbnail = TASKS_PROPERTIES[category]["image_url"]
-
-    title = f'{comment["title"]}'
-    description = None
-    if cmds_args.get("description"):
-        description = cmds_args["description"]
-    embed = DiscordEmbed(title=title, description=description)
-    author = comment["author"]
-    embed.set_author(
-        name=author,
-        url=f"{UI_BASE_URL}/@{author}",
-        icon_url=f"https://steemitimages.com/u/{author}/avatar",
-    )
-    embed.set_color(color)
-    embed.set_footer(text="Verified by Utopian.io team")
-    embed.set_thumbnail(url=thumbnail)
-    embed.set_timestamp()
+    bc = Blockchain(mode="head")
+    head = bc.get_current_block_num()
+    start = head if checkpoint.position is None else checkpoint.position + 1
+    while head - start > STREAM_CONFIG["catchup_threshold"]:
+        logger.info("Catching up from block %d to %d", start, head)
+        yield from stream_block_range(
+            bc,
+            op_names,
+            checkpoint,
+            start,
+            stop=head,
+            max_batch_size=STREAM_CONFIG["catchup_batch_size"],
+        )
+        start = head + 1
+        head = bc.get_current_block_num()
+    logger.info("Streaming from block %d", start)
+    yield from stream_block_range(bc, op_names, checkpoint, start, threading=True)
+
+
+def stream_block_range(
+    bc: Blockchain,
+    op_names: list,
+    checkpoint: Checkpoint,
+    start: int,
+    stop: int = None,
+    **kwargs,
+):
+    """Yields operations from a block range and advances the checkpoint.
 
-    if type_ is not None:
-        embed.add_embed_field(name="Task Type", value=type_.upper(), inline=True)
+    A block counts as processed once the consumer asks for an operation from a
+    later block.
 
-    status = None
-    if cmds_args.get("status") is not None:
-        status = cmds_args["status"]
-        embed.add_embed_field(name="Status", value=status.upper(), inline=True)
+    :param bc: Blockchain instance
+    :type bc: Blockchain
+    :param op_names: List of operations to yield
+    :type op_names: list
+    :param checkpoint: Checkpoint of the last fully processed block
+    :type checkpoint: Checkpoint
+    :param start: First block of the range
+    :type start: int
+    :param stop: Last block of the range, streams forever if None
+    :type stop: int
+    :param kwargs: Additional arguments for Blockchain.stream
+    """
+    for op in bc.stream(opNames=op_names, start=start, stop=stop, **kwargs):
+        if op["block_num"] > start:
+            checkpoint.advance(op["block_num"] - 1)
+            start = op["block_num"]
+        yield op
+    if stop is not None:
+        checkpoint.advance(stop)
+        checkpoint.flush()
 
-    if status and status.upper() == "CLOSED":
-        return embed
 
-    if cmds_args.get("skills"):
-        skills = ", ".join(cmds_args["skills"])
-        embed.add_embed_field(name="Required skills", value=skills, inline=True)
+def stream_comment_ops(checkpoint: Checkpoint):
+    """Yields reply comments of reviewers from the beem block stream.
 
-    if cmds_args.get("discord"):
-        embed.add_embed_field(
-            name="Discord", value=f'{cmds_args["discord"]}', inline=True
-        )
+    :param checkpoint: Checkpoint of the last fully processed block
+    :type checkpoint: Checkpoint
+    """
+    for comment_op in listen_blockchain_ops(["comment"], checkpoint):
+        if comment_op["parent_author"] and comment_op["author"] in ACCOUNTS:
+            yield comment_op
 
-    if cmds_args.get("bounty"):
-        bounty = ", ".join(cmds_args["bounty"])
+
+def fetch_comment_ops(checkpoint: Checkpoint):
+    """Yields reply comments of reviewers from blocks fetched in parallel.
+
+    :param checkpoint: Checkpoint of the last fully processed block
+    :type checkpoint: Checkpoint
+    """
+    fetcher = BlockFetcher(
+        get_ingest_pool(),
+        workers=INGEST_CONFIG["workers"],
+        range_size=INGEST_CONFIG["range_size"],
+        report_interval=INGEST_CONFIG["report_interval"],
+        share=create_shared_ranges(),
+    )
+    if checkpoint.position is None:
+        start = fetcher.get_head_block_num()
     else:
-        bounty = "See the task details"
-    embed.add_embed_field(name="Bounty", value=bounty, inline=True)
+        start = checkpoint.position + 1
+    logger.info("Fetching blocks from %d", start)
+    yield from iter_comment_ops(fetcher, start, ACCOUNTS, checkpoint)
 
-    deadline = cmds_args.get("deadline")
-    if not deadline:
-        deadline = "Not specified"
-    embed.add_embed_field(name="Due date", value=deadline, inline=True)
 
-    is_in_progress = status and status.upper() == "IN PROGRESS"
-    if is_in_progress and cmds_args.get("assignees"):
-        assignees = ", ".join([f"@{a}" for a in cmds_args["assignees"]])
-        assignees_links = accounts_str_to_md_links(assignees)
-        embed.add_embed_field(name="Assignees", value=assignees_links, inline=False)
+def listen_blockchain_comments(checkpoint: Checkpoint):
+    """Listens to blockchain for comments by specified accounts at
+    Utopian task request posts and put them to a queue.
 
-    if cmds_args.get("note") is not None:
-        embed.add_embed_field(name="Misc", value=f'{cmds_args["note"]}', inline=False)
+    :param checkpoint: Checkpoint of the last fully processed block
+    :type checkpoint: Checkpoint
+    """
+    if INGEST_CONFIG["mode"] == "stream":
+        comment_ops = stream_comment_ops(checkpoint)
+    else:
+        comment_ops = fetch_comment_ops(checkpoint)
+    for comment_op in comment_ops:
+        enqueue_comment_op(comment_op)
 
-    return embed
 
+async def listen_blockchain_comments_async(
+    scheduler: AsyncScheduler, checkpoint: Checkpoint
+):
+    """Fetches blocks on the event loop and puts comments by specified accounts
+    at Utopian task requests to a queue.
 
-def listen_blockchain_ops(op_names: list):
-    """Listens to Steem blockchain and yields specified operations.
+    The comments are loaded and queued one by one in the scheduler's thread
+    pool, so they keep their order in the queue.
 
-    :param op_names: List of operations to yield
-    :type op_names: list
+    :param scheduler: Scheduler of the asyncio engine
+    :type scheduler: AsyncScheduler
+    :param checkpoint: Checkpoint of the last fully processed block
+    :type checkpoint: Checkpoint
     """
-    bc = Blockchain(mode="head")
-    block_num = bc.get_current_block_num()
-    for op in bc.stream(opNames=op_names, start=block_num, threading=True):
-        yield op
+    fetcher = AsyncBlockFetcher(
+        get_ingest_pool(),
+        scheduler,
+        workers=INGEST_CONFIG["workers"],
+        range_size=INGEST_CONFIG["range_size"],
+        report_interval=INGEST_CONFIG["report_interval"],
+        share=create_shared_ranges(),
+    )
+    if checkpoint.position is None:
+        start = await fetcher.get_head_block_num()
+    else:
+        start = checkpoint.position + 1
+    logger.info("Fetching blocks from %d", start)
+    async for comment_op in aiter_comment_ops(fetcher, start, ACCOUNTS, checkpoint):
+        await scheduler.run_blocking(enqueue_comment_op, comment_op)
 
 
-def listen_blockchain_comments():
-    """Listens to blockchain for comments by specified accounts at
-    Utopian task request posts and put them to a queue.
+def poll_reviewer_histories(poller: AccountHistoryPoller):
+    """Puts new reviewer comments found in account histories to the comments queue.
 
+    :param poller: Account history poller
+    :type poller: AccountHistoryPoller
     """
-    for comment_op in listen_blockchain_ops(["comment"]):
-        if not comment_op["parent_author"] or comment_op["author"] not in ACCOUNTS:
-            continue
-        try:
-            comment = Comment(f'@{comment_op["author"]}/{comment_op["permlink"]}')
-        except beem.exceptions.ContentDoesNotExistsException:
-            logger.info(
-                "Comment does not exist. %s",
-                f'@{comment_op["author"]}/{comment_op["permlink"]}',
-            )
-        except:
-            logger.exception("Error while fetching comment")
-        else:
-            root = comment.get_parent()
-            logger.debug("%s, %s", comment["url"], root["url"])
-            if is_utopian_task_request(root):
-                logger.info(
-                    "Added to comments queue - %s %s", comment["url"], root["url"]
-                )
-                QUEUE_COMMENTS.put_nowait((comment, root))
+    found = poller.poll(enqueue_comment_op)
+    logger.debug("%d new reviewer comments in account histories", found)
+
 
+def enqueue_comment_op(comment_op: dict):
+    """Puts a reviewer comment at a Utopian task request to the comments queue.
 
-def process_cmd_comments():
+    Blocks while the queue is full. The operation's block and the comment are
+    used as the idempotency key, so an operation read again after a restart is
+    not processed twice.
+
+    :param comment_op: Comment operation
+    :type comment_op: dict
+    """
+    authorperm = f'@{comment_op["author"]}/{comment_op["permlink"]}'
     try:
-        queue_item = QUEUE_COMMENTS.get_nowait()
-    except queue.Empty:
+        comment = load_comment(authorperm)
+        root = CONTENT_CACHE.get_root(comment)
+        is_task_request = is_utopian_task_request(root)
+    except beem.exceptions.ContentDoesNotExistsException:
+        logger.info("Comment does not exist. %s", authorperm)
+        return
+    except Exception:
+        logger.exception("Error while fetching comment %s", authorperm)
         return
+    logger.debug("%s, %s", comment["url"], root["url"])
+    if is_task_request:
+        task = CommentTask.from_comment(
+            comment, root.authorperm, get_block_time(comment_op)
+        )
+        key = f'{comment_op["block_num"]}:{comment.authorperm}'
+        if QUEUE_COMMENTS.put(task.to_payload(), key=key):
+            logger.info("Added to comments queue - %s %s", comment["url"], root["url"])
+        else:
+            logger.info("Comment already queued - %s", comment["url"])
+
 
-    comment: Comment = queue_item[0]
+def process_cmd_comments(queue_item: list) -> typing.Optional[Future]:
+    """Processes bot commands of a reviewer comment.
+
+    Several bot calls in one comment are merged, later arguments take
+    precedence. Help and missing status replies are sent right away, task
+    commands are passed to the coalescer of their task request. The full
+    comment is loaded only when the bot replies to it. Every replica passes
+    task commands on to keep its task board, only replies are skipped if
+    another replica owns the task request.
+
+    :param queue_item: Payload of a CommentTask
+    :type queue_item: list
+    :return: future of the reply or the task update, None if nothing is sent
+    :rtype: concurrent.futures.Future
+    """
+    comment = CommentTask.from_payload(queue_item)
     cmd_str = comment["body"]
     logger.debug(cmd_str)
-    parsed_cmd = parse_command(cmd_str)
-    if parsed_cmd is None:
-        logger.info("No command found in %s", comment["url"])
-        QUEUE_COMMENTS.task_done()
+    commands = parse_commands(cmd_str)
+    logger.info("%d commands parsed. %s", len(commands), commands)
+    parsed_cmd = merge_commands(commands)
+    action = command_action(parsed_cmd, comment["author"], ACCOUNT)
+    if action is None:
+        logger.info("No command to answer in %s", comment["url"])
         return
-    if parsed_cmd["help"] is not None and comment["author"] != ACCOUNT:
-        if not replied_to_comment(comment, ACCOUNT):
-            if reply_message(comment, MESSAGES["HELP"], ACCOUNT):
-                logger.info("Help message replied to %s", comment["url"])
-            else:
-                logger.info("Couldn't reply to %s", comment["url"])
+    done_key = "reply:" + comment.authorperm
+    if action != "task" and not owned_here(
+        comment.root, process_cmd_comments, queue_item, done_key
+    ):
+        logger.debug("Task owned by another replica. %s", comment.root)
+        return
+    if action == "help":
+        if not CONTENT_CACHE.replied_to_comment(comment, ACCOUNT):
+            return record_done(
+                reply_to_comment(comment, get_messages()["HELP"], "Help message"),
+                done_key,
+            )
         else:
             logger.info("Already replied with help command to %s", comment["url"])
-        QUEUE_COMMENTS.task_done()
         return
-    if parsed_cmd["help"] is None and parsed_cmd.get("status") is None:
-        if len(
-            [x for x in parsed_cmd if parsed_cmd[x] is not None]
-        ) > 1 and not replied_to_comment(comment, ACCOUNT):
-            if reply_message(comment, MESSAGES["STATUS_MISSING"], ACCOUNT):
-                logger.info(
-                    "Missing status parameter message sent to %s", comment["url"]
-                )
-            else:
-                logger.info("Couldn't reply to %s", comment["url"])
-        QUEUE_COMMENTS.task_done()
+    if action == "status_missing":
+        if not CONTENT_CACHE.replied_to_comment(comment, ACCOUNT):
+            return record_done(
+                reply_to_comment(
+                    comment,
+                    get_messages()["STATUS_MISSING"],
+                    "Missing status parameter message",
+                ),
+                done_key,
+            )
         return
-    root_comment = queue_item[1]
-    category = get_category(root_comment, TASKS_PROPERTIES)
-    if category is None:
+    return TASK_UPDATES.submit(
+        comment.root, (parsed_cmd, comment.block_time, comment.block_time)
+    )
+
+
+def merge_task_updates(pending: tuple, update: tuple) -> tuple:
+    """Merges two ``(parsed_cmd, block_time, last_block_time)`` task updates.
+
+    The newer command replaces the pending one, as if both were processed one
+    after the other: a command sets the whole state of the task, so an argument
+    it leaves out is cleared. The merged update keeps the earliest block time,
+    so the end-to-end latency of a folded update is measured from its first
+    command, and the latest one, which marks the commands it covers as done for
+    the other replicas.
+
+    :param pending: Update waiting in the coalescer
+    :type pending: tuple
+    :param update: Newer update
+    :type update: tuple
+    :return: merged update
+    :rtype: tuple
+    """
+    firsts = [t for t in (pending[1], update[1]) if t is not None]
+    lasts = [t for t in (pending[2], update[2]) if t is not None]
+    return (
+        update[0],
+        min(firsts) if firsts else None,
+        max(lasts) if lasts else None,
+    )
+
+
+def reply_to_comment(comment: CommentTask, message: str, name: str) -> Future:
+    """Replies to a reviewer comment through the outbox.
+
+    :param comment: Reviewer comment
+    :type comment: CommentTask
+    :param message: Message content
+    :type message: str
+    :param name: Name of the message for the log
+    :type name: str
+    :return: future of the reply
+    :rtype: concurrent.futures.Future
+    """
+
+    def write():
+        return load_comment(comment.authorperm).reply(body=message, author=ACCOUNT)
+
+    def done(future: Future):
+        if future.exception() is None:
+            CONTENT_CACHE.invalidate_reply(comment.authorperm, ACCOUNT)
+            logger.info("%s replied to %s", name, comment["url"])
+        else:
+            logger.info("Couldn't reply to %s", comment["url"])
+
+    # beem raises ValueError without a posting account
+    future = OUTBOX.submit(
+        ("steem", ACCOUNT), write, fatal=(ValueError,), name=f"Reply to {comment.url}"
+    )
+    future.add_done_callback(done)
+    return future
+
+
+def update_task(
+    root_authorperm: str,
+    parsed_cmd: dict,
+    block_time: int = None,
+    last_block_time: int = None,
+) -> typing.Optional[Future]:
+    """Updates the bot's summary and the Discord board with a task command.
+
+    Called by the coalescer with the commands issued at a task request within
+    its window merged into one.
+
+    :param root_authorperm: ``@author/permlink`` of the task request
+    :type root_authorperm: str
+    :param parsed_cmd: Parsed bot commands and arguments
+    :type parsed_cmd: dict
+    :param block_time: Epoch seconds of the block with the first command
+    :type block_time: int
+    :param last_block_time: Epoch seconds of the block with the last command
+    :type last_block_time: int
+    :return: future of the last write or None if nothing is sent
+    :rtype: concurrent.futures.Future
+    """
+    try:
+        root_comment: Comment = CONTENT_CACHE.get(root_authorperm)
+    except beem.exceptions.ContentDoesNotExistsException:
+        logger.info("Root post does not exist anymore. %s", root_authorperm)
+        return
+    if CATEGORIES.classify(root_comment["tags"]).task is None:
         logger.info("No valid category found. %s", root_comment["url"])
-        QUEUE_COMMENTS.task_done()
+        return
+    if not TASK_BOARD.update(root_comment, parsed_cmd, block_time):
+        logger.info("Board has a newer state, skipping. %s", root_comment["url"])
+        return
+    # updates without a block time can't be told apart, they are not marked
+    done_key = "task:" + root_authorperm if last_block_time is not None else None
+    if not owned_here(
+        root_authorperm,
+        lambda update: update_task(*update),
+        (root_authorperm, parsed_cmd, block_time, last_block_time),
+        done_key,
+        last_block_time,
+    ):
+        logger.debug("Task owned by another replica. %s", root_authorperm)
         return
 
+    reply = None
     if ACCOUNT:
-        reply = replied_to_comment(root_comment, ACCOUNT)
-        send_summary_to_steem(parsed_cmd, reply, root_comment)
-
+        reply = CONTENT_CACHE.replied_to_comment(root_comment, ACCOUNT)
+        if not summary_changed(reply, parsed_cmd):
+            summary_writes["skipped"] += 1
+            logger.info("Task didn't change, skipping. %s", root_comment["url"])
+            return None
+
+    # the summary is written after the Discord message, so a retry after a
+    # failed delivery finds it unchanged and sends both again
+    delivery = None
     if DISCORD_WEBHOOK_TASKS:
         content = (
             f'[{parsed_cmd["status"].upper()}] <{build_comment_link(root_comment)}>'
         )
-        embeds = [build_discord_tr_embed(root_comment, parsed_cmd)]
-        send_message_to_discord(DISCORD_WEBHOOK_TASKS, content, embeds)
-    QUEUE_COMMENTS.task_done()
+        embeds = [render_task_embed(root_comment, parsed_cmd)]
+        delivery = send_message_to_discord(
+            DISCORD_WEBHOOK_TASKS, content, embeds, origin=block_time
+        )
+    if ACCOUNT:
+        write = send_summary_to_steem(parsed_cmd, reply, root_comment, after=delivery)
+    else:
+        write = delivery
+    if done_key is not None:
+        record_done(write, done_key, last_block_time)
+    return write
+
+
+def summary_changed(reply: typing.Optional[Comment], parsed_cmd: dict) -> bool:
+    """Checks whether a command changes the arguments kept in the bot's reply.
+
+    :param reply: Existing reply of the bot or None
+    :type reply: Comment
+    :param parsed_cmd: Parsed bot commands and arguments
+    :type parsed_cmd: dict
+    :rtype: bool
+    """
+    if not reply:
+        return True
+    bot: dict = reply.json_metadata.get(BOT_NAME, {})
+    return dict(bot, **parsed_cmd) != bot
 
 
 def send_summary_to_steem(
-    parsed_cmd: dict, reply: Comment, root_comment: Comment, retry: int = 3
-):
-    while retry > 0:
-        if reply:
-            bot: dict = reply.json_metadata.get(BOT_NAME, {})
-            bot.update(parsed_cmd)
-            try:
-                resp = reply.edit(
-                    body=build_bot_tr_message(parsed_cmd),
-                    meta={BOT_NAME: bot},
-                    replace=True,
-                )
-            except:
-                logger.info("Can't submit a comment to %s", root_comment["url"])
-                logger.exception("Something went wrong.")
-                retry -= 1
-            else:
-                logger.info("Comment successfully updated at %s", root_comment["url"])
-                logger.debug(resp)
-                break
+    parsed_cmd: dict, reply: Comment, root_comment: Comment, after: Future = None
+) -> Future:
+    """Posts the bot's summary of a task request or updates its existing reply.
+
+    Callers skip commands that don't change the summary, see
+    :func:`summary_changed`. The write goes through the outbox, which paces
+    and retries it.
+
+    :param parsed_cmd: Parsed bot commands and arguments
+    :type parsed_cmd: dict
+    :param reply: Existing reply of the bot or None
+    :type reply: Comment
+    :param root_comment: Steem root post with task request
+    :type root_comment: Comment
+    :param after: Future of a write that has to succeed first
+    :type after: concurrent.futures.Future
+    :return: future of the write
+    :rtype: concurrent.futures.Future
+    """
+    body = render_task_summary(parsed_cmd)
+    if reply:
+        merged = dict(reply.json_metadata.get(BOT_NAME, {}), **parsed_cmd)
+        action = "edited"
+
+        def write():
+            return reply.edit(body=body, meta={BOT_NAME: merged}, replace=True)
+
+    else:
+        action = "posted"
+
+        def write():
+            return get_steem().post(
+                body=body,
+                author=ACCOUNT,
+                title="",
+                reply_identifier=root_comment.authorperm,
+                json_metadata={BOT_NAME: parsed_cmd},
+            )
+
+    def done(future: Future):
+        if future.exception() is None:
+            CONTENT_CACHE.invalidate_reply(root_comment.authorperm, ACCOUNT)
+            summary_writes[action] += 1
+            logger.info("Comment successfully %s at %s", action, root_comment["url"])
+            logger.debug(future.result())
         else:
-            try:
-                resp = STM.post(
-                    body=build_bot_tr_message(parsed_cmd),
-                    author=ACCOUNT,
-                    title="",
-                    reply_identifier=root_comment.authorperm,
-                    json_metadata={BOT_NAME: parsed_cmd},
-                )
-            except:
-                logger.info("Can't submit a comment to %s", root_comment["url"])
-                logger.exception("Something went wrong.")
-                retry -= 1
-            else:
-                logger.info("Comment successfully sent to %s", root_comment["url"])
-                logger.debug(resp)
-                break
+            summary_writes["failed"] += 1
+            logger.info("Can't submit a comment to %s", root_comment["url"])
+
+    future = OUTBOX.submit(
+        ("steem", ACCOUNT),
+        write,
+        fatal=(ValueError,),
+        name=f"Summary at {root_comment['url']}",
+        after=after,
+    )
+    future.add_done_callback(done)
+    return future
 
 
 ################################
@@ -404,33 +715,308 @@ def send_summary_to_steem(
 ################################
 
 
-def send_message_to_discord(webhook_url: str, content: str, embeds: list):
-    webhook = DiscordWebhook(url=webhook_url, content=content)
-    for embed in embeds:
-        webhook.add_embed(embed)
-    logger.debug(webhook.__dict__)
-    webhook.execute()
+def owned_here(
+    key: str,
+    handler: typing.Callable,
+    payload,
+    done_key: str = None,
+    version: float = 0,
+) -> bool:
+    """Checks whether this replica processes an item.
+
+    Items of other replicas are held by the coordinator in case their owner
+    fails and the key moves here. Held items marked done by their owner with
+    :func:`record_done` aren't processed again.
+
+    :param key: ``@author/permlink`` of the root post
+    :type key: str
+    :param handler: Function processing the item
+    :param payload: Argument of the handler
+    :param done_key: Idempotency key of the item
+    :type done_key: str
+    :param version: Version of the item, e.g. the time of its last command
+    :type version: float
+    :rtype: bool
+    """
+    if COORDINATOR is None or COORDINATOR.owns(key):
+        return True
+    COORDINATOR.hold(key, handler, payload, done_key, version)
+    return False
+
+
+def record_done(
+    future: typing.Optional[Future], done_key: str, version: float = 0
+) -> typing.Optional[Future]:
+    """Marks an item done for the other replicas once its write succeeds.
+
+    :param future: Future of the item's write or None
+    :type future: concurrent.futures.Future
+    :param done_key: Idempotency key of the item
+    :type done_key: str
+    :param version: Version of the item
+    :type version: float
+    :return: the future
+    :rtype: concurrent.futures.Future
+    """
+    if COORDINATOR is None or future is None:
+        return future
+
+    def done(write: Future):
+        if not write.cancelled() and write.exception() is None:
+            COORDINATOR.mark_done(done_key, version)
+
+    future.add_done_callback(done)
+    return future
+
+
+def send_message_to_discord(
+    webhook_url: str, content: str, embeds: list, origin: float = None
+) -> Future:
+    logger.debug("%s %s", content, embeds)
+    return DISCORD.send(webhook_url, content, embeds, origin)
+
+
+def get_block_time(op: dict) -> typing.Optional[int]:
+    """Gets the time of the block with an operation.
+
+    Raw blocks and account histories carry the timestamp as a string, beem's
+    block stream as a datetime.
+
+    :param op: Operation
+    :type op: dict
+    :return: epoch seconds or None if the operation has no timestamp
+    :rtype: int
+    """
+    timestamp = op.get("timestamp")
+    if isinstance(timestamp, str):
+        return parse_utc_timestamp(timestamp)
+    if isinstance(timestamp, datetime.datetime):
+        return calendar.timegm(timestamp.utctimetuple())
+    return None
+
+
+def log_cache_stats():
+    logger.info("Content cache: %s", CONTENT_CACHE.stats())
+
+
+def log_discord_stats():
+    logger.info("Discord delivery: %s", DISCORD.stats())
+
+
+def log_feed_stats():
+    logger.info("utopian.rocks feed: %s", UR_CONTRIBUTIONS_FEED.stats())
 
 
-def background():
-    Thread(target=listen_blockchain_comments, daemon=True).start()
-    Thread(target=infinite_loop, args=(process_cmd_comments, 1), daemon=True).start()
+def log_queue_stats():
+    logger.info(
+        "Queues: comments %s, contributions %s",
+        QUEUE_COMMENTS.stats(),
+        queue_contributions.stats(),
+    )
+
+
+def purge_queues():
+    for work_queue in (QUEUE_COMMENTS, queue_contributions):
+        purged = work_queue.purge(QUEUE_CONFIG["retention"])
+        logger.debug("Purged %d finished %s items", purged, work_queue.name)
+
+
+def log_summary_stats():
+    logger.info(
+        "Task summaries: %s, commands: %s, board: %s, outbox: %s",
+        dict(summary_writes),
+        TASK_UPDATES.stats(),
+        TASK_BOARD.stats(),
+        OUTBOX.stats(),
+    )
+
+
+def log_coordination_stats():
+    logger.info("Replica %s: %s", REPLICA_ID, COORDINATOR.stats())
+
+
+def log_node_stats():
+    pool = get_node_pool()
+    logger.info("Nodes (%d hedged requests): %s", pool.hedged, pool.stats())
+
+
+def create_scheduler() -> typing.Union[Scheduler, AsyncScheduler]:
+    """Creates the scheduler of the engine selected in the configuration.
+
+    The asyncio engine replaces the Discord delivery and the utopian.rocks feed
+    with their async counterparts.
+
+    :return: scheduler
+    """
+    global DISCORD, UR_CONTRIBUTIONS_FEED
+    if ENGINE_CONFIG["mode"] != "asyncio":
+        return Scheduler()
+    scheduler = AsyncScheduler(
+        executor_workers=ENGINE_CONFIG["executor_workers"],
+        http_connections=ENGINE_CONFIG["http_connections"],
+    )
+    DISCORD = AsyncDiscordDelivery(
+        scheduler, RATE_LIMITER, max_attempts=DISCORD_CONFIG["max_attempts"]
+    )
+    UR_CONTRIBUTIONS_FEED = AsyncJsonFeed(
+        UR_BATCH_CONTRIBUTIONS_URL,
+        scheduler,
+        min_interval=FEED_CONFIG["min_interval"],
+        max_interval=FEED_CONFIG["max_interval"],
+    )
+    logger.info("Using the asyncio engine")
+    return scheduler
+
+
+def start_metrics_server(scheduler: typing.Union[Scheduler, AsyncScheduler]):
+    server = MetricsServer((METRICS_CONFIG["host"], METRICS_CONFIG["port"]))
+    if PROFILING_CONFIG["admin"]:
+        PROFILING.add_actions(server)
+    TASK_BOARD.add_routes(server)
+    logger.info("Serving metrics at %s:%d", *server.server_address[:2])
+    scheduler.spawn(server.serve_forever, name="metrics")
+    scheduler.on_stop(server.stop)
+
+
+def background(scheduler: typing.Union[Scheduler, AsyncScheduler]):
+    get_steem()
+    TASK_BOARD.load()
+    scheduler.every(TASKBOARD_CONFIG["flush_interval"], TASK_BOARD.flush)
+    if METRICS_CONFIG["port"]:
+        start_metrics_server(scheduler)
+    if COORDINATOR is not None:
+        COORDINATOR.heartbeat()
+        COORDINATOR.start(
+            scheduler.spawn,
+            scheduler.shutdown,
+            COORDINATION_CONFIG["heartbeat_interval"],
+            scheduler.call_later,
+        )
+        scheduler.every(COORDINATION_CONFIG["stats_interval"], log_coordination_stats)
+    state = StateStore(get_replica_path(STREAM_CONFIG["state_db"]))
+    if INGEST_CONFIG["mode"] == "history":
+        poller = AccountHistoryPoller(
+            get_ingest_pool(),
+            ACCOUNTS,
+            state,
+            page_size=INGEST_CONFIG["history_page_size"],
+        )
+        scheduler.every(
+            INGEST_CONFIG["history_poll_interval"], poll_reviewer_histories, poller
+        )
+    else:
+        checkpoint = Checkpoint(
+            state, "blocks", commit_every=STREAM_CONFIG["checkpoint_every"]
+        )
+        scheduler.on_stop(checkpoint.flush)
+        if isinstance(scheduler, AsyncScheduler) and INGEST_CONFIG["mode"] == "blocks":
+            scheduler.spawn(
+                listen_blockchain_comments_async,
+                scheduler,
+                checkpoint,
+                name="listen-comments",
+            )
+        else:
+            scheduler.spawn(
+                listen_blockchain_comments, checkpoint, name="listen-comments"
+            )
+    OUTBOX.start(scheduler.call_later)
+    TASK_UPDATES.start(scheduler.call_later)
+    # pending task updates are written before the leases are released and the
+    # board is saved, jobs whose writes don't finish are processed again
+    scheduler.on_stop(TASK_UPDATES.flush_all)
+    scheduler.on_stop(OUTBOX.drain, OUTBOX_CONFIG["drain_timeout"])
+    scheduler.on_stop(TASK_BOARD.flush)
+    if COORDINATOR is not None:
+        scheduler.on_stop(COORDINATOR.stop)
+    scheduler.consume_jobs(
+        QUEUE_COMMENTS, process_cmd_comments, workers=ENGINE_CONFIG["comment_workers"]
+    )
+    scheduler.every(QUEUE_CONFIG["stats_interval"], log_queue_stats)
+    scheduler.every(QUEUE_CONFIG["purge_interval"], purge_queues)
+    scheduler.every(QUEUE_CONFIG["stats_interval"], log_summary_stats)
+    scheduler.every(CACHE_CONFIG["stats_interval"], log_cache_stats)
+    scheduler.every(NODE_POOL_CONFIG["probe_interval"], get_node_pool().probe)
+    scheduler.every(NODE_POOL_CONFIG["stats_interval"], log_node_stats)
+    DISCORD.start(scheduler.spawn, scheduler.shutdown)
+    scheduler.every(DISCORD_CONFIG["stats_interval"], log_discord_stats)
     if DISCORD_WEBHOOK_CONTRIBUTIONS:
-        Thread(
-            target=infinite_loop, args=(put_contributions_to_queue, 180), daemon=True
-        ).start()
-        Thread(
-            target=infinite_loop, args=(process_reviewed_contributions, 2), daemon=True
-        ).start()
+        scheduler.every(
+            FEED_CONFIG["min_interval"],
+            UR_CONTRIBUTIONS_FEED.poll,
+            put_contributions_to_queue,
+        )
+        scheduler.every(CONTRIBUTIONS_CONFIG["stats_interval"], log_feed_stats)
+        scheduler.consume_jobs(
+            queue_contributions,
+            process_reviewed_contributions,
+            workers=ENGINE_CONFIG["contribution_workers"],
+        )
+    scheduler.start()
 
 
-if __name__ == "__main__":
-    dirname = os.path.dirname(__file__)
-    setup_logger(os.path.join(dirname, "logger_config.json"))
+def parse_args(argv: list = None):
+    parser = argparse.ArgumentParser(prog="utbot")
+    subcommands = parser.add_subparsers(dest="command")
+    subcommands.add_parser(
+        "run", help="watch the blockchain and utopian.rocks (default)"
+    )
+    replay_parser = subcommands.add_parser(
+        "replay", help="process a historical block range without posting anything"
+    )
+    replay_parser.add_argument("--from-block", type=int, required=True)
+    replay_parser.add_argument("--to-block", type=int, required=True)
+    replay_parser.add_argument(
+        "--workers",
+        type=int,
+        help="number of worker processes, the CPU count by default",
+    )
+    replay_parser.add_argument(
+        "--chunk-size", type=int, default=1000, help="blocks a worker takes at once"
+    )
+    sink = replay_parser.add_mutually_exclusive_group(required=True)
+    sink.add_argument("--output", help="file the results are written to as JSON lines")
+    sink.add_argument("--dry-run", action="store_true", help="only log the results")
+    args = parser.parse_args(argv)
+    if args.command == "replay" and args.to_block < args.from_block:
+        parser.error("--to-block is lower than --from-block")
+    return args
+
+
+def run():
     logger.info("Utbot started")
+    scheduler = create_scheduler()
+    signal.signal(signal.SIGTERM, lambda signum, frame: scheduler.stop())
+    if PROFILING_CONFIG["signals"]:
+        PROFILING.install_signals()
+    scheduler.on_stop(PROFILING.stop)
     try:
-        background()
-        while True:
-            continue
+        background(scheduler)
+        scheduler.wait()
     except KeyboardInterrupt:
+        pass
+    finally:
+        scheduler.stop()
         logger.info("Stopping Utbot")
+
+
+def run_replay(args):
+    sink = DryRunSink() if args.dry_run else JsonLinesSink(args.output)
+    replay_range(
+        args.from_block,
+        args.to_block,
+        sink,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        range_size=INGEST_CONFIG["range_size"],
+    )
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    dirname = os.path.dirname(__file__)
+    setup_logger(os.path.join(dirname, "logger_config.json"))
+    if args.command == "replay":
+        run_replay(args)
+    else:
+        run()
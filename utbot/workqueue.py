@@ -0,0 +1,343 @@
+import collections
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+import typing
+
+from metrics import PIPELINE_BUCKETS, REGISTRY
+
+logger = logging.getLogger(__name__)
+
+READY = 0
+INFLIGHT = 1
+DONE = 2
+DEAD = 3
+
+QUEUE_DEPTH = REGISTRY.gauge(
+    "utbot_queue_depth", "Unfinished items in a work queue", ["queue"]
+)
+QUEUE_WAIT = REGISTRY.histogram(
+    "utbot_queue_wait_seconds",
+    "Seconds an item waited in a work queue before it was taken",
+    ["queue"],
+    buckets=PIPELINE_BUCKETS,
+)
+
+
+class Job:
+    """Item taken from a work queue, it has to be acked or nacked."""
+
+    __slots__ = ("id", "key", "payload", "attempts", "ready_at")
+
+    def __init__(
+        self,
+        id_: int,
+        key: typing.Optional[str],
+        payload,
+        attempts: int,
+        ready_at: float = None,
+    ):
+        self.id = id_
+        self.key = key
+        self.payload = payload
+        self.attempts = attempts
+        self.ready_at = ready_at
+
+    def __repr__(self):
+        return f"Job({self.id}, {self.key!r})"
+
+
+class WorkQueue:
+    """Durable FIFO queue kept in a SQLite database in WAL mode.
+
+    Items survive restarts and are processed at least once: a taken item stays
+    in the database until it is acked, items taken but not acked before a crash
+    are queued again on the next start. An item put with an idempotency key that
+    was already queued, processed or dropped is ignored.
+
+    Producers block while ``maxsize`` items are waiting or being processed.
+    Consumers take items from a small in-memory buffer refilled with one query.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        name: str,
+        maxsize: int = 0,
+        prefetch: int = 32,
+        max_attempts: int = 5,
+        retry_delay: float = 30.0,
+    ):
+        """
+        :param path: Path to the SQLite database file
+        :type path: str
+        :param name: Name of the queue, several queues can share a database
+        :type name: str
+        :param maxsize: Maximum number of unfinished items, 0 for no limit
+        :type maxsize: int
+        :param prefetch: Number of items moved to the in-memory buffer at once
+        :type prefetch: int
+        :param max_attempts: Attempts to process an item before it is dropped
+        :type max_attempts: int
+        :param retry_delay: Seconds before a failed item is retried, doubled
+            after every failed attempt
+        :type retry_delay: float
+        """
+        self.path = path
+        self.name = name
+        self.maxsize = maxsize
+        self.prefetch = prefetch
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.acked = 0
+        self.nacked = 0
+        self.dead = 0
+        self.duplicates = 0
+        self._conn = None
+        self._depth = 0
+        self._buffer = collections.deque()
+        self._cond = threading.Condition()
+        self._wait = QUEUE_WAIT.labels(name)
+        QUEUE_DEPTH.labels(name).set_function(self.qsize)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS jobs ("
+                    "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                    "queue TEXT NOT NULL, "
+                    "key TEXT, "
+                    "payload TEXT NOT NULL, "
+                    "state INTEGER NOT NULL, "
+                    "attempts INTEGER NOT NULL DEFAULT 0, "
+                    "available_at REAL NOT NULL, "
+                    "updated_at REAL NOT NULL)"
+                )
+                conn.execute(
+                    "CREATE UNIQUE INDEX IF NOT EXISTS jobs_key ON jobs (queue, key)"
+                )
+                conn.execute(
+                    "CREATE INDEX IF NOT EXISTS jobs_ready "
+                    "ON jobs (queue, state, available_at, id)"
+                )
+                recovered = conn.execute(
+                    "UPDATE jobs SET state = ? WHERE queue = ? AND state = ?",
+                    (READY, self.name, INFLIGHT),
+                ).rowcount
+            if recovered:
+                logger.info("Requeued %d unfinished %s items", recovered, self.name)
+            self._depth = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE queue = ? AND state IN (?, ?)",
+                (self.name, READY, INFLIGHT),
+            ).fetchone()[0]
+            self._conn = conn
+        return self._conn
+
+    def qsize(self) -> int:
+        """Number of unfinished items, waiting or being processed."""
+        with self._cond:
+            self._connect()
+            return self._depth
+
+    def put(self, payload, key: str = None, timeout: float = None) -> bool:
+        """Adds an item, blocking while the queue is full.
+
+        :param payload: JSON serializable item
+        :param key: Idempotency key of the item
+        :type key: str
+        :param timeout: Maximum seconds to wait for a free slot
+        :type timeout: float
+        :return: False if an item with the same key was already queued
+        :rtype: bool
+        :raises queue.Full: if there is no free slot within the timeout
+        """
+        return self.put_many([(payload, key)], timeout=timeout) == 1
+
+    def put_many(self, items: typing.Iterable[tuple], timeout: float = None) -> int:
+        """Adds several ``(payload, key)`` items in one transaction.
+
+        :param items: Pairs of a JSON serializable item and its idempotency key
+        :type items: list
+        :param timeout: Maximum seconds to wait for free slots
+        :type timeout: float
+        :return: Number of added items, duplicates are not counted
+        :rtype: int
+        :raises queue.Full: if there are not enough free slots within the timeout
+        """
+        items = list(items)
+        with self._cond:
+            conn = self._connect()
+            rows = [
+                (json.dumps(payload), key)
+                for payload, key in items
+                if key is None or not self._exists(key)
+            ]
+            self.duplicates += len(items) - len(rows)
+            if not rows:
+                return 0
+            if self.maxsize:
+                wanted = min(len(rows), self.maxsize)
+                if not self._cond.wait_for(
+                    lambda: self._depth + wanted <= self.maxsize, timeout
+                ):
+                    raise queue.Full
+            now = time.time()
+            added = 0
+            with conn:
+                for payload, key in rows:
+                    added += conn.execute(
+                        "INSERT OR IGNORE INTO jobs "
+                        "(queue, key, payload, state, available_at, updated_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (self.name, key, payload, READY, now, now),
+                    ).rowcount
+            self._depth += added
+            self.duplicates += len(rows) - added
+            if added:
+                self._cond.notify_all()
+            return added
+
+    def _exists(self, key: str) -> bool:
+        row = self._conn.execute(
+            "SELECT 1 FROM jobs WHERE queue = ? AND key = ?", (self.name, key)
+        ).fetchone()
+        return row is not None
+
+    def _fill_buffer(self) -> float:
+        """Moves ready items to the buffer, returns seconds until the next one."""
+        conn = self._connect()
+        now = time.time()
+        with conn:
+            rows = conn.execute(
+                "SELECT id, key, payload, attempts, available_at FROM jobs "
+                "WHERE queue = ? AND state = ? AND available_at <= ? "
+                "ORDER BY id LIMIT ?",
+                (self.name, READY, now, self.prefetch),
+            ).fetchall()
+            if rows:
+                conn.executemany(
+                    "UPDATE jobs SET state = ?, updated_at = ? WHERE id = ?",
+                    [(INFLIGHT, now, row[0]) for row in rows],
+                )
+        for id_, key, payload, attempts, ready_at in rows:
+            self._buffer.append(Job(id_, key, json.loads(payload), attempts, ready_at))
+        if rows:
+            return 0
+        row = conn.execute(
+            "SELECT MIN(available_at) FROM jobs WHERE queue = ? AND state = ?",
+            (self.name, READY),
+        ).fetchone()
+        return row[0] - now if row[0] is not None else None
+
+    def get(self, timeout: float = None) -> Job:
+        """Takes the oldest ready item.
+
+        :param timeout: Maximum seconds to wait for an item
+        :type timeout: float
+        :return: job with the item
+        :rtype: Job
+        :raises queue.Empty: if no item is ready within the timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while not self._buffer:
+                next_ready = self._fill_buffer()
+                if self._buffer:
+                    break
+                wait = next_ready
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise queue.Empty
+                    wait = remaining if wait is None else min(wait, remaining)
+                self._cond.wait(wait)
+            job = self._buffer.popleft()
+        self._wait.observe(time.time() - job.ready_at)
+        return job
+
+    def ack(self, job: Job):
+        """Marks an item as processed.
+
+        :param job: Processed job
+        :type job: Job
+        """
+        with self._cond:
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE jobs SET state = ?, updated_at = ? WHERE id = ?",
+                    (DONE, time.time(), job.id),
+                )
+            self.acked += 1
+            self._release()
+
+    def nack(self, job: Job, delay: float = None):
+        """Returns a failed item to the queue or drops it after too many attempts.
+
+        :param job: Failed job
+        :type job: Job
+        :param delay: Seconds before the retry, defaults to an exponential backoff
+        :type delay: float
+        """
+        attempts = job.attempts + 1
+        now = time.time()
+        if delay is None:
+            delay = self.retry_delay * 2**job.attempts
+        state = DEAD if attempts >= self.max_attempts else READY
+        with self._cond:
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE jobs SET state = ?, attempts = ?, available_at = ?, "
+                    "updated_at = ? WHERE id = ?",
+                    (state, attempts, now + delay, now, job.id),
+                )
+            self.nacked += 1
+            if state == DEAD:
+                logger.error(
+                    "Dropping %s %r after %d attempts", self.name, job, attempts
+                )
+                self.dead += 1
+                self._release()
+            else:
+                self._cond.notify_all()
+
+    def _release(self):
+        self._depth -= 1
+        self._cond.notify_all()
+
+    def purge(self, older_than: float) -> int:
+        """Deletes finished items, forgetting their idempotency keys.
+
+        :param older_than: Age in seconds of the deleted items
+        :type older_than: float
+        :return: Number of deleted items
+        :rtype: int
+        """
+        with self._cond:
+            conn = self._connect()
+            with conn:
+                return conn.execute(
+                    "DELETE FROM jobs WHERE queue = ? AND state IN (?, ?) "
+                    "AND updated_at < ?",
+                    (self.name, DONE, DEAD, time.time() - older_than),
+                ).rowcount
+
+    def stats(self) -> dict:
+        """Returns the depth of the queue and its counters.
+
+        :return: dictionary with statistics
+        :rtype: dict
+        """
+        return {
+            "depth": self.qsize(),
+            "acked": self.acked,
+            "nacked": self.nacked,
+            "dead": self.dead,
+            "duplicates": self.duplicates,
+        }